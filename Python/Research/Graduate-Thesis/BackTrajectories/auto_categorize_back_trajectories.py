@@ -44,20 +44,31 @@
 #                               the categorization.
 #   2022/09/28 - Lance Wilson:  Different attempt to categorized back
 #                               trajectories.
+#   2026/10/17 - Lance Wilson:  Evaluate 'any' thresholds for all parcels and
+#                               times with one interpolation.
+#   2026/10/17 - Lance Wilson:  Evaluate all termination regions and
+#                               categories with Category_rules, which reads
+#                               each model field used by the thresholds once.
+#   2026/10/17 - Lance Wilson:  Store the model fields interpolated to the
+#                               trajectories in a Traj_sample_cache, so they
+#                               do not need to be read again when the
+#                               category parameters change.
+#   2026/10/17 - Lance Wilson:  Get the model files from Back_traj_ds, which
+#                               starts at file_num_offset+1.
 #
 
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
-from scipy import interpolate
 
 import atexit
 import itertools
 import numpy as np
-import operator
 import sys
 
 from back_traj_interp_class import Back_traj_ds
 from categorize_traj_class import Cat_traj
+from category_rules import Category_rules
+from traj_sample_cache import Traj_sample_cache, sample_cache_name
 from trajectory_category_parameters import termination_parameters, category_parameters
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -66,21 +77,6 @@ from trajectory_category_parameters import termination_parameters, category_para
 def closeNCfile(ds):
     ds.close()
 
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Determine what valid indices remain (valid_traj_indices) after calculating
-#   the valid trajectories based on a specific condition (valid_this_case).
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def eval_valid_indices(valid_traj_indices, valid_this_case):
-    # If both arrays have indices, find the intersection of the two arrays.
-    if valid_traj_indices.size != 0 and valid_this_case.size != 0:
-        valid_traj_indices = np.intersect1d(valid_traj_indices, valid_this_case)
-    # Otherwise, the valid indices are whatever is valid for this condition.
-    #   Note: If valid_this_case is empty, then valid_traj_indices should
-    #   remain empty after the else block.
-    else:
-        valid_traj_indices = np.copy(valid_this_case)
-    return valid_traj_indices
-
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Command-line arguments.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -121,15 +117,6 @@ output_dir = analysis_dir + 'categorized_trajectories/'
 
 termination_region = 'mesocyclone'
 
-# Dictionary storing mathmatical operators from the operator module so that
-#   operators can be determined on a case-by-case basis.
-# Examples: ops['<'](a,b) is equivalent to: operator.lt(a,b); a < b
-ops =  {'<=' : operator.le,
-        '>=' : operator.ge,
-        '<'  : operator.lt,
-        '>'  : operator.gt,
-    }
-
 # How far back (in minutes) to plot trajectories.
 plot_limit_minutes = 10.
 
@@ -153,7 +140,7 @@ parcel_time_step_num = traj_ds_obj.parcel_time_step_num
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Open CM1 dataset over the time period where backward trajectories are calculated.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-file_list = [model_dir + 'JS_75m_run{:d}_{:06d}.nc'.format(run_number, file_num) for file_num in range(file_num_offset, file_num_offset+parcel_time_step_num)]
+file_list = traj_ds_obj.getModelFileList(model_dir, run_number)
 ds = MFDataset(file_list)
 
 # Close the main CM1 data netCDF file when the program exits.
@@ -193,23 +180,17 @@ plot_limit = np.argwhere(cumulative_time_steps <= plot_limit_seconds)[-1,0] + 1
 xpos = traj_ds_obj.xpos[::-1][parcel_time_step_num-plot_limit:]
 ypos = traj_ds_obj.ypos[::-1][parcel_time_step_num-plot_limit:]
 zpos = traj_ds_obj.zpos[::-1][parcel_time_step_num-plot_limit:]
-simulation_times = traj_ds_obj.simulation_times[::-1][parcel_time_step_num-plot_limit:]
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Regular grid coordinates to use for interpolation.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Coordinates in each dimension (converted to meters).
-x_coord = np.copy(ds.variables['xh'])*1000.
-y_coord = np.copy(ds.variables['yh'])*1000.
-z_coord = np.copy(ds.variables['z'])*1000.
-
-# Staggered coordinates in each dimension (converted to meters).
-x_coord_stag = np.copy(ds.variables['xf'])*1000.
-y_coord_stag = np.copy(ds.variables['yf'])*1000.
-z_coord_stag = np.copy(ds.variables['zf'])*1000.
-
-# Times in the simulation for this data range.
-time_coord = np.copy(ds.variables['time'][parcel_time_step_num-plot_limit:])
+# Coordinates in each horizontal dimension, including the staggered
+#   coordinates of the winds (converted to meters).
+grid_coords = {'x'      : np.copy(ds.variables['xh'])*1000.,
+               'y'      : np.copy(ds.variables['yh'])*1000.,
+               'x_stag' : np.copy(ds.variables['xf'])*1000.,
+               'y_stag' : np.copy(ds.variables['yf'])*1000.,
+              }
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Categorize trajectories.
@@ -223,250 +204,31 @@ end_point_dict = termination_parameters()
 # Dictionaries of parameters for all categories.
 category_dict = category_parameters()
 
+# Model fields interpolated to the trajectories, stored with the trajectory
+#   data.  The cache is indexed by the time index of the back trajectory
+#   files (which are in order of decreasing time).
+sample_cache = Traj_sample_cache(interp_dir + sample_cache_name(version_number, parcel_label, 'back'), traj_ds_obj.xpos, traj_ds_obj.ypos, traj_ds_obj.zpos, file_list)
+traj_time_indices = np.arange(plot_limit)[::-1]
+
+# Read each model field used by the termination regions and categories once
+#   (if it is not already in the cache), and find the trajectories meeting
+#   each set of criteria.
+category_rules = Category_rules(end_point_dict, category_dict)
+samples = category_rules.sample_fields(ds, (parcel_time_step_num-plot_limit, parcel_time_step_num), xpos, ypos, grid_coords, sample_cache, traj_time_indices)
+end_point_masks, category_masks = category_rules.eval_masks(xpos, ypos, zpos, samples)
+
 for end_point_param_key, category_param_key in itertools.product(end_point_dict.keys(), category_dict.keys()):
 
     print('Calculating trajectories for termination region \'{:s}\', category \'{:s}\''.format(end_point_param_key, category_param_key))
 
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Find trajectories that terminate in the mesocyclone
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Parameters used for determining if the trajectory ends in the correct place.
-    end_point_params = end_point_dict[end_point_param_key]
-
-    valid_traj_indices = np.empty((0,))
-
-    # List of keys that do not have a value of None for the this set of
-    #   trajectory end points.
-    defined_end_point_keys = [key for key in end_point_params.keys() if end_point_params[key]]
-
-    for key in defined_end_point_keys:
-        if key.startswith('x'):
-            positions = xpos[-1]
-        if key.startswith('y'):
-            positions = ypos[-1]
-        if key.startswith('z'):
-            positions = zpos[-1]
-
-        if key.endswith('max'):
-            # Determine which trajectories remain below the required limit over
-            #   the prescribed time period.
-            valid_this_case = np.argwhere(positions <= end_point_params[key])[:,0]
-            # Determine which valid indices remain.
-            valid_traj_indices = eval_valid_indices(valid_traj_indices, valid_this_case)
-
-            #print('After mesocyclone {:s}:\t{:d}'.format(key, valid_traj_indices.size))
-
-        elif key.endswith('min'):
-            # Determine which trajectories remain above the required limit over
-            #   the prescribed time period.
-            valid_this_case = np.argwhere(positions >= end_point_params[key])[:,0]
-            # Determine which valid indices remain.
-            valid_traj_indices = eval_valid_indices(valid_traj_indices, valid_this_case)
-
-            #print('After mesocyclone {:s}:\t{:d}'.format(key, valid_traj_indices.size))
-
-        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-        # If looking at the threshold criteria, make a list of the model fields
-        #   needed for comparision.
-        if key == 'thresholds':
-            model_fields = [threshold for threshold in end_point_params[key].keys()]
-        # If the key is not 'thresholds', create an empty list so the for loop
-        #   does not run.
-        else:
-            model_fields = []
-
-        for model_field in model_fields:
-            # Array index of model height.
-            model_level = end_point_params[key][model_field][0]
-            # Value to compare the model variable data against.
-            field_value = end_point_params[key][model_field][1]
-            # Whether the values along the trajectory should be e.g. less than
-            #   or greater than the comparison value.
-            operator = end_point_params[key][model_field][2]
-
-            # Determine which model coordinates to use (must use staggered
-            #   grids if interpolating velocity values).
-            x_coord_field = x_coord_stag if model_field == 'u' else x_coord
-            y_coord_field = y_coord_stag if model_field == 'v' else y_coord
-
-            # Regular grid points for one model level at one time.
-            grid_coord_2D = (y_coord_field,x_coord_field)
-
-            # Get values of this budget variable at this time step.
-            variable = np.copy(ds.variables[model_field][-1,model_level,:,:])
-
-            # Get back trajectory coordinates at this time step.
-            x_traj_coord = xpos[-1]
-            y_traj_coord = ypos[-1]
-
-            # Create array representing the points that the model variable is
-            #   going to be sampled at.
-            traj_points = np.column_stack((y_traj_coord, x_traj_coord))
-
-            # Interpolate the model variable to the back trajectory points.
-            interpolated_values = interpolate.interpn(grid_coord_2D, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-
-            # Find trajectories that meet the criterion at this time.
-            valid_this_case = np.argwhere(ops[operator](interpolated_values, field_value))[:,0]
-
-            # Determine which valid indices remain.
-            valid_traj_indices = eval_valid_indices(valid_traj_indices, valid_this_case)
-
-            #print('After mesocyclone {:s}:\t{:d}'.format(model_field, valid_traj_indices.size))
-
-    #print('Remaining trajectories after {:s} termination region:\t{:d}'.format(end_point_param_key, valid_traj_indices.size))
-
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    if valid_traj_indices.size == 0:
+    if not np.any(end_point_masks[end_point_param_key]):
         print('No trajectories terminate within the {:s} termination region for this dataset.'.format(end_point_param_key))
         sys.exit()
 
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Find trajectories that are part of this category.
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Parameters to be used to determine if the trajectory belongs to a
-    # certain category.
-    category_params = category_dict[category_param_key]
-
-    # List of keys that do not have a value of None for this category.
-    defined_category_keys = [key for key in category_params.keys() if category_params[key]]
-
-    for key in defined_category_keys:
-        # First and last index of data to collect (based on percentage of data).
-        if key.startswith('x') or key.startswith('y') or key.startswith('z'):
-            start_time_limit_index = int(plot_limit * category_params[key][1] / 100.)
-            end_time_limit_index = int(plot_limit * category_params[key][2] / 100.)
-
-        if key.startswith('x'):
-            traj_points = xpos[start_time_limit_index:end_time_limit_index]
-
-        if key.startswith('y'):
-            traj_points = ypos[start_time_limit_index:end_time_limit_index]
-
-        if key.startswith('z'):
-            traj_points = zpos[start_time_limit_index:end_time_limit_index]
-
-        if key.endswith('max'):
-            max_values = np.max(traj_points, axis=0)
-
-            # Determine which trajectories remain below the limit over the
-            #   prescribed time period.
-            valid_this_case = np.argwhere(max_values <= category_params[key][0])[:,0]
-            # Determine which valid indices remain.
-            valid_traj_indices = eval_valid_indices(valid_traj_indices, valid_this_case)
-
-            #print('After category {:s}:\t{:d}'.format(key, valid_traj_indices.size))
-
-        elif key.endswith('min'):
-            min_values = np.min(traj_points, axis=0)
-
-            # Determine which trajectories remain above the limit over the
-            #   prescribed time period.
-            valid_this_case = np.argwhere(min_values >= category_params[key][0])[:,0]
-            # Determine which valid indices remain.
-            valid_traj_indices = eval_valid_indices(valid_traj_indices, valid_this_case)
-
-            #print('After category {:s}:\t{:d}'.format(key, valid_traj_indices.size))
-
-        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-        # If looking at the threshold criteria, make a list of the model fields
-        #   needed for comparision.
-        if key == 'thresholds':
-            model_fields = [threshold for threshold in category_params[key].keys()]
-        # If the key is not 'thresholds', create an empty list so the for loop
-        #   does not run.
-        else:
-            model_fields = []
-
-        for model_field in model_fields:
-            # Array index of model height.
-            model_level = category_params[key][model_field][0]
-            # Value to compare the model variable data against.
-            field_value = category_params[key][model_field][1]
-            # Whether the values along the trajectory should be e.g. less than
-            #   or greater than the comparison value.
-            operator = category_params[key][model_field][2]
-            # Whether the entire trajectory or just part of it should be the criterion.
-            domain_required = category_params[key][model_field][3]
-
-            # Determine which model coordinates to use (must use staggered
-            #   grids if interpolating velocity values).
-            x_coord_field = x_coord_stag if model_field == 'u' else x_coord
-            y_coord_field = y_coord_stag if model_field == 'v' else y_coord
-            z_coord_field = z_coord_stag if model_field == 'w' else z_coord
-
-            #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-            # Case if all trajectory points must meet the criterion.
-            if domain_required == 'all':
-                # Regular grid points for one model level at one time.
-                grid_coord_2D = (y_coord_field,x_coord_field)
-
-                remaining_valid = np.copy(valid_traj_indices)
-                for time_step in range(parcel_time_step_num-plot_limit, parcel_time_step_num):
-                    parcel_time_step = time_step - parcel_time_step_num + plot_limit
-
-                    # Get values of this budget variable at this time step.
-                    variable = np.copy(ds.variables[model_field][time_step,model_level,:,:])
-
-                    # Get back trajectory coordinates at this time step.
-                    x_traj_coord = xpos[parcel_time_step, remaining_valid]
-                    y_traj_coord = ypos[parcel_time_step, remaining_valid]
-
-                    # Create array representing the points that the model
-                    #   variable is going to be sampled at.
-                    traj_points = np.column_stack((y_traj_coord, x_traj_coord))
-
-                    # Interpolate the model variable to the back trajectory points.
-                    interpolated_values = interpolate.interpn(grid_coord_2D, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-
-                    # Indices of remaining_valid array valid at this time step.
-                    valid_this_time_subset = np.argwhere(ops[operator](interpolated_values, field_value))[:,0]
-
-                    # Indices of full index array valid at this time step.
-                    valid_this_time_full = remaining_valid[valid_this_time_subset]
-
-                    # Remaining valid indices for all times steps
-                    remaining_valid = eval_valid_indices(remaining_valid, valid_this_time_full)
-
-                # Determine which valid indices remain.
-                valid_traj_indices = eval_valid_indices(valid_traj_indices, remaining_valid)
-
-            #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-            # Case if any of the trajectory points must meet the criterion.
-            if domain_required == 'any':
-                grid_coord_time = (np.round(time_coord, -1),y_coord_field,x_coord_field)
-                remaining_valid = []
-                # Get values of this budget variable at all time steps.
-                variable = np.copy(ds.variables[model_field][parcel_time_step_num-plot_limit:,model_level,:,:])
-
-                for parcel_num in valid_traj_indices:
-                    # Get this back trajectory's coordinates at all time steps.
-                    x_traj_coord = xpos[:, parcel_num]
-                    y_traj_coord = ypos[:, parcel_num]
-                    z_traj_coord = zpos[:, parcel_num]
-                    time_traj_coord = np.round(simulation_times, -1)
-
-                    # Create array representing the points that the model
-                    #   variable is going to be sampled at.
-                    traj_points = np.column_stack((time_traj_coord, y_traj_coord, x_traj_coord))
-
-                    # Interpolate the model variable to the back trajectory points.
-                    interpolated_values = interpolate.interpn(grid_coord_time, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-
-                    # Find indices of times where this trajectory meets the criterion.
-                    valid_this_time_subset = np.argwhere(ops[operator](interpolated_values, field_value))[:,0]
-
-                    # If any time meets the criterion, add this trajectory to
-                    #   the list of remaining valid trajectories.
-                    if valid_this_time_subset.size != 0:
-                        remaining_valid.append(parcel_num)
-
-                remaining_valid = np.array(remaining_valid)
-
-                # Determine which valid indices remain.
-                valid_traj_indices = eval_valid_indices(valid_traj_indices, remaining_valid)
-
-            #print('After category {:s}:\t{:d}'.format(model_field, valid_traj_indices.size))
+    # Trajectories that terminate in this region and are part of this
+    #   category.
+    valid_traj_indices = np.flatnonzero(end_point_masks[end_point_param_key] & category_masks[category_param_key])
 
     print('Final trajectories in category {:s}:\t{:d}'.format(category_param_key, valid_traj_indices.size))
     print('---------------------------------------------------------------')
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   back_traj_integrator.py
+#
+# Purpose:  Integrate parcel positions backward in time through CM1 wind
+#           fields, using a forward Euler, second-order Runge-Kutta (midpoint),
+#           or fourth-order Runge-Kutta scheme.  The wind between two model
+#           output times is linearly interpolated in time, and each interval
+#           between output times can be split into sub-steps.
+#
+# Syntax: from back_traj_integrator import Back_traj_integrator
+#         integrator = Back_traj_integrator(wind_reader, model_times, read_indices, method, substeps)
+#         xpos_new, ypos_new, zpos_new = integrator.step(xpos, ypos, zpos, time_index, box)
+#
+#   Input:
+#       wind_reader: Wind_reader or Prefetch_wind_reader (cm1_wind_reader.py)
+#       model_times: model output times (seconds) for each time index
+#       read_indices: time indices of the model files that wind data is read
+#                     from, in decreasing order (every file, or every Nth file)
+#       method: 'euler', 'rk2', or 'rk4'
+#       substeps: number of integration steps between each model output time
+#
+# Execution Example:
+#   integrator = Back_traj_integrator(wind_reader, ds.variables['time'][:], range(120,0,-6), 'rk4', 4)
+#   x_new, y_new, z_new = integrator.step(xpos[t], ypos[t], zpos[t], 120-t, box)
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to add higher order time integration
+#                               to calc_back_trajectory.py.
+#   2026/10/17 - Lance Wilson:  Added load_interval_fields for the parallel
+#                               integration in back_traj_parallel.py.
+#
+
+from calc_parcel_bounds import box_contains, calc_parcel_box, merge_boxes, parcels_in_box
+
+# Integration schemes that are currently supported.
+integration_methods = ['euler', 'rk2', 'rk4']
+
+class Back_traj_integrator:
+    def __init__(self, wind_reader, model_times, read_indices, method='euler', substeps=1, halo=0):
+        if method not in integration_methods:
+            raise ValueError('Integration method {:s} is not valid; use one of: {:s}'.format(method, ', '.join(integration_methods)))
+
+        self.wind_reader = wind_reader
+        self.model_times = model_times
+        self.read_indices = list(read_indices)
+        self.method = method
+        self.substeps = substeps
+        # Halo added when a box must be expanded to hold intermediate positions.
+        self.halo = halo
+
+        # Wind data for the model files bracketing the current interval.
+        self.fields = {}
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Indices of the model files that wind data is read from on either side of
+    #   the interval from time_index back to time_index-1.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def bracket_indices(self, time_index):
+        later_index = min([read_index for read_index in self.read_indices if read_index >= time_index])
+        earlier_index = max([read_index for read_index in self.read_indices if read_index <= time_index-1])
+        return later_index, earlier_index
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Wind data for a model file, read only when it is first needed (so the
+    #   files are read in decreasing order, as expected by the prefetch reader).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def get_fields(self, read_index, box):
+        if read_index not in self.fields:
+            self.fields[read_index] = self.wind_reader.read_winds(read_index, box)
+        elif not box_contains(self.fields[read_index].box, box):
+            self.fields[read_index] = self.wind_reader.read_box(read_index, box)
+
+        return self.fields[read_index]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Remove data from model files later than later_index (no longer needed).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def remove_old_fields(self, later_index):
+        for read_index in list(self.fields):
+            if read_index > later_index:
+                del self.fields[read_index]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read the wind data from both model files bracketing the interval from
+    #   time_index back to time_index-1 (used when the data is needed before
+    #   the integration, e.g. to share it with other processes).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def load_interval_fields(self, time_index, box):
+        later_index, earlier_index = self.bracket_indices(time_index)
+        self.remove_old_fields(later_index)
+
+        return {read_index: self.get_fields(read_index, box) for read_index in (later_index, earlier_index)}
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolate the winds in one model file to the parcel positions.  If the
+    #   data is only for a subdomain and some of the parcels (e.g. at an
+    #   intermediate Runge-Kutta stage) are outside of it, the data is read
+    #   again for a box containing all of the parcels.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def interp_fields(self, read_index, box, xpos, ypos, zpos):
+        wind_fields = self.get_fields(read_index, box)
+
+        positions = (xpos, ypos, zpos)
+        if not parcels_in_box(wind_fields.box, self.wind_reader.coords, positions):
+            parcel_box = calc_parcel_box(self.wind_reader.coords, positions, self.halo)
+            wind_fields = self.get_fields(read_index, merge_boxes(wind_fields.box, parcel_box))
+
+        return wind_fields.interp(xpos, ypos, zpos)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Winds at the parcel positions at a time between the bracketing model
+    #   files, linearly interpolated in time.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def wind_at_time(self, xpos, ypos, zpos, cur_time, later_index, earlier_index, box):
+        later_time = float(self.model_times[later_index])
+        earlier_time = float(self.model_times[earlier_index])
+        # Fraction of the way from the later file back to the earlier file.
+        time_weight = (later_time - float(cur_time)) / (later_time - earlier_time)
+
+        # Only read the data that is needed if the time matches a model file.
+        if time_weight == 0.:
+            return self.interp_fields(later_index, box, xpos, ypos, zpos)
+        if time_weight == 1.:
+            return self.interp_fields(earlier_index, box, xpos, ypos, zpos)
+
+        later_winds = self.interp_fields(later_index, box, xpos, ypos, zpos)
+        earlier_winds = self.interp_fields(earlier_index, box, xpos, ypos, zpos)
+
+        return tuple([(1. - time_weight) * later_wind + time_weight * earlier_wind for later_wind, earlier_wind in zip(later_winds, earlier_winds)])
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Move the parcels back in time by step_length using the winds in
+    #   wind_function(xpos, ypos, zpos, time).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def substep(self, xpos, ypos, zpos, cur_time, step_length, wind_function):
+        # Intermediate positions are kept above the ground, as with the
+        #   positions at the end of each step.
+        def move(winds, fraction):
+            u, v, w = winds
+            return (xpos - u*step_length*fraction, ypos - v*step_length*fraction, (zpos - w*step_length*fraction).clip(min=0))
+
+        if self.method == 'euler':
+            u, v, w = wind_function(xpos, ypos, zpos, cur_time)
+            return (xpos - u*step_length, ypos - v*step_length, zpos - w*step_length)
+
+        elif self.method == 'rk2':
+            k1 = wind_function(xpos, ypos, zpos, cur_time)
+            k2 = wind_function(*move(k1, 0.5), cur_time - 0.5*step_length)
+            u, v, w = k2
+
+        elif self.method == 'rk4':
+            k1 = wind_function(xpos, ypos, zpos, cur_time)
+            k2 = wind_function(*move(k1, 0.5), cur_time - 0.5*step_length)
+            k3 = wind_function(*move(k2, 0.5), cur_time - 0.5*step_length)
+            k4 = wind_function(*move(k3, 1.), cur_time - step_length)
+            u, v, w = [(k1[dim] + 2.*k2[dim] + 2.*k3[dim] + k4[dim])/6. for dim in range(3)]
+
+        return (xpos - u*step_length, ypos - v*step_length, zpos - w*step_length)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Integrate the parcels from model time index time_index back to
+    #   time_index-1.
+    #   box: subdomain of wind data to read (from calc_parcel_box, or the full
+    #        domain)
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def step(self, xpos, ypos, zpos, time_index, box):
+        later_index, earlier_index = self.bracket_indices(time_index)
+        self.remove_old_fields(later_index)
+
+        def wind_function(xpos, ypos, zpos, cur_time):
+            return self.wind_at_time(xpos, ypos, zpos, cur_time, later_index, earlier_index, box)
+
+        step_length = (self.model_times[time_index] - self.model_times[time_index-1]) / self.substeps
+
+        for substep_num in range(self.substeps):
+            cur_time = self.model_times[time_index] - substep_num*step_length
+            xpos, ypos, zpos = self.substep(xpos, ypos, zpos, cur_time, step_length, wind_function)
+            # Prevent parcels from going into the ground
+            zpos = zpos.clip(min=0)
+
+        return xpos, ypos, zpos
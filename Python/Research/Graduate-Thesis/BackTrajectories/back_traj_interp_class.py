@@ -7,7 +7,23 @@
 #           interpolated to back trajectory positions.
 #
 # Syntax: 
-#   traj_data = Back_traj_ds(model_version_number, path_to_data, parcel_label)
+#   traj_data = Back_traj_ds(model_version_number, path_to_data, parcel_label, cache_size_mb, memmap_dir)
+#
+#   cache_size_mb: memory limit (in megabytes) of the budget variables kept
+#                  in memory after they are read (default 2048, None for no
+#                  limit).  The arrays returned by getBudgetData and
+#                  getCombinedBudgetData are read-only; use np.copy to get
+#                  an array that can be modified.
+#   memmap_dir: directory for temporary memory-mapped copies of the budget
+#               variables that do not fit in the memory limit (default None,
+#               read them from the file again instead)
+#
+#   traj_data.getModelFileList(model_dir, run_number) returns the CM1 model
+#   files at each time of the trajectory dataset (earliest time first).
+#
+#   If a trajectory store (trajectory_store.py) has been created for this
+#   dataset (after the fully and partially valid files were last changed),
+#   it is used instead of those files.
 #
 # Execution Example:
 #   from back_traj_interp_class import Back_traj_ds
@@ -17,8 +33,22 @@
 #   2021/11/19 - Lance Wilson:  Created.
 #   2022/01/27 - Lance Wilson:  Change to use getBudgetData method to get
 #                               trajectory positions.
+#   2026/10/17 - Lance Wilson:  Keep budget variables (and combined
+#                               horizontal and vertical components) in memory
+#                               after the first read.
+#   2026/10/17 - Lance Wilson:  Added option for memory-mapped copies of the
+#                               budget variables.
+#   2026/10/17 - Lance Wilson:  Read from the trajectory store for this
+#                               dataset if it exists, and added getParcelData
+#                               to read a subset of parcels and times.
+#   2026/10/17 - Lance Wilson:  Added getModelFileList so that all scripts
+#                               use the same CM1 model files for a dataset.
+#   2026/10/17 - Lance Wilson:  Positions are read the first time they are
+#                               used instead of when the data is opened.
 #
 
+from budget_cache import Budget_cache
+from trajectory_store import Traj_store, back_traj_store_name, store_is_current
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
 from os import path
@@ -28,7 +58,13 @@ import numpy as np
 import sys
 
 class Back_traj_ds:
-    def __init__(self, version_number, interp_dir, parcel_label):
+    def __init__(self, version_number, interp_dir, parcel_label, cache_size_mb=2048, memmap_dir=None):
+        # Budget variables that have already been read.
+        self.budget_cache = Budget_cache(cache_size_mb, memmap_dir)
+        # Trajectory store containing this dataset (if it exists).
+        self.store = None
+        # Position variables that have already been read.
+        self.positions = {}
 
         self.read_data(version_number, interp_dir, parcel_label)
 
@@ -45,6 +81,14 @@ class Back_traj_ds:
             back_traj_vort_name_full = '{:s}_{:s}_fully_valid_back_trajectory.nc'.format(version_number, parcel_label)
             back_traj_vort_name_partial = '{:s}_{:s}_partially_valid_back_trajectory.nc'.format(version_number, parcel_label)
 
+        # Use the trajectory store for this dataset if it has been created,
+        #   which contains both the fully valid and partially valid
+        #   trajectories (without a nan buffer).
+        store_path = interp_dir + back_traj_store_name(version_number, parcel_label)
+        if store_is_current(store_path, [interp_dir + back_traj_vort_name_full, interp_dir + back_traj_vort_name_partial]):
+            self.read_store(store_path)
+            return
+
 
         # Attempt to open the file containing fully valid trajectory data.
         if path.isfile(interp_dir + back_traj_vort_name_full):
@@ -161,10 +205,27 @@ class Back_traj_ds:
             #   just be file_num_offset).
             self.budget_var_keys = [var_name for var_name in self.ds_partial.variables.keys() if not var_name.endswith('pos') if len(self.ds_partial.variables[var_name].dimensions) > 1]
 
-        # Position data for the back trajectories.
-        self.xpos = self.getBudgetData('xpos')
-        self.ypos = self.getBudgetData('ypos')
-        self.zpos = self.getBudgetData('zpos')
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Open the trajectory store for this dataset.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read_store(self, store_path):
+        self.store = Traj_store(store_path)
+        self.store.read_data()
+
+        self.full_flag = False
+        self.partial_flag = False
+
+        # Total number of parcels for this set of data.
+        self.total_parcel_num = self.store.total_parcel_num
+        # Model file at the earliest time of the trajectory dataset (zero
+        #   indexed, add one to get the correct CM1 model file).
+        self.file_num_offset = self.store.file_num_offset
+        # Get the number of time steps in the full set of parcel data.
+        self.parcel_time_step_num = self.store.parcel_time_step_num
+        # Array of model simulation times (in seconds) for the trajectory dataset.
+        self.simulation_times = self.store.simulation_times
+        # List of vorticity budget variables.
+        self.budget_var_keys = self.store.budget_var_keys
 
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     # Called at exit time to close the netCDF files.
@@ -174,9 +235,19 @@ class Back_traj_ds:
         ds.close()
 
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Get Data for this vorticity budget variable.
+    # Get Data for this vorticity budget variable (read-only array, read from
+    #   the file the first time the variable is used).
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     def getBudgetData(self, budget_var_name):
+        return self.budget_cache.get(budget_var_name, lambda: self.readBudgetData(budget_var_name))
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read data for this vorticity budget variable from the file(s).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def readBudgetData(self, budget_var_name):
+        if self.store is not None:
+            return self.store.getParcelData(budget_var_name)
+
         if self.full_flag == True and self.partial_flag == True:
             budget_var_full = np.copy(self.ds_full.variables[budget_var_name])
             budget_var_partial = np.concatenate((np.copy(self.ds_partial.variables[budget_var_name]), self.nan_buffer))
@@ -189,6 +260,56 @@ class Back_traj_ds:
         if self.full_flag == False and self.partial_flag == True:
             return np.copy(self.ds_partial.variables[budget_var_name])
 
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Full (time, parcel) position arrays for the back trajectories, read the
+    #   first time they are used (use getParcelData to read the positions of
+    #   only some parcels).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    @property
+    def xpos(self):
+        return self.getPositionData('xpos')
+
+    @property
+    def ypos(self):
+        return self.getPositionData('ypos')
+
+    @property
+    def zpos(self):
+        return self.getPositionData('zpos')
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read a position variable once and keep it (outside of the budget
+    #   variable memory limit, since the positions are indexed repeatedly).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def getPositionData(self, pos_name):
+        if pos_name not in self.positions:
+            self.positions[pos_name] = self.getBudgetData(pos_name)
+        return self.positions[pos_name]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Get (time, parcel) data for a set of parcel numbers (None for all
+    #   parcels) and (start, end) range of time indices (None for all times).
+    #   Only the needed parcels are read if there is a trajectory store for
+    #   this dataset.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def getParcelData(self, budget_var_name, parcel_ids=None, time_range=None):
+        if self.store is not None and budget_var_name not in self.budget_cache.arrays:
+            return self.store.getParcelData(budget_var_name, parcel_ids, time_range)
+
+        t1, t2 = (0, self.parcel_time_step_num) if time_range is None else time_range
+        budget_var = self.getBudgetData(budget_var_name)[t1:t2]
+        if parcel_ids is None:
+            return budget_var
+        return budget_var[:,np.asarray(parcel_ids, dtype=int)]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # List of the CM1 model files over the time period of the trajectory
+    #   dataset, in order of increasing time (file_num_offset is zero indexed,
+    #   so the earliest model file is file_num_offset+1).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def getModelFileList(self, model_dir, run_number):
+        return [model_dir + 'JS_75m_run{:d}_{:06d}.nc'.format(run_number, file_num) for file_num in range(self.file_num_offset+1, self.file_num_offset+self.parcel_time_step_num+1)]
+
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     # Retrieve and combine horizontal and vertical components of vorticity
     #   budget variable data (if both components exist).
@@ -198,7 +319,7 @@ class Back_traj_ds:
         vert_name = self.add_dir2var(combined_var_name, 'v')
 
         if horiz_name in self.budget_var_keys and vert_name in self.budget_var_keys:
-            budget_var = self.getBudgetData(horiz_name) + self.getBudgetData(vert_name)
+            budget_var = self.budget_cache.get(('combined', combined_var_name), lambda: self.getBudgetData(horiz_name) + self.getBudgetData(vert_name))
         else:
             # For now, if there are not both horizontal and vertical
             #   components, or if a regular variable name was entered, return
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   back_traj_parallel.py
+#
+# Purpose:  Integrate back trajectories on a pool of worker processes.  The
+#           main process reads the wind data and places it in shared memory,
+#           and the parcels are split into chunks that are each integrated by
+#           a worker with the same Back_traj_integrator code used in serial
+#           mode, so the results are identical to a serial run.
+#
+# Syntax: from back_traj_parallel import Parallel_back_traj
+#         parallel_integrator = Parallel_back_traj(integrator, num_workers)
+#         xpos_new, ypos_new, zpos_new = parallel_integrator.step(xpos, ypos, zpos, time_index, box)
+#         parallel_integrator.close()
+#
+# Execution Example:
+#   integrator = Back_traj_integrator(wind_reader, model_times, read_indices, 'rk4', 1)
+#   parallel_integrator = Parallel_back_traj(integrator, 32)
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to integrate large numbers of parcels
+#                               in calc_back_trajectory.py on multiple cores.
+#
+
+from back_traj_integrator import Back_traj_integrator
+from cm1_wind_reader import Wind_fields, Wind_reader
+
+from multiprocessing import resource_tracker, shared_memory
+import multiprocessing
+import numpy as np
+
+# Wind variables that are shared with the worker processes.
+wind_variables = ['u', 'v', 'w']
+
+# Integrator and shared memory blocks in each worker process (set up by
+#   init_worker).
+worker_state = {}
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Raised in a worker when the parcels need wind data outside of the box that
+#   was shared by the main process (the chunk is then integrated by the main
+#   process, which can read more data).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Shared_box_error(Exception):
+    pass
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Wind_reader used in the worker processes.  It has the model coordinates, but
+#   no dataset; all wind data comes from shared memory.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Shared_wind_reader(Wind_reader):
+    def __init__(self, coords, staggered):
+        self.ds = None
+        self.staggered = staggered
+        self.x, self.y, self.z, self.x_stag, self.y_stag, self.z_stag = coords
+        self.stag_offset = 1 if staggered == 'Y' else 0
+        self.coords = (self.x, self.y, self.z)
+        self.full_box = (0, 0, 0, self.x.size, self.y.size, self.z.size)
+
+    def read_winds(self, time_index, box=None):
+        raise Shared_box_error('Wind data for time index {:d} is not in shared memory.'.format(time_index))
+
+    def read_box(self, time_index, box):
+        raise Shared_box_error('Wind data for time index {:d} in box {} is not in shared memory.'.format(time_index, box))
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Attach to a shared memory block created by the main process.  The main
+#   process is responsible for removing the block, so it is not tracked here.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    # The track argument is only available in Python 3.13 and later.
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Set up the integrator in each worker process.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def init_worker(coords, staggered, model_times, read_indices, method, substeps, halo):
+    wind_reader = Shared_wind_reader(coords, staggered)
+    worker_state['wind_reader'] = wind_reader
+    worker_state['integrator'] = Back_traj_integrator(wind_reader, model_times, read_indices, method, substeps, halo)
+    # Attached shared memory blocks (by name).
+    worker_state['shared'] = {}
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Integrate one chunk of parcels (run in a worker process).
+#   task: (time_index, box, shared_fields, xpos, ypos, zpos), where
+#         shared_fields has the box and shared memory (name, shape, dtype) of
+#         u, v, and w for each model file index.
+#   Returns the new positions, or None if the chunk needs wind data that is not
+#   in shared memory.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def integrate_chunk(task):
+    time_index, box, shared_fields, xpos, ypos, zpos = task
+
+    wind_reader = worker_state['wind_reader']
+    integrator = worker_state['integrator']
+    attached = worker_state['shared']
+
+    # Detach from blocks from model files that are no longer used.
+    current_names = [shm_name for fields_box, arrays in shared_fields.values() for shm_name, shape, dtype in arrays.values()]
+    for shm_name in list(attached):
+        if shm_name not in current_names:
+            attached.pop(shm_name)[0].close()
+
+    fields = {}
+    for read_index, (fields_box, arrays) in shared_fields.items():
+        data = {}
+        for var_name, (shm_name, shape, dtype) in arrays.items():
+            if shm_name not in attached:
+                shm = attach_shared_memory(shm_name)
+                attached[shm_name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+            data[var_name] = attached[shm_name][1]
+
+        fields[read_index] = Wind_fields(read_index, fields_box, data['u'], data['v'], data['w'], wind_reader.box_interp(fields_box))
+
+    integrator.fields = fields
+    try:
+        return integrator.step(xpos, ypos, zpos, time_index, box)
+    except Shared_box_error:
+        return None
+
+class Parallel_back_traj:
+    def __init__(self, integrator, num_workers):
+        self.integrator = integrator
+        self.num_workers = num_workers
+
+        wind_reader = integrator.wind_reader
+        coords = (wind_reader.x, wind_reader.y, wind_reader.z, wind_reader.x_stag, wind_reader.y_stag, wind_reader.z_stag)
+        self.pool = multiprocessing.Pool(num_workers, initializer=init_worker,
+                                         initargs=(coords, wind_reader.staggered, integrator.model_times, integrator.read_indices,
+                                                   integrator.method, integrator.substeps, integrator.halo))
+
+        # Wind data in shared memory for each model file index:
+        #   (Wind_fields object, {variable: SharedMemory}).
+        self.shared = {}
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Remove the shared memory for a model file.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def release_fields(self, read_index):
+        wind_fields, shm_blocks = self.shared.pop(read_index)
+        for shm in shm_blocks.values():
+            shm.close()
+            shm.unlink()
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Copy wind data into shared memory (only if it has not been shared yet),
+    #   and return the description of the shared data sent to the workers.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def share_fields(self, fields):
+        for read_index in list(self.shared):
+            if read_index not in fields or self.shared[read_index][0] is not fields[read_index]:
+                self.release_fields(read_index)
+
+        shared_fields = {}
+        for read_index, wind_fields in fields.items():
+            if read_index not in self.shared:
+                shm_blocks = {}
+                for var_name in wind_variables:
+                    data = np.asarray(getattr(wind_fields, var_name))
+                    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+                    np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+                    shm_blocks[var_name] = shm
+                self.shared[read_index] = (wind_fields, shm_blocks)
+
+            shm_blocks = self.shared[read_index][1]
+            arrays = {var_name: (shm_blocks[var_name].name, np.shape(getattr(wind_fields, var_name)), np.asarray(getattr(wind_fields, var_name)).dtype.str)
+                      for var_name in wind_variables}
+            shared_fields[read_index] = (wind_fields.box, arrays)
+
+        return shared_fields
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Integrate the parcels from model time index time_index back to
+    #   time_index-1 (same arguments as Back_traj_integrator.step).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def step(self, xpos, ypos, zpos, time_index, box):
+        shared_fields = self.share_fields(self.integrator.load_interval_fields(time_index, box))
+
+        chunks = [chunk for chunk in np.array_split(np.arange(xpos.size), self.num_workers) if chunk.size > 0]
+        tasks = [(time_index, box, shared_fields, xpos[chunk], ypos[chunk], zpos[chunk]) for chunk in chunks]
+        results = self.pool.map(integrate_chunk, tasks)
+
+        new_xpos = np.empty_like(xpos)
+        new_ypos = np.empty_like(ypos)
+        new_zpos = np.empty_like(zpos)
+        for chunk, result in zip(chunks, results):
+            # Parcels that left the shared box are integrated here instead.
+            if result is None:
+                result = self.integrator.step(xpos[chunk], ypos[chunk], zpos[chunk], time_index, box)
+            new_xpos[chunk], new_ypos[chunk], new_zpos[chunk] = result
+
+        return new_xpos, new_ypos, new_zpos
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Stop the worker processes and remove all shared memory.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        for read_index in list(self.shared):
+            self.release_fields(read_index)
@@ -9,14 +9,19 @@
 #           that have usable data for their entire integration and trajectories
 #           that have usable data for a certain period of time (set by user).
 #
-# Syntax: python3 calc_back_traj_vort_tendency.py model_version parcel_label
+# Syntax: python3 calc_back_traj_vort_tendency.py model_version parcel_label [direct=Y]
 #
 #   Input: A back trajectory numpy archive, named "backtraj_(parcel_label).npz",
 #           and netCDF files named "(model_version)_direct_vort_equation.nc"
 #           and "(model_version)_direct_vort_equation.nc".
+#          direct=Y: calculate the terms of the vorticity equation at the
+#                    parcel positions from the CM1 output files (see
+#                    parcel_vort_terms.py) instead of interpolating them from
+#                    the output of calc_vort_equation.py, which is not needed
 #
 # Execution Example:
 #   python3  calc_back_traj_vort_tendency.py v5 v5_meso_tornadogenesis
+#   python3  calc_back_traj_vort_tendency.py v5 v5_meso_tornadogenesis direct=Y
 #
 # Temporary Execution Example (Run local script on server):
 #   ssh vortex python < calc_back_traj_vort_tendency.py - v5 v5_meso_tornadogenesis
@@ -25,12 +30,29 @@
 #   2021/09/15 - Lance Wilson:  Created, partially from unstaggered_trajectory_test.py,
 #                               some pieces from code written by Tom Gowan, using
 #                               trajectories_CM1.ipynb from: https://github.com/tomgowan/trajectories/blob/master/trajectories_CM1.ipynb
+#   2026/10/17 - Lance Wilson:  Added direct option to calculate the vorticity
+#                               equation terms at the parcels from the model
+#                               output.
+#   2026/10/17 - Lance Wilson:  interpolate_budget now loops over time first
+#                               and calculates the interpolation weights once
+#                               for all variables on the same grid.
+#   2026/10/17 - Lance Wilson:  Only the grid points around the parcels are
+#                               read from the input files (stencil_reader.py).
+#   2026/10/17 - Lance Wilson:  Replaced the loops over parcels that find the
+#                               fully and partially valid trajectories with
+#                               classify_trajectories.
 #
 
+from grid_interp import Grid_weights
+from parcel_vort_terms import Parcel_vort_terms, term_definitions
+from stencil_reader import Stencil_reader
+from vort_derivatives import term_names
+
 from netCDF4 import Dataset
+from netCDF4 import MFDataset
 import atexit
+import glob
 import numpy as np
-from scipy import interpolate
 import sys
 import time
 
@@ -86,70 +108,143 @@ def create_time_var(ds_in, ds_out, file_num_offset, parcel_time_steps):
     return
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def interpolate_budget(ds_in, ds_out, xpos, ypos, zpos, file_num_offset, parcel_time_steps):
-    # Coordinates (in meters) in each dimension (already converted to meters
-    #   in ds_in netCDF file).
-    x_coord = np.copy(ds_in.variables['xh'])
-    y_coord = np.copy(ds_in.variables['yh'])
-    z_coord = np.copy(ds_in.variables['z'])
-
-    # Create a tuple of the coordinates that is passed to the interpn function
-    #   to be used as the regular grid.
-    grid_coord = (z_coord,y_coord,x_coord)
-
-    #for var_name in variables:
-    for var_name in ds_in.variables.keys():
-        if len(ds_in.variables[var_name].dimensions) == 4:
-            # Timer
-            start = time.time()
-
-            # Create netCDF variable to store the interpolated values for this variable.
-            vort_var = ds_out.createVariable(var_name, np.float32, ('time', 'number_parcels'))
-            vort_var.units = ds_in.variables[var_name].units
-            vort_var.definition = ds_in.variables[var_name].definition
-
-            # Loop over the model files that are in the range of the parcel data.
-            for model_time_step in range(file_num_offset+1, file_num_offset+parcel_time_steps+1):
-                # Calculate the array index for the back trajectories, which go
-                #   backward in time with increasing index.
-                parcel_time_step = file_num_offset + parcel_time_steps - model_time_step
-
-                # Get values of this budget variable at this time step.
-                variable = np.copy(ds_in.variables[var_name][model_time_step,:,:,:])
-
-                # Get back trajectory coordinates at this time step.
-                x_traj_coord = xpos[parcel_time_step]
-                y_traj_coord = ypos[parcel_time_step]
-                z_traj_coord = zpos[parcel_time_step]
-
-                # Create array representing the points that the budget variable is
-                #   going to be sampled at.
-                ##traj_points = np.stack((z_coord, y_coord, x_coord), axis = 1)
-                traj_points = np.column_stack((z_traj_coord, y_traj_coord, x_traj_coord))
+def interpolate_budget(ds_list, ds_out, xpos, ypos, zpos, file_num_offset, parcel_time_steps):
+    # Timer
+    start = time.time()
+
+    # Grid coordinates, readers, and output variables for each input file.
+    grid_coords = []
+    stencil_readers = []
+    var_lists = []
+    for ds_in in ds_list:
+        # Coordinates (in meters) in each dimension (already converted to meters
+        #   in ds_in netCDF file).
+        x_coord = np.copy(ds_in.variables['xh'])
+        y_coord = np.copy(ds_in.variables['yh'])
+        z_coord = np.copy(ds_in.variables['z'])
+
+        # Create a tuple of the coordinates that is used as the regular grid.
+        grid_coords.append((z_coord,y_coord,x_coord))
+        stencil_readers.append(Stencil_reader((len(z_coord), len(y_coord), len(x_coord))))
+
+        vort_vars = []
+        for var_name in ds_in.variables.keys():
+            if len(ds_in.variables[var_name].dimensions) == 4:
+                # Create netCDF variable to store the interpolated values for this variable.
+                vort_var = ds_out.createVariable(var_name, np.float32, ('time', 'number_parcels'))
+                vort_var.units = ds_in.variables[var_name].units
+                vort_var.definition = ds_in.variables[var_name].definition
+                vort_vars.append((var_name, vort_var))
+        var_lists.append(vort_vars)
+
+    # Loop over the model files that are in the range of the parcel data.
+    for model_time_step in range(file_num_offset+1, file_num_offset+parcel_time_steps+1):
+        # Calculate the array index for the back trajectories, which go
+        #   backward in time with increasing index.
+        parcel_time_step = file_num_offset + parcel_time_steps - model_time_step
+
+        # Get back trajectory coordinates at this time step.
+        x_traj_coord = xpos[parcel_time_step]
+        y_traj_coord = ypos[parcel_time_step]
+        z_traj_coord = zpos[parcel_time_step]
+
+        # Create array representing the points that the budget variables are
+        #   going to be sampled at.
+        traj_points = np.column_stack((z_traj_coord, y_traj_coord, x_traj_coord))
+
+        for ds_in, grid_coord, stencil_reader, vort_vars in zip(ds_list, grid_coords, stencil_readers, var_lists):
+            # Grid cell indices and weights of the back trajectory points,
+            #   calculated once and used for every variable on this grid.
+            weights = Grid_weights(grid_coord, traj_points)
+            # Parts of the grid around the points that need to be read.
+            stencil_reader.set_points(weights)
+
+            for var_name, vort_var in vort_vars:
+                # Get values of this budget variable around the back trajectory
+                #   points at this time step.
+                variable = stencil_reader.read(ds_in.variables[var_name], model_time_step)
 
                 # Interpolate the budget variable to the back trajectory points and
                 #   output to the netCDF file.
-                vort_var[parcel_time_step,:] = interpolate.interpn(grid_coord, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
+                vort_var[parcel_time_step,:] = weights.interp(variable)
+
+    end = time.time()
+    print('{:d} variables took {:.2f} seconds'.format(sum([len(vort_vars) for vort_vars in var_lists]), end-start))
+
+    return
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Calculate the terms of the vorticity equation at the back trajectory
+#   positions directly from the model output (Parcel_vort_terms), with the
+#   same variables and time steps as interpolating the output of
+#   calc_vort_equation.py with interpolate_budget.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def interpolate_direct(parcel_vort_terms, ds_out, xpos, ypos, zpos, file_num_offset, parcel_time_steps):
+    # Timer
+    start = time.time()
 
-            end = time.time()
-            print('Variable {:s} took {:.2f} seconds'.format(var_name, end-start))
+    # Create netCDF variables to store the values of each term.
+    vort_vars = {}
+    for term_name in term_names:
+        vort_vars[term_name] = ds_out.createVariable(term_name, np.float32, ('time', 'number_parcels'))
+        vort_vars[term_name].units = 's^-2'
+        vort_vars[term_name].definition = term_definitions[term_name]
+
+    # Loop over the model files that are in the range of the parcel data.
+    for model_time_step in range(file_num_offset+1, file_num_offset+parcel_time_steps+1):
+        # Calculate the array index for the back trajectories, which go
+        #   backward in time with increasing index.
+        parcel_time_step = file_num_offset + parcel_time_steps - model_time_step
+
+        terms = parcel_vort_terms.calc_terms(model_time_step, xpos[parcel_time_step], ypos[parcel_time_step], zpos[parcel_time_step])
+
+        for term_name in term_names:
+            vort_vars[term_name][parcel_time_step,:] = terms[term_name]
+
+    end = time.time()
+    print('Vorticity equation terms took {:.2f} seconds'.format(end-start))
 
     return
 
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Find the first unusable position (nan, or below min_usable_z_height) of
+#   each trajectory from (time, parcel) position arrays.
+#   Returns:
+#       first_invalid: index of the first unusable position of each parcel,
+#                      or -1 if all of its positions are usable
+#       fully_valid: True for parcels with no unusable positions
+#       partially_valid: True for parcels with at least
+#                        time_length_requirement usable positions before the
+#                        first unusable one
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def classify_trajectories(xpos, ypos, zpos, min_usable_z_height, time_length_requirement):
+    # Comparisons with nan are False, so nan heights are caught by isnan.
+    invalid = np.isnan(xpos) | np.isnan(ypos) | np.isnan(zpos) | (zpos < min_usable_z_height)
+
+    fully_valid = ~np.any(invalid, axis=0)
+    # argmax gives the first True value along the time axis (0 if there are
+    #   none, which are the fully valid parcels).
+    first_invalid = np.where(fully_valid, -1, np.argmax(invalid, axis=0))
+    partially_valid = first_invalid >= time_length_requirement
+
+    return first_invalid, fully_valid, partially_valid
+
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 def closeNCfile(ds):
     ds.close()
     return
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-if len(sys.argv) > 2:
+mandatory_arg_num = 2
+
+if len(sys.argv) > mandatory_arg_num:
     # Model run that is being used.
     version_number = sys.argv[1]
     # Set of back trajectories to analyze.
     parcel_label = sys.argv[2]
 else:
     print('Parcel label or version number was not specified.')
-    print('Syntax: python3 calc_back_traj_vort_tendency.py model_version parcel_label')
+    print('Syntax: python3 calc_back_traj_vort_tendency.py model_version parcel_label [direct=Y]')
     print('Example: python3 calc_back_traj_vort_tendency.py v5 v5_meso_tornadogenesis')
     print('Currently supported version numbers: 4, 5')
     sys.exit()
@@ -159,6 +254,13 @@ if version_number == '3' or version_number =='10s':
     print('Currently supported version numbers: 4, 5')
     sys.exit()
 
+# Optional command-line arguments.
+direct = 'N'
+if len(sys.argv) > mandatory_arg_num + 1:
+    for option in sys.argv[mandatory_arg_num+1:]:
+        if option.startswith('direct='):
+            direct = option.split('=')[-1].upper()
+
 # Directory containing back trajectory data (in numpy archive format).
 back_traj_dir = 'back_traj_npz_{:s}/'.format(version_number)
 # Directory containing CM1 model netCDF files.
@@ -187,81 +289,46 @@ file_num_offset = traj_data['offset'] + 0
 # Number of back trajectory parcel output times.
 parcel_time_steps = len(xpos)
 
-# Counter for the number of trajectories that have a full set of usable data.
-fully_valid_traj_num = 0
-# Counter for the number of trajectories that are valid up to the specified time length requirement.
-partially_valid_traj_num = 0
-# Array for the first index with an unusable parcel position.
-first_invalid = np.zeros((total_parcel_num))
-
-for i in range(total_parcel_num):
-    # Check for indices with nan in a given trajectory. 
-    x_nan = np.argwhere(np.isnan(xpos[:,i]))
-    y_nan = np.argwhere(np.isnan(ypos[:,i]))
-    z_nan = np.argwhere(np.isnan(zpos[:,i]))
-    # Check for indices where the trajectory is below the minimum usable threshold
-    z_less = np.argwhere(zpos[:,i] < min_usable_z_height)
-
-    # If size of all check arrays is 0, then there is no unusable data, so
-    #   trajectory is fully valid.  First invalid index is set to -1 to be
-    #   easily identifiable later.
-    if x_nan.size == 0 and y_nan.size == 0 and z_nan.size == 0 and z_less.size == 0:
-        fully_valid_traj_num += 1
-        first_invalid[i] = -1
-    # Otherwise, find the minimum index from each check, and set the first
-    #   invalid index to that value (Comparison with time_length_requirement
-    #   done later).
-    else:
-        # If only some of the check arrays have a size of 0, just taking
-        #   np.min() will return an error. For these cases, set the min at a
-        #   value greater than the number of parcel time steps so that it does
-        #   not get selected as the first invalid index. 
-        x_nan_min = parcel_time_steps + 1 if x_nan.size == 0 else np.min(x_nan)
-        y_nan_min = parcel_time_steps + 1 if y_nan.size == 0 else np.min(y_nan)
-        z_nan_min = parcel_time_steps + 1 if z_nan.size == 0 else np.min(z_nan)
-        z_less_min = parcel_time_steps + 1 if z_less.size == 0 else np.min(z_less)
-        first_invalid[i] = np.min([x_nan_min, y_nan_min, z_nan_min, z_less_min])
-        if first_invalid[i] >= time_length_requirement:
-            partially_valid_traj_num += 1
-
-# Arrays for back trajectories that have a full set of usable data.
-xpos_fully_valid = np.zeros((parcel_time_steps, fully_valid_traj_num))
-ypos_fully_valid = np.zeros((parcel_time_steps, fully_valid_traj_num))
-zpos_fully_valid = np.zeros((parcel_time_steps, fully_valid_traj_num))
-
-# Arrays for back trajectories that are valid up to the specified time length requirement.
-xpos_partially_valid = np.zeros((time_length_requirement, partially_valid_traj_num))
-ypos_partially_valid = np.zeros((time_length_requirement, partially_valid_traj_num))
-zpos_partially_valid = np.zeros((time_length_requirement, partially_valid_traj_num))
-
-# Fully Valid Counter
-j = 0
-# Partially Valid Counter
-k = 0
+# Classify the trajectories by their first unusable position.
+first_invalid, fully_valid, partially_valid = classify_trajectories(xpos, ypos, zpos, min_usable_z_height, time_length_requirement)
+
+# Number of trajectories that have a full set of usable data.
+fully_valid_traj_num = int(np.count_nonzero(fully_valid))
+# Number of trajectories that are valid up to the specified time length requirement.
+partially_valid_traj_num = int(np.count_nonzero(partially_valid))
+
 # Store back trajectories with all usable data or selected amount of partially
-#   usable data into different arrays. 
-for i in range(total_parcel_num):
-    if first_invalid[i] == -1:
-        xpos_fully_valid[:,j] = xpos[:,i]
-        ypos_fully_valid[:,j] = ypos[:,i]
-        zpos_fully_valid[:,j] = zpos[:,i]
-        j += 1
-    elif first_invalid[i] >= time_length_requirement:
-        xpos_partially_valid[:,k] = xpos[:,i][:time_length_requirement]
-        ypos_partially_valid[:,k] = ypos[:,i][:time_length_requirement]
-        zpos_partially_valid[:,k] = zpos[:,i][:time_length_requirement]
-        k += 1
-
-# Open the netCDF file with values from direct calculation of terms from the vorticity equation.
-ds_equation = Dataset(model_dir + 'back_traj_analysis/{:s}_direct_vort_equation.nc'.format(version_number))
-# Close the netCDF file when the program exits.
-atexit.register(closeNCfile, ds_equation)
+#   usable data into different arrays.
+xpos_fully_valid = xpos[:,fully_valid]
+ypos_fully_valid = ypos[:,fully_valid]
+zpos_fully_valid = zpos[:,fully_valid]
+
+xpos_partially_valid = xpos[:time_length_requirement,partially_valid]
+ypos_partially_valid = ypos[:time_length_requirement,partially_valid]
+zpos_partially_valid = zpos[:time_length_requirement,partially_valid]
+
+if direct == 'Y':
+    # Open the CM1 output files (sorted, so that the time index is the same as
+    #   in the output of calc_vort_equation.py).
+    ds_model = MFDataset(sorted(glob.glob(model_dir + 'JS_75m_run*_[0-9]*.nc')))
+    # Close the netCDF files when the program exits.
+    atexit.register(closeNCfile, ds_model)
+
+    parcel_vort_terms = Parcel_vort_terms(ds_model)
+else:
+    # Open the netCDF file with values from direct calculation of terms from the vorticity equation.
+    ds_equation = Dataset(model_dir + 'back_traj_analysis/{:s}_direct_vort_equation.nc'.format(version_number))
+    # Close the netCDF file when the program exits.
+    atexit.register(closeNCfile, ds_equation)
 
 # Open the netCDF file with values from CM1 calculations of vorticity budgets.
 ds_budget = Dataset(model_dir + 'back_traj_analysis/{:s}_model_vort_budget.nc'.format(version_number))
 # Close the netCDF file when the program exits.
 atexit.register(closeNCfile, ds_budget)
 
+# Output times are taken from the vorticity equation file if it is used.
+ds_time = ds_budget if direct == 'Y' else ds_equation
+
 # Only attempt to calculate fully valid trajectory data if there are fully
 #   valid trajectories.
 if fully_valid_traj_num > 0:
@@ -269,17 +336,22 @@ if fully_valid_traj_num > 0:
     #   a full set of usable data.
     ds_out_full = create_nc_out(version_number, parcel_label, 'fully', fully_valid_traj_num, xpos_fully_valid, ypos_fully_valid, zpos_fully_valid, file_num_offset, model_dir)
 
-    create_time_var(ds_equation, ds_out_full, file_num_offset, parcel_time_steps)
+    create_time_var(ds_time, ds_out_full, file_num_offset, parcel_time_steps)
 
-    print('Interpolating vorticity equation to fully valid values.')
-    # Interpolate values of the vorticity equation to trajectory positions that
-    #   have a full set of usable data.
-    interpolate_budget(ds_equation, ds_out_full, xpos_fully_valid, ypos_fully_valid, zpos_fully_valid, file_num_offset, parcel_time_steps)
+    if direct == 'Y':
+        print('Calculating vorticity equation at fully valid values.')
+        interpolate_direct(parcel_vort_terms, ds_out_full, xpos_fully_valid, ypos_fully_valid, zpos_fully_valid, file_num_offset, parcel_time_steps)
 
-    print('Interpolating model vorticity budget to fully valid values.')
-    # Interpolate values of CM1-calculated vorticity budget variables to trajectory
-    #   positions that have a full set of usable data.
-    interpolate_budget(ds_budget, ds_out_full, xpos_fully_valid, ypos_fully_valid, zpos_fully_valid, file_num_offset, parcel_time_steps)
+        print('Interpolating model vorticity budget to fully valid values.')
+        # Interpolate values of CM1-calculated vorticity budget variables to trajectory
+        #   positions that have a full set of usable data.
+        interpolate_budget([ds_budget], ds_out_full, xpos_fully_valid, ypos_fully_valid, zpos_fully_valid, file_num_offset, parcel_time_steps)
+    else:
+        print('Interpolating vorticity equation and model vorticity budget to fully valid values.')
+        # Interpolate values of the vorticity equation and CM1-calculated
+        #   vorticity budget variables to trajectory positions that have a full
+        #   set of usable data.
+        interpolate_budget([ds_equation, ds_budget], ds_out_full, xpos_fully_valid, ypos_fully_valid, zpos_fully_valid, file_num_offset, parcel_time_steps)
 
     ds_out_full.close()
 else:
@@ -292,17 +364,22 @@ if partially_valid_traj_num > 0:
     #   are valid up to the specified time length requirement.
     ds_out_partial = create_nc_out(version_number, parcel_label, 'partially', partially_valid_traj_num, xpos_partially_valid, ypos_partially_valid, zpos_partially_valid, file_num_offset, model_dir)
 
-    create_time_var(ds_equation, ds_out_partial, file_num_offset, time_length_requirement)
+    create_time_var(ds_time, ds_out_partial, file_num_offset, time_length_requirement)
 
-    print('Interpolating vorticity equation to partially valid values.')
-    # Interpolate values of the vorticity equation to trajectory positions that
-    #   are valid up to the specified time length requirement.
-    interpolate_budget(ds_equation, ds_out_partial, xpos_partially_valid, ypos_partially_valid, zpos_partially_valid, file_num_offset, time_length_requirement)
+    if direct == 'Y':
+        print('Calculating vorticity equation at partially valid values.')
+        interpolate_direct(parcel_vort_terms, ds_out_partial, xpos_partially_valid, ypos_partially_valid, zpos_partially_valid, file_num_offset, time_length_requirement)
 
-    print('Interpolating model vorticity budget to partially valid values.')
-    # Interpolate values of CM1-calculated vorticity budget variables to trajectory
-    #   positions that are valid up to the specified time length requirement.
-    interpolate_budget(ds_budget, ds_out_partial, xpos_partially_valid, ypos_partially_valid, zpos_partially_valid, file_num_offset, time_length_requirement)
+        print('Interpolating model vorticity budget to partially valid values.')
+        # Interpolate values of CM1-calculated vorticity budget variables to trajectory
+        #   positions that are valid up to the specified time length requirement.
+        interpolate_budget([ds_budget], ds_out_partial, xpos_partially_valid, ypos_partially_valid, zpos_partially_valid, file_num_offset, time_length_requirement)
+    else:
+        print('Interpolating vorticity equation and model vorticity budget to partially valid values.')
+        # Interpolate values of the vorticity equation and CM1-calculated
+        #   vorticity budget variables to trajectory positions that are valid up
+        #   to the specified time length requirement.
+        interpolate_budget([ds_equation, ds_budget], ds_out_partial, xpos_partially_valid, ypos_partially_valid, zpos_partially_valid, file_num_offset, time_length_requirement)
 
     ds_out_partial.close()
 else:
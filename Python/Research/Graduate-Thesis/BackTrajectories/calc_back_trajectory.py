@@ -5,12 +5,45 @@
 #
 # Purpose:  Calculate backwards for trajectories for CM1 model data.
 #
-# Syntax: python3 calc_back_trajectory.py version_number parcel_label
+# Syntax: python3 calc_back_trajectory.py version_number parcel_label[,parcel_label2,...] [subdomain=Y] [halo=num_points] [prefetch=Y] [integrator=euler|rk2|rk4] [substeps=num_steps] [file_stride=num_files] [workers=num_processes] [checkpoint=num_steps] [restart=Y]
 #
 #   Input:
+#       parcel_label: one or more labels from back_trajectory_start_pos
+#                     (separated by commas); each model file is read once for
+#                     all of the labels, and each label is saved to its own
+#                     backtraj_<label>.npz file
+#       subdomain=Y: read only the wind data in a box around the parcels
+#                    instead of the full model domain
+#       halo: number of grid points around the parcels in the box (default 10)
+#       prefetch=Y: read the wind data for the next time step on a background
+#                   thread while the current time step is calculated
+#       integrator: time integration scheme (default euler, the wind at the
+#                   later model time is used for the whole step); rk2 and rk4
+#                   linearly interpolate the wind in time between model files
+#       substeps: number of integration steps between model output times
+#                 (default 1)
+#       file_stride: read wind data from every Nth model file (default 1); the
+#                    wind is interpolated in time between the files that are
+#                    read, and positions are still saved at every output time
+#       workers: number of processes used to integrate the parcels (default 1);
+#                the wind data is shared between processes, and the results
+#                are the same as with one process
+#       checkpoint: number of time steps between checkpoints (default 0, no
+#                   checkpoints); positions are written to .npy files in the
+#                   output directory as they are calculated, and the number of
+#                   completed time steps is saved in backtraj_<label>_checkpoint.npz
+#       restart=Y: continue from the last checkpoint of each label (labels
+#                  without a checkpoint start from the beginning)
 #
 # Execution Example:
 #   python3 calc_back_trajectory.py v3 downdraft
+#   python3 calc_back_trajectory.py v5 tornado subdomain=Y halo=12
+#   python3 calc_back_trajectory.py v5 tornado subdomain=Y prefetch=Y
+#   python3 calc_back_trajectory.py v5 tornado integrator=rk4 substeps=2 file_stride=6
+#   python3 calc_back_trajectory.py v5 tornado subdomain=Y prefetch=Y workers=32
+#   python3 calc_back_trajectory.py v5 tornado checkpoint=10
+#   python3 calc_back_trajectory.py v5 tornado checkpoint=10 restart=Y
+#   python3 calc_back_trajectory.py v4 v4_meso_10min_before_genesis,v4_meso_5min_before_genesis subdomain=Y
 #
 # Modification History:
 #   2019/09/13 - Lance Wilson:  Modified from code written by Tom Gowan, using
@@ -25,31 +58,85 @@
 #                               to be one grid point off from the desired value.
 #   2021/12/18 - Lance Wilson:  Renamed from calc_back_traj_meters_corrected.py
 #                               to calc_back_trajectory.py.
+#   2026/10/17 - Lance Wilson:  Interpolation weights for the parcel positions
+#                               are now calculated once per time step and shared
+#                               between u, v, and w (grid_interp.Wind_interp)
+#                               instead of three separate interpn calls.
+#   2026/10/17 - Lance Wilson:  Added option to read only a subdomain of the
+#                               wind data surrounding the parcels (using
+#                               cm1_wind_reader.Wind_reader).
+#   2026/10/17 - Lance Wilson:  Added option to read wind data ahead of time on
+#                               a background thread (Prefetch_wind_reader).
+#   2026/10/17 - Lance Wilson:  Added RK2 and RK4 integration, sub-steps, and
+#                               reading every Nth model file, with winds
+#                               interpolated in time (Back_traj_integrator).
+#   2026/10/17 - Lance Wilson:  Multiple parcel labels can be calculated at
+#                               once, reading each model file only once.
+#   2026/10/17 - Lance Wilson:  Added option to integrate the parcels on a
+#                               pool of processes (Parallel_back_traj).
+#   2026/10/17 - Lance Wilson:  Added periodic checkpoints and restarting, with
+#                               positions streamed to .npy files on disk.
 #
 
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
 
 import back_trajectory_start_pos
+from back_traj_integrator import Back_traj_integrator
+from back_traj_parallel import Parallel_back_traj
+from calc_parcel_bounds import calc_parcel_box, merge_boxes, parcels_in_box
+from cm1_wind_reader import Prefetch_wind_reader, Wind_reader
 import itertools
 import numpy as np
 import os
-from scipy import interpolate
 import sys
 import time
 
-if len(sys.argv) > 2:
+mandatory_arg_num = 2
+
+if len(sys.argv) > mandatory_arg_num:
     # Model run used to calculate trajectories.
     version_number = sys.argv[1]
-    # Label for output file name.
+    # Label(s) for output file name.
     parcel_label = sys.argv[2]
 else:
     print('Parcel label or version number was not specified.')
-    print('Syntax: python3 calc_back_trajectory.py version_number parcel_label')
+    print('Syntax: python3 calc_back_trajectory.py version_number parcel_label[,parcel_label2,...] [subdomain=Y] [halo=num_points] [prefetch=Y] [integrator=euler|rk2|rk4] [substeps=num_steps] [file_stride=num_files] [workers=num_processes] [checkpoint=num_steps] [restart=Y]')
     print('Example: python3 calc_back_trajectory.py v3 downdraft')
     print('Currently supported version numbers: v3, 10s, v4, v5')
     sys.exit()
 
+# Optional command-line arguments.
+subdomain = 'N'
+subdomain_halo = 10
+prefetch = 'N'
+integration_method = 'euler'
+num_substeps = 1
+file_stride = 1
+num_workers = 1
+checkpoint_interval = 0
+restart = 'N'
+if len(sys.argv) > mandatory_arg_num + 1:
+    for option in sys.argv[mandatory_arg_num+1:]:
+        if option.startswith('subdomain='):
+            subdomain = option.split('=')[-1].upper()
+        if option.startswith('halo='):
+            subdomain_halo = int(option.split('=')[-1])
+        if option.startswith('prefetch='):
+            prefetch = option.split('=')[-1].upper()
+        if option.startswith('integrator='):
+            integration_method = option.split('=')[-1].lower()
+        if option.startswith('substeps='):
+            num_substeps = int(option.split('=')[-1])
+        if option.startswith('file_stride='):
+            file_stride = int(option.split('=')[-1])
+        if option.startswith('workers='):
+            num_workers = int(option.split('=')[-1])
+        if option.startswith('checkpoint='):
+            checkpoint_interval = int(option.split('=')[-1])
+        if option.startswith('restart='):
+            restart = option.split('=')[-1].upper()
+
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # User-defined values and constants.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -63,119 +150,226 @@ model_dir = '75m_100p_{:s}/'.format(version_number)
 # (unless you have interpolated u, v, and w to the scalar grid, they are most likely on the staggered grid (set by user)
 staggered = 'Y'
 
-# Directory to store the output file
+# If reading a subdomain, a new box is calculated when any parcel gets within
+#   this many grid points of the edge of the current box (set by user).
+subdomain_edge_buffer = 3
+
+# Maximum number of time steps of wind data read ahead of the calculation if
+#   prefetch is 'Y' (set by user).
+prefetch_buffer_size = 2
+
+# Directory to store the output files
 output_dir = 'back_traj_npz_{:s}/'.format(version_number)
-# Name of the output numpy archive.
-output_file_name = output_dir + 'backtraj_{:s}'.format(parcel_label)
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+# Positions are written to disk as they are calculated (instead of being held
+#   in memory until the end) if checkpoints are being used.
+stream_output = checkpoint_interval > 0 or restart == 'Y'
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Names of the files holding the positions of a label while they are being
+#   calculated, and the checkpoint file with the number of completed steps.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def position_file_name(label, var_name):
+    return output_dir + 'backtraj_{:s}_{:s}.npy'.format(label, var_name)
+
+def checkpoint_file_name(label):
+    return output_dir + 'backtraj_{:s}_checkpoint.npz'.format(label)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Write the positions calculated so far to disk and save the number of time
+#   steps that are complete.  The checkpoint is written to a temporary file
+#   first so that an interrupted write does not replace a good checkpoint.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def write_checkpoint(label):
+    for var_name in ['xpos', 'ypos', 'zpos']:
+        label_data[label][var_name].flush()
+
+    temp_file_name = output_dir + 'backtraj_{:s}_checkpoint_temp.npz'.format(label)
+    np.savez(temp_file_name, completed_steps=label_data[label]['completed_steps'], file_calc_start=start_pos[label]['file_calc_start'], time_steps=time_steps)
+    os.replace(temp_file_name, checkpoint_file_name(label))
+
+# More than one parcel label can be given (separated by commas), in which case
+#   each model file is read once and used for all of the labels that need it.
+parcel_labels = parcel_label.split(',')
 
 # Get starting positions from dictionary in back_trajectory_start_pos.
-start_pos = back_trajectory_start_pos.get_start_pos(parcel_label)
-file_calc_start = start_pos['file_calc_start']
+start_pos = {label: back_trajectory_start_pos.get_start_pos(label) for label in parcel_labels}
 
 if version_number.startswith('v'):
     run_number = int(version_number[-1])
 else:
     run_number = 3
 
-# Number to subtract from start_time_step if not using entire dataset.
-start_file_num = file_calc_start - time_steps
+# Range of model files needed by all of the labels (each label uses the
+#   time_steps files before its file_calc_start).
+first_file_num = min([start_pos[label]['file_calc_start'] for label in parcel_labels]) - time_steps
+last_file_num = max([start_pos[label]['file_calc_start'] for label in parcel_labels])
 
 # List of CM1 files in the time span that is going to be used to calculate trajectories.
-file_list = [model_dir + 'JS_75m_run{:d}_{:06d}.nc'.format(run_number, file_num) for file_num in range(start_file_num,file_calc_start+1)]
+file_list = [model_dir + 'JS_75m_run{:d}_{:06d}.nc'.format(run_number, file_num) for file_num in range(first_file_num,last_file_num+1)]
 ds = MFDataset(file_list)
 
-# Unstaggered coordinates (converted to meters) in each dimension.
-x = np.copy(ds.variables['xh'])*1000.
-y = np.copy(ds.variables['yh'])*1000.
-z = np.copy(ds.variables['z'])*1000.
-
-# To use the staggered wind values, the main grid used for interpolation must
-#   use the staggered coordinates.
-if staggered == 'Y':
-    x_stag = np.copy(ds.variables['xf'])*1000.
-    y_stag = np.copy(ds.variables['yf'])*1000.
-    z_stag = np.copy(ds.variables['zf'])*1000.
-# If the wind data is not staggered, then the regular grid points can be used.
+# Trajectory data for each label.
+label_data = {}
+for label in parcel_labels:
+    file_calc_start = start_pos[label]['file_calc_start']
+
+    # Number starting values in each dimension.
+    num_start_x = start_pos[label]['num_start_x']
+    num_start_y = start_pos[label]['num_start_y']
+    num_start_z = start_pos[label]['num_start_z']
+
+    # Number of parcels (from user-specified dimensions)
+    num_parcels = num_start_x * num_start_y * num_start_z
+
+    # Continue from the positions saved at the last checkpoint.
+    if restart == 'Y' and os.path.exists(checkpoint_file_name(label)):
+        checkpoint = np.load(checkpoint_file_name(label))
+        if checkpoint['file_calc_start'] != file_calc_start or checkpoint['time_steps'] != time_steps:
+            print('Checkpoint for {:s} does not match the current settings (file_calc_start, time_steps).'.format(label))
+            sys.exit()
+
+        # Number of time steps of positions that have been calculated.
+        completed_steps = int(checkpoint['completed_steps'])
+
+        xpos = np.lib.format.open_memmap(position_file_name(label, 'xpos'), mode='r+')
+        ypos = np.lib.format.open_memmap(position_file_name(label, 'ypos'), mode='r+')
+        zpos = np.lib.format.open_memmap(position_file_name(label, 'zpos'), mode='r+')
+
+        print('Restarting {:s} from time step {:d}'.format(label, completed_steps-1))
+    else:
+        completed_steps = 1
+
+        # Trajectory locations (meters from center of model grid).
+        if stream_output:
+            xpos = np.lib.format.open_memmap(position_file_name(label, 'xpos'), mode='w+', dtype=np.float64, shape=(time_steps, num_parcels))
+            ypos = np.lib.format.open_memmap(position_file_name(label, 'ypos'), mode='w+', dtype=np.float64, shape=(time_steps, num_parcels))
+            zpos = np.lib.format.open_memmap(position_file_name(label, 'zpos'), mode='w+', dtype=np.float64, shape=(time_steps, num_parcels))
+        else:
+            xpos = np.zeros((time_steps, num_parcels))
+            ypos = np.zeros((time_steps, num_parcels))
+            zpos = np.zeros((time_steps, num_parcels))
+
+        # Setup the starting trajectory positions (based on grid defined in
+        #   back_trajectory_start_pos).
+        for i,j,k in itertools.product(range(num_start_x), range(num_start_y), range(num_start_z)):
+            cur_parcel_num = i*num_start_y*num_start_z + j*num_start_z + k
+            xpos[0,cur_parcel_num] = start_pos[label]['x_start'] + start_pos[label]['x_increment'] * i
+            ypos[0,cur_parcel_num] = start_pos[label]['y_start'] + start_pos[label]['y_increment'] * j
+            zpos[0,cur_parcel_num] = start_pos[label]['z_start'] + start_pos[label]['z_increment'] * k
+
+    label_data[label] = {'xpos': xpos, 'ypos': ypos, 'zpos': zpos,
+                         'completed_steps': completed_steps,
+                         # Time step (in the combined dataset) to start
+                         #   backward trajectories at.
+                         # Start in downdraft at time 7200: file_calc_start = 221
+                         # Start in SVC at time 7560: file_calc_start = 257
+                         'start_time_step': file_calc_start - first_file_num,
+                         'offset': file_calc_start - time_steps,
+                         'parcel_dimension': np.array((num_start_x, num_start_y, num_start_z)),
+                         'box': None}
+
+# First and last time steps of all labels.
+start_time_step = last_file_num - first_file_num
+end_time_step = min([label_data[label]['start_time_step'] for label in parcel_labels]) - (time_steps-1)
+
+# Time steps of the model files that wind data is read from (every file unless
+#   file_stride is greater than 1), always including the last one needed.
+read_time_steps = list(range(start_time_step, end_time_step, -file_stride)) + [end_time_step]
+
+# First time step that still needs to be calculated for any label (the same
+#   as start_time_step unless restarting).
+resume_time_step = max([label_data[label]['start_time_step'] - (label_data[label]['completed_steps']-1) for label in parcel_labels])
+
+# Reads the wind data (and coordinates) from the model dataset, in the order
+#   that the time steps are used (skipping files only needed before the
+#   restart).
+if prefetch == 'Y':
+    resume_read_step = min([read_step for read_step in read_time_steps if read_step >= resume_time_step])
+    wind_reader = Prefetch_wind_reader(ds, staggered, [read_step for read_step in read_time_steps if read_step <= resume_read_step], prefetch_buffer_size)
 else:
-    x_stag = x
-    y_stag = y
-    z_stag = z
-
-# Number starting values in each dimension.
-num_start_x = start_pos['num_start_x']
-num_start_y = start_pos['num_start_y']
-num_start_z = start_pos['num_start_z']
-
-# Number of parcels (from user-specified dimensions)
-num_parcels = num_start_x * num_start_y * num_start_z
-
-# Time step to start backward trajectories at (set by user) 
-# Start in downdraft at time 7200: file_calc_start = 221
-# Start in SVC at time 7560: file_calc_start = 257
-start_time_step = file_calc_start - start_file_num
-
-# Model output time step length (seconds)
-time_step_lengths = ds.variables['time'][1:] - ds.variables['time'][:-1]
-
-# Trajectory locations (meters from center of model grid).
-xpos = np.zeros((time_steps, num_parcels))
-ypos = np.zeros((time_steps, num_parcels))
-zpos = np.zeros((time_steps, num_parcels))
-
-# Setup the starting trajectory positions (based on grid defined in
-#   back_trajectory_start_pos).
-for i,j,k in itertools.product(range(num_start_x), range(num_start_y), range(num_start_z)):
-    cur_parcel_num = i*num_start_y*num_start_z + j*num_start_z + k
-    xpos[0,cur_parcel_num] = start_pos['x_start'] + start_pos['x_increment'] * i
-    ypos[0,cur_parcel_num] = start_pos['y_start'] + start_pos['y_increment'] * j
-    zpos[0,cur_parcel_num] = start_pos['z_start'] + start_pos['z_increment'] * k
+    wind_reader = Wind_reader(ds, staggered)
+
+# Integrates the parcels back from one model output time to the previous one.
+integrator = Back_traj_integrator(wind_reader, ds.variables['time'][:], read_time_steps, integration_method, num_substeps, subdomain_halo)
+
+# With more than one worker, the parcels are split between processes that
+#   share the wind data read by this process.
+if num_workers > 1:
+    parallel_integrator = Parallel_back_traj(integrator, num_workers)
 
 ###################################################################
 ##################### Calculate Trajectories ######################
 ###################################################################
 
-# Loop over all time steps and compute trajectory
-for t in range(time_steps-1):
+# Loop over all time steps used by any label and compute trajectories.
+for cur_time_step in range(resume_time_step, end_time_step, -1):
 
     start = time.time() #Timer
-    
-    # Get model data (set by user)
-    u = ds.variables['u'][start_time_step-t,:,:,:]
-    v = ds.variables['v'][start_time_step-t,:,:,:]
-    w = ds.variables['w'][start_time_step-t,:,:,:]
 
-    ############## Generate coordinates for interpolations ###############
+    # Labels with trajectories that include this time step (and have not
+    #   already calculated it before a restart).
+    active_labels = [label for label in parcel_labels if label_data[label]['completed_steps']-1 <= label_data[label]['start_time_step'] - cur_time_step < time_steps-1]
 
-    # x, y, and z locations on scalar grids
-    xloc = np.copy(xpos[t,:])
-    yloc = np.copy(ypos[t,:])
-    zloc = np.copy(zpos[t,:])
+    # Calculate a new box around each label's parcels if any of them are
+    #   getting close to the edge of the current one, and read the data for
+    #   the box containing all of the labels.
+    box = wind_reader.full_box
+    if subdomain == 'Y':
+        for label in active_labels:
+            t = label_data[label]['start_time_step'] - cur_time_step
+            parcel_positions = (label_data[label]['xpos'][t,:], label_data[label]['ypos'][t,:], label_data[label]['zpos'][t,:])
+            if label_data[label]['box'] is None or not parcels_in_box(label_data[label]['box'], wind_reader.coords, parcel_positions, subdomain_edge_buffer):
+                label_data[label]['box'] = calc_parcel_box(wind_reader.coords, parcel_positions, subdomain_halo)
 
-    coord = np.column_stack((zloc, yloc, xloc))
+        box = merge_boxes(*[label_data[label]['box'] for label in active_labels])
 
     ############# Integrate to determine parcel's new location ############
 
-    # Interpolate.interpn: take values in u, which are at locations (z,y,x),
-    #   and get values for it via interpolation at locations coord.
-
-    ########   Calc new xpos in meters from model center ###########
-    xpos[t+1,:] = xpos[t,:] - interpolate.interpn((z,y,x_stag), u, coord, method='linear', bounds_error=False, fill_value=np.nan)*time_step_lengths[start_time_step-t-1]
-
-    #########   Calc new ypos in meters from model center  ##########
-    ypos[t+1,:] = ypos[t,:] - interpolate.interpn((z,y_stag,x), v, coord, method='linear', bounds_error=False, fill_value=np.nan)*time_step_lengths[start_time_step-t-1]
-
-    ########   Calc new zpos in meters above ground level #########
-    zpos[t+1,:] = zpos[t,:] - interpolate.interpn((z_stag,y,x), w, coord, method='linear', bounds_error=False, fill_value=np.nan)*time_step_lengths[start_time_step-t-1]
-    
-    # Prevent parcels from going into the ground
-    zpos = zpos.clip(min=0)
+    for label in active_labels:
+        t = label_data[label]['start_time_step'] - cur_time_step
+        xpos = label_data[label]['xpos']
+        ypos = label_data[label]['ypos']
+        zpos = label_data[label]['zpos']
+
+        # Wind data is read from the model files as it is needed, and
+        #   interpolated to the parcel locations (indices and weights of the
+        #   parcels are shared by all three wind components).
+        # Calc new xpos and ypos in meters from model center, and zpos in meters
+        #   above ground level.
+        if num_workers > 1:
+            xpos[t+1,:], ypos[t+1,:], zpos[t+1,:] = parallel_integrator.step(xpos[t,:], ypos[t,:], zpos[t,:], cur_time_step, box)
+        else:
+            xpos[t+1,:], ypos[t+1,:], zpos[t+1,:] = integrator.step(xpos[t,:], ypos[t,:], zpos[t,:], cur_time_step, box)
+
+        # Prevent parcels from going into the ground
+        zpos[t+1,:] = zpos[t+1,:].clip(min=0)
+
+        label_data[label]['completed_steps'] = t+2
+
+        # Save the progress so far.
+        if checkpoint_interval > 0 and (t+1) % checkpoint_interval == 0:
+            write_checkpoint(label)
     
     # Timer
     stop = time.time()
-    print("Integration {:01d} took {:.2f} seconds".format(t, stop-start))
-
-# Save to numpy uncompressed archive for the plotting script.
-np.savez(output_file_name, xpos=xpos, ypos=ypos, zpos=zpos, offset=file_calc_start-time_steps, parcel_dimension=np.array((num_start_x, num_start_y, num_start_z)))
-
+    print("Integration {:01d} took {:.2f} seconds".format(start_time_step-cur_time_step, stop-start))
+
+if num_workers > 1:
+    parallel_integrator.close()
+if prefetch == 'Y':
+    wind_reader.close()
+
+# Save to numpy uncompressed archives for the plotting script.
+for label in parcel_labels:
+    output_file_name = output_dir + 'backtraj_{:s}'.format(label)
+    np.savez(output_file_name, xpos=label_data[label]['xpos'], ypos=label_data[label]['ypos'], zpos=label_data[label]['zpos'], offset=label_data[label]['offset'], parcel_dimension=label_data[label]['parcel_dimension'])
+
+    # The positions are all in the output archive, so the files used while
+    #   calculating them are no longer needed.
+    if stream_output:
+        for var_name in ['xpos', 'ypos', 'zpos']:
+            os.remove(position_file_name(label, var_name))
+        if os.path.exists(checkpoint_file_name(label)):
+            os.remove(checkpoint_file_name(label))
@@ -121,7 +121,7 @@ class Cat_traj:
     #   the usable trajectories).
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     def meters_to_trajnum(self, xpos, ypos, zpos):
-        traj_num = np.zeros(self.initial_pos[:,0].shape, dtype=np.int)
+        traj_num = np.zeros(self.initial_pos[:,0].shape, dtype=int)
 
         for i, coord_meters in enumerate(self.initial_pos):
             x_indices = np.argwhere(xpos[0] == coord_meters[2])
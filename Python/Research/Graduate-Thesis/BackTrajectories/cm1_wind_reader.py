@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   cm1_wind_reader.py
+#
+# Purpose:  Read CM1 wind fields (u, v, w) for trajectory calculations, either
+#           over the full model domain or only over a subdomain (box) of grid
+#           points surrounding the parcels.  Prefetch_wind_reader reads the
+#           wind fields for upcoming times on a background thread while the
+#           current time is being used.
+#
+# Syntax: from cm1_wind_reader import Wind_reader
+#         wind_reader = Wind_reader(ds, staggered)
+#         wind_fields = wind_reader.read_winds(time_index, box)
+#         u_parcel, v_parcel, w_parcel = wind_fields.interp(xpos, ypos, zpos)
+#
+#         from cm1_wind_reader import Prefetch_wind_reader
+#         wind_reader = Prefetch_wind_reader(ds, staggered, time_indices, buffer_size)
+#         wind_fields = wind_reader.read_winds(time_indices[0], box)
+#         wind_reader.close()
+#
+# Execution Example:
+#   wind_reader = Wind_reader(ds, 'Y')
+#   box = calc_parcel_box(wind_reader.coords, (xpos, ypos, zpos), 10)
+#   wind_fields = wind_reader.read_winds(100, box)
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to read hyperslabs of the wind fields
+#                               around the parcels in calc_back_trajectory.py.
+#   2026/10/17 - Lance Wilson:  Added Prefetch_wind_reader.
+#   2026/10/17 - Lance Wilson:  Added read_box to Wind_reader for reading data
+#                               again outside of the prefetch order.
+#
+
+from calc_parcel_bounds import box_contains
+from grid_interp import Wind_interp
+
+import numpy as np
+import queue
+import threading
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Wind data for one model time within a box of grid points, with the
+#   coordinates of the box used to interpolate to parcel positions.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Wind_fields:
+    def __init__(self, time_index, box, u, v, w, wind_interp):
+        self.time_index = time_index
+        self.box = box
+        self.u = u
+        self.v = v
+        self.w = w
+        self.wind_interp = wind_interp
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolate u, v, and w to the parcel positions.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def interp(self, xpos, ypos, zpos):
+        self.wind_interp.set_positions(xpos, ypos, zpos)
+        return self.wind_interp.interp_winds(self.u, self.v, self.w)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Reads wind data from an open CM1 netCDF dataset (Dataset or MFDataset).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Wind_reader:
+    def __init__(self, ds, staggered='Y'):
+        self.ds = ds
+        self.staggered = staggered
+
+        # Unstaggered coordinates (converted to meters) in each dimension.
+        self.x = np.copy(ds.variables['xh'])*1000.
+        self.y = np.copy(ds.variables['yh'])*1000.
+        self.z = np.copy(ds.variables['z'])*1000.
+
+        # Winds on the staggered grid have one more point in each direction.
+        if self.staggered == 'Y':
+            self.x_stag = np.copy(ds.variables['xf'])*1000.
+            self.y_stag = np.copy(ds.variables['yf'])*1000.
+            self.z_stag = np.copy(ds.variables['zf'])*1000.
+            self.stag_offset = 1
+        # If the wind data is not staggered, then the regular grid points can be used.
+        else:
+            self.x_stag = self.x
+            self.y_stag = self.y
+            self.z_stag = self.z
+            self.stag_offset = 0
+
+        # Scalar coordinates used for calculating boxes around the parcels.
+        self.coords = (self.x, self.y, self.z)
+
+        # Box covering the entire model domain.
+        self.full_box = (0, 0, 0, self.x.size, self.y.size, self.z.size)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read u, v, and w at one time inside of a box (from calc_parcel_box).
+    #   Scalar dimensions are read as [x1:x2], and staggered dimensions are read
+    #   as [x1:x2+1].
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read_winds(self, time_index, box=None):
+        if box is None:
+            box = self.full_box
+        x1, y1, z1, x2, y2, z2 = box
+        s = self.stag_offset
+
+        u = self.ds.variables['u'][time_index, z1:z2, y1:y2, x1:x2+s]
+        v = self.ds.variables['v'][time_index, z1:z2, y1:y2+s, x1:x2]
+        w = self.ds.variables['w'][time_index, z1:z2+s, y1:y2, x1:x2]
+
+        return Wind_fields(time_index, box, u, v, w, self.box_interp(box))
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read u, v, and w for a time immediately, outside of the normal order of
+    #   times (e.g. again for a larger box).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read_box(self, time_index, box):
+        return Wind_reader.read_winds(self, time_index, box)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolation object using the coordinates of the grid points in a box.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def box_interp(self, box):
+        x1, y1, z1, x2, y2, z2 = box
+        x = self.x[x1:x2]
+        y = self.y[y1:y2]
+        z = self.z[z1:z2]
+
+        if self.staggered == 'Y':
+            return Wind_interp(x, y, z, self.x_stag[x1:x2+1], self.y_stag[y1:y2+1], self.z_stag[z1:z2+1])
+        else:
+            return Wind_interp(x, y, z, x, y, z)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Wind_reader that reads the wind fields for a known sequence of times on a
+#   background thread, so that reading (and decompressing) the next model file
+#   overlaps with the calculations for the current one.
+#   At most buffer_size times are held in memory waiting to be used.
+#   read_winds must be called with the times in the same order as
+#   time_indices.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Prefetch_wind_reader(Wind_reader):
+    def __init__(self, ds, staggered='Y', time_indices=(), buffer_size=2):
+        Wind_reader.__init__(self, ds, staggered)
+
+        # netCDF datasets cannot be read from two threads at once.
+        self.ds_lock = threading.Lock()
+
+        # Box used for the background reads (updated each time read_winds is
+        #   called, so the next reads follow the parcels).
+        self.box = self.full_box
+
+        self.time_indices = list(time_indices)
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.stop_event = threading.Event()
+
+        self.thread = threading.Thread(target=self.prefetch, daemon=True)
+        self.thread.start()
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read the wind fields for a time inside of a box, locking the dataset.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read_box(self, time_index, box):
+        with self.ds_lock:
+            return Wind_reader.read_winds(self, time_index, box)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Background thread: read each time in order, waiting while the buffer is
+    #   full.  Errors are passed through the buffer and raised in read_winds.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def prefetch(self):
+        for time_index in self.time_indices:
+            try:
+                wind_fields = self.read_box(time_index, self.box)
+            except Exception as error:
+                wind_fields = error
+
+            while not self.stop_event.is_set():
+                try:
+                    self.buffer.put(wind_fields, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+            if self.stop_event.is_set() or isinstance(wind_fields, Exception):
+                return
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Get the wind fields for the next time.  If the prefetched data does not
+    #   cover the requested box (because the box has moved with the parcels),
+    #   the data is read again for the new box.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read_winds(self, time_index, box=None):
+        if box is None:
+            box = self.full_box
+        self.box = box
+
+        wind_fields = self.buffer.get()
+        if isinstance(wind_fields, Exception):
+            raise wind_fields
+        if wind_fields.time_index != time_index:
+            raise ValueError('Requested time index {:d}, but next prefetched time index is {:d}.'.format(time_index, wind_fields.time_index))
+
+        if not box_contains(wind_fields.box, box):
+            wind_fields = self.read_box(time_index, box)
+
+        return wind_fields
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Stop the background thread.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
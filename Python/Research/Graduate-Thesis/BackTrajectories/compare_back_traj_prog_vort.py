@@ -45,16 +45,26 @@
 #   2022/01/27 - Lance Wilson:  Adjusted access of catergorized trajectory
 #                               object to accommodate new method of setting up
 #                               the netCDF file.
+#   2026/10/17 - Lance Wilson:  Replaced calc_prog_vort with summing the
+#                               tendencies for all trajectories at once and
+#                               integrating them with integrate_tendencies.
+#   2026/10/17 - Lance Wilson:  Interpolate the CM1 vorticity to all of the
+#                               trajectories at each time at once
+#                               (sample_trajectories) instead of one point at
+#                               a time.
+#   2026/10/17 - Lance Wilson:  Read the positions of only the categorized
+#                               trajectories with getParcelData.
 #
 
 from back_traj_interp_class import Back_traj_ds
 from categorize_traj_class import Cat_traj
 from parameter_list import budget_legendlabels, title_dir_sub
+from prog_vort_integration import integrate_tendencies, sum_tendencies
+from stencil_reader import sample_trajectories
 
 #from matplotlib.colors import ListedColormap, Normalize
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
-from scipy import interpolate
 
 import atexit
 import matplotlib
@@ -69,21 +79,6 @@ import sys
 def closeNCfile(ds):
     ds.close()
 
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Calculate the "prognostic" vorticity using the equation:
-#       zeta_t_n = zeta_t_(n-1) + sum(tend_n) * delta_t
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def calc_prog_vort(prog_vort, plot_limit, plot_index, time_step_lengths, budget_var_names):
-    for i in range(1, plot_limit+1):
-        rev_i = plot_limit - i
-
-        # Sum of the tendencies at the previous time step.
-        tend_sum = 0.
-        for budget_var in budget_var_names:
-            tend_sum += ds_obj.getBudgetData(budget_var)[rev_i+1, plot_index]
-
-        prog_vort[i] = prog_vort[i-1] + tend_sum * time_step_lengths[rev_i]
-
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Plot the "prognostic" vorticity for the equation terms and the model
 #   tendency terms along with the "true" vorticity interpolated to trajectory
@@ -111,19 +106,6 @@ def plot_prog_vort(simulation_times, prog_budget_vort, prog_equation_vort, cm1_v
     #plt.savefig(output_name, dpi=400)
     plt.show()
 
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Interpolate CM1 vorticity data to trajectory points.
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def interpolate_vort(grid_coord, xpos, ypos, zpos, variable):
-    # Create array representing the points that the budget variable is
-    #   going to be sampled at.
-    ##traj_points = np.stack((z_coord, y_coord, x_coord), axis = 1)
-    traj_points = np.column_stack((zpos, ypos, xpos))
-
-    # Interpolate the budget variable to the back trajectory points and
-    #   output to the netCDF file.
-    return interpolate.interpn(grid_coord, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Command line arguments
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -225,10 +207,13 @@ cat_traj_obj = Cat_traj(version_number, cat_dir, parcel_label, parcel_category)
 #   is true.
 if cat_traj_obj.existing_file:
     cat_traj_obj.open_file(parcel_category)
-    # Initialization positions are converted to an array index.
-    plot_indices = cat_traj_obj.meters_to_trajnum(ds_obj.xpos, ds_obj.ypos, ds_obj.zpos)
+    # Initialization positions are converted to an array index (only the
+    #   positions at the initialization time are needed).
+    plot_indices = cat_traj_obj.meters_to_trajnum(ds_obj.getParcelData('xpos', None, (0, 1)),
+                                                  ds_obj.getParcelData('ypos', None, (0, 1)),
+                                                  ds_obj.getParcelData('zpos', None, (0, 1)))
 else:
-    print 'Categorized trajectory file does not contain any data'
+    print('Categorized trajectory file does not contain any data')
     sys.exit()
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -274,63 +259,46 @@ x_coord = np.copy(ds.variables['xh'])*1000.
 y_coord = np.copy(ds.variables['yh'])*1000.
 z_coord = np.copy(ds.variables['z'])*1000.
 
-for plot_index in plot_indices:
-    # Starting (earliest time) trajectory positions.
-    start_vort_xpos = ds_obj.xpos[plot_limit, plot_index]
-    start_vort_ypos = ds_obj.ypos[plot_limit, plot_index]
-    start_vort_zpos = ds_obj.zpos[plot_limit, plot_index]
-
+# Sum of the tendencies for each direction and set of tendencies for all of
+#   the trajectories being plotted, over the integration period.
+tend_sums = {}
+for budget_type in budget_var_names.keys():
+    tend_sums[budget_type] = {}
+    for tend_set in ['budget', 'equation']:
+        tend_sums[budget_type][tend_set] = sum_tendencies(ds_obj, budget_var_names[budget_type][tend_set], plot_indices, (0, plot_limit+1))
+
+# Positions of the trajectories being plotted over the integration period (in
+#   order of decreasing time).
+plot_xpos = ds_obj.getParcelData('xpos', plot_indices, (0, plot_limit+1))
+plot_ypos = ds_obj.getParcelData('ypos', plot_indices, (0, plot_limit+1))
+plot_zpos = ds_obj.getParcelData('zpos', plot_indices, (0, plot_limit+1))
+
+# Get "correct" vorticity (CM1 vorticity interpolated to trajectory positions)
+#   for all of the trajectories being plotted at each time step, in order of
+#   increasing time (CM1 file i is at trajectory time index plot_limit - i).
+interp_vorts = sample_trajectories(ds, [budget_type + 'vort' for budget_type in sorted(budget_var_names.keys())],
+                                   (z_coord, y_coord, x_coord), range(plot_limit+1),
+                                   plot_xpos[::-1], plot_ypos[::-1], plot_zpos[::-1])
+
+for plot_num, plot_index in enumerate(plot_indices):
     # Initialization (latest time) trajectory positions.
-    traj_init_xpos = ds_obj.xpos[0, plot_index]
-    traj_init_ypos = ds_obj.ypos[0, plot_index]
-    traj_init_zpos = ds_obj.zpos[0, plot_index]
-
-    # Get the limits of trajectory data in meters.
-    xmin_m = np.min(ds_obj.xpos[:plot_limit+1, plot_index])
-    xmax_m = np.max(ds_obj.xpos[:plot_limit+1, plot_index])
-    ymin_m = np.min(ds_obj.ypos[:plot_limit+1, plot_index])
-    ymax_m = np.max(ds_obj.ypos[:plot_limit+1, plot_index])
-    zmin_m = np.min(ds_obj.zpos[:plot_limit+1, plot_index])
-    zmax_m = np.max(ds_obj.zpos[:plot_limit+1, plot_index])
-
-    # Get indices of the limits of the data to save time when accessing CM1
-    #   vorticity data.
-    xmin = np.argwhere(np.abs(x_coord - xmin_m) == np.min(np.abs(x_coord - xmin_m)))[0,0]-1
-    xmax = np.argwhere(np.abs(x_coord - xmax_m) == np.min(np.abs(x_coord - xmax_m)))[0,0]+2
-    ymin = np.argwhere(np.abs(y_coord - ymin_m) == np.min(np.abs(y_coord - ymin_m)))[0,0]-1
-    ymax = np.argwhere(np.abs(y_coord - ymax_m) == np.min(np.abs(y_coord - ymax_m)))[0,0]+2
-    zmin = np.argwhere(np.abs(z_coord - zmin_m) == np.min(np.abs(z_coord - zmin_m)))[0,0]-1
-    zmax = np.argwhere(np.abs(z_coord - zmax_m) == np.min(np.abs(z_coord - zmax_m)))[0,0]+2
-
-    # Create a tuple of the coordinates that is passed to the interpn function
-    #   to be used as the regular grid.
-    grid_coord = (z_coord[zmin:zmax], y_coord[ymin:ymax], x_coord[xmin:xmax])
+    traj_init_xpos = plot_xpos[0, plot_num]
+    traj_init_ypos = plot_ypos[0, plot_num]
+    traj_init_zpos = plot_zpos[0, plot_num]
 
     # Calculate and plot prognostic and correct vorticity for each direction. 
     for budget_type in sorted(budget_var_names.keys()):
-        prog_budget_vort = np.zeros((plot_limit+1))
-        prog_equation_vort = np.zeros((plot_limit+1))
-        interp_vort = np.zeros((plot_limit+1))
-
-        ds_var = budget_type + 'vort'
-        vort_var = np.copy(ds.variables[ds_var][:,zmin:zmax,ymin:ymax,xmin:xmax])
-
-        # Get "correct" vorticity (CM1 vorticity interpolated to trajectory
-        #   positions) at each time step.
-        for i in range(plot_limit+1):
-            rev_i = plot_limit - i
-            interp_xpos = ds_obj.xpos[rev_i, plot_index]
-            interp_ypos = ds_obj.ypos[rev_i, plot_index]
-            interp_zpos = ds_obj.zpos[rev_i, plot_index]
-            interp_vort[i] = interpolate_vort(grid_coord, interp_xpos, interp_ypos, interp_zpos, vort_var[i])
-
-        # Starting positions for the prognostic vorticity (same for both tendency sets).
-        prog_budget_vort[0] = interpolate_vort(grid_coord, start_vort_xpos, start_vort_ypos, start_vort_zpos, vort_var[0])
-        prog_equation_vort[0] = interpolate_vort(grid_coord, start_vort_xpos, start_vort_ypos, start_vort_zpos, vort_var[0])
-
-        # Calculate the "prognostic" vorticity at each time step.
-        calc_prog_vort(prog_budget_vort, plot_limit, plot_index, time_step_lengths, budget_var_names[budget_type]['budget'])
-        calc_prog_vort(prog_equation_vort, plot_limit, plot_index, time_step_lengths, budget_var_names[budget_type]['equation'])
+        interp_vort = interp_vorts[budget_type + 'vort'][:,plot_num]
+
+        # Starting vorticity for the prognostic vorticity (same for both
+        #   tendency sets), at the starting (earliest time) trajectory position.
+        start_vort = interp_vort[0]
+
+        # Calculate the "prognostic" vorticity at each time step, using the
+        #   tendencies at the start of each time step (the trajectory data is
+        #   in order of decreasing time).
+        prog_budget_vort = integrate_tendencies(start_vort, tend_sums[budget_type]['budget'][:,plot_num], time_step_lengths[:plot_limit], 'backward', 'left')
+        prog_equation_vort = integrate_tendencies(start_vort, tend_sums[budget_type]['equation'][:,plot_num], time_step_lengths[:plot_limit], 'backward', 'left')
 
         # Output name for when image is being saved.
         image_file_name = output_dir + 'cm1_backtraj_progvort_comparison_{:s}_{:s}_inittime{:d}_p{:d}.png'.format(parcel_label, budget_type, initialize_time, plot_index)
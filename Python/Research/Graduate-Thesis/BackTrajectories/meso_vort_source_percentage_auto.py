@@ -15,10 +15,14 @@
 #
 # Modification History:
 #   2022/01/28 - Lance Wilson:  Created.
+#   2026/10/17 - Lance Wilson:  Store the model fields interpolated to the
+#                               trajectories in a Traj_sample_cache.
+#   2026/10/17 - Lance Wilson:  Get the model files from Back_traj_ds.
 
 from back_traj_interp_class import Back_traj_ds
 from categorize_traj_class import Cat_traj
 from calc_parcel_bounds import calc_bound_index
+from traj_sample_cache import Traj_sample_cache, sample_cache_name, sample_name
 from trajectory_category_parameters import termination_parameters
 
 from netCDF4 import MFDataset
@@ -54,7 +58,7 @@ def eval_valid_indices(valid_traj_indices, valid_this_case):
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Find trajectories that terminate in the mesocyclone
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def get_meso_indices(ds, xpos, ypos, zpos, x_coord, y_coord, x_coord_stag, y_coord_stag):
+def get_meso_indices(ds, xpos, ypos, zpos, x_coord, y_coord, x_coord_stag, y_coord_stag, sample_cache):
     # Dictionary storing mathmatical operators from the operator module so that
     #   operators can be determined on a case-by-case basis.
     # Examples: ops['<'](a,b) is equivalent to: operator.lt(a,b); a < b
@@ -130,9 +134,6 @@ def get_meso_indices(ds, xpos, ypos, zpos, x_coord, y_coord, x_coord_stag, y_coo
             # Regular grid points for one model level at one time.
             grid_coord_2D = (y_coord_field,x_coord_field)
 
-            # Get values of this budget variable at this time step.
-            variable = np.copy(ds.variables[model_field][-1,model_level,:,:])
-
             # Get backward trajectory coordinates at this time step.
             x_traj_coord = xpos[0]
             y_traj_coord = ypos[0]
@@ -141,8 +142,15 @@ def get_meso_indices(ds, xpos, ypos, zpos, x_coord, y_coord, x_coord_stag, y_coo
             #   going to be sampled at.
             traj_points = np.column_stack((y_traj_coord, x_traj_coord))
 
-            # Interpolate the model variable to the trajectory points.
-            interpolated_values = interpolate.interpn(grid_coord_2D, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
+            # Interpolate the model variable to the trajectory points at the
+            #   last model time (only called if the values are not already in
+            #   the cache).
+            def interp_var(rows):
+                # Get values of this budget variable at this time step.
+                variable = np.copy(ds.variables[model_field][-1,model_level,:,:])
+                return interpolate.interpn(grid_coord_2D, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)[None,:]
+
+            interpolated_values = sample_cache.get(sample_name(model_field, model_level), [0], [ds.variables['time'].shape[0]-1], interp_var)[0]
 
             # Find trajectories that meet the criterion at this time.
             valid_this_case = np.argwhere(ops[operation](interpolated_values, field_value))[:,0]
@@ -253,7 +261,7 @@ full_traj_points = np.column_stack((z_traj_coord_full, y_traj_coord_full, x_traj
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Open CM1 dataset over the time period where back trajectories are calculated.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-file_list = [model_dir + 'JS_75m_run{:d}_{:06d}.nc'.format(run_number, file_num) for file_num in range(file_num_offset+1, file_num_offset+parcel_time_step_num+1)]
+file_list = traj_ds_obj.getModelFileList(model_dir, run_number)
 ds = MFDataset(file_list)
 
 # Close the main CM1 data netCDF file when the program exits.
@@ -273,6 +281,10 @@ y_coord_stag = np.copy(ds.variables['yf'])*1000.
 #model_time_step = parcel_time_step_num - traj_time_index - 1
 model_time_step = -1
 
+# Model fields interpolated to the trajectories, stored with the trajectory
+#   data.
+sample_cache = Traj_sample_cache(interp_dir + sample_cache_name(version_number, parcel_label, 'back'), xpos_full, ypos_full, zpos_full, file_list)
+
 # Get the boundary indices of the CM1 data that the full set of trajectories
 #   are located in (to save time in loading vorticity data).
 x1 = calc_bound_index(x_coord, np.min(x_traj_coord_full), -1 * bound_buffer)
@@ -286,34 +298,32 @@ z2 = calc_bound_index(z_coord, np.max(z_traj_coord_full), bound_buffer)
 #   to be used as the regular grid.
 grid_coord = (z_coord[z1:z2],y_coord[y1:y2],x_coord[x1:x2])
 
-# Get values of vorticity at this time step.
-xvort = np.copy(ds.variables['xvort'][model_time_step,z1:z2,y1:y2,x1:x2])
-yvort = np.copy(ds.variables['yvort'][model_time_step,z1:z2,y1:y2,x1:x2])
-zvort = np.copy(ds.variables['zvort'][model_time_step,z1:z2,y1:y2,x1:x2])
-
-# Get values of wind interpolated to the scalar grid points.
-u_interp = np.copy(ds.variables['uinterp'][model_time_step,z1:z2,y1:y2,x1:x2])
-v_interp = np.copy(ds.variables['vinterp'][model_time_step,z1:z2,y1:y2,x1:x2])
-w_interp = np.copy(ds.variables['winterp'][model_time_step,z1:z2,y1:y2,x1:x2])
-
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Interpolate vorticity to the full dataset of back trajectory points at this
-#   time step.
+# Interpolate a model variable to the full dataset of back trajectory points
+#   at this time step, or get the values from the cache.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def sample_full(var_name):
+    def interp_var(rows):
+        # Get values of the variable at this time step.
+        variable = np.copy(ds.variables[var_name][model_time_step,z1:z2,y1:y2,x1:x2])
+        return interpolate.interpn(grid_coord, variable, full_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)[None,:]
+
+    return sample_cache.get(sample_name(var_name), [traj_time_index], [len(file_list)-1], interp_var)[0]
+
 # Individual vorticity components.
-xvort_full = interpolate.interpn(grid_coord, xvort, full_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-yvort_full = interpolate.interpn(grid_coord, yvort, full_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-zvort_full = interpolate.interpn(grid_coord, zvort, full_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
+xvort_full = sample_full('xvort')
+yvort_full = sample_full('yvort')
+zvort_full = sample_full('zvort')
 
 # Full horizontal vorticity.
 horiz_full = np.sqrt(np.square(xvort_full) + np.square(yvort_full))
 # Full 3D vorticity.
 vort3d_full = np.sqrt(np.square(xvort_full) + np.square(yvort_full) + np.square(zvort_full))
 
-# Individual wind components.
-u_full = interpolate.interpn(grid_coord, u_interp, full_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-v_full = interpolate.interpn(grid_coord, v_interp, full_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-w_full = interpolate.interpn(grid_coord, w_interp, full_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
+# Individual wind components (interpolated to the scalar grid points).
+u_full = sample_full('uinterp')
+v_full = sample_full('vinterp')
+w_full = sample_full('winterp')
 
 # Helicity components.
 x_helicity_full = u_full * xvort_full
@@ -372,7 +382,7 @@ zpos_subset = traj_ds_obj.zpos[::-1][parcel_time_step_num-plot_limit:]
 #   categories) being analyzed.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Empty array to concatenate array of indices of categorized back trajectories.
-category_indices = np.zeros((0), dtype=np.int)
+category_indices = np.zeros((0), dtype=int)
 
 for parcel_category in parcel_categories:
     # Trajectories to be plotted, based on intialization positions stored in a
@@ -388,7 +398,7 @@ for parcel_category in parcel_categories:
         # Initialization positions are converted to an array index.
         category_indices = np.concatenate((category_indices, cat_traj_obj.meters_to_trajnum(xpos_subset, ypos_subset, zpos_subset)))
     else:
-        print 'Categorized trajectory file {:s} does not contain any data'.format(parcel_category)
+        print('Categorized trajectory file {:s} does not contain any data'.format(parcel_category))
         sys.exit()
 
 # Make sure there is only one of each index.
@@ -398,23 +408,14 @@ category_indices = np.unique(category_indices)
 num_category_traj = len(category_indices)
 category_traj_percent = 100. * num_category_traj/total_parcel_num
 
-# Get coordinates of this category's back trajectory data at this time step.
-x_traj_coord_cat = xpos_full[traj_time_index,category_indices]
-y_traj_coord_cat = ypos_full[traj_time_index,category_indices]
-z_traj_coord_cat = zpos_full[traj_time_index,category_indices]
-
-# Create array representing the points that the vorticity variable is
-#   going to be sampled at.
-category_traj_points = np.column_stack((z_traj_coord_cat, y_traj_coord_cat, x_traj_coord_cat))
-
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Interpolate vorticity to to this category's back trajectory points at this
-#   time step.
+# Vorticity at this category's back trajectory points at this time step (the
+#   same points as in the full dataset).
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Individual vorticity components.
-xvort_category = interpolate.interpn(grid_coord, xvort, category_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-yvort_category = interpolate.interpn(grid_coord, yvort, category_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-zvort_category = interpolate.interpn(grid_coord, zvort, category_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
+xvort_category = xvort_full[category_indices]
+yvort_category = yvort_full[category_indices]
+zvort_category = zvort_full[category_indices]
 
 # Full horizontal vorticity.
 horiz_category = np.sqrt(np.square(xvort_category) + np.square(yvort_category))
@@ -422,9 +423,9 @@ horiz_category = np.sqrt(np.square(xvort_category) + np.square(yvort_category))
 vort3d_category = np.sqrt(np.square(xvort_category) + np.square(yvort_category) + np.square(zvort_category))
 
 # Individual wind components.
-u_category = interpolate.interpn(grid_coord, u_interp, category_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-v_category = interpolate.interpn(grid_coord, v_interp, category_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
-w_category = interpolate.interpn(grid_coord, w_interp, category_traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
+u_category = u_full[category_indices]
+v_category = v_full[category_indices]
+w_category = w_full[category_indices]
 
 # Helicity components.
 x_helicity_category = u_category * xvort_category
@@ -452,7 +453,7 @@ plus_z_cat = zvort_category[np.argwhere(zvort_category >= 0.)[:,0]]
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Get full set of trajectories that are just part of the mesocyclone.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-meso_indices = get_meso_indices(ds, xpos_full, ypos_full, zpos_full, x_coord, y_coord, x_coord_stag, y_coord_stag)
+meso_indices = get_meso_indices(ds, xpos_full, ypos_full, zpos_full, x_coord, y_coord, x_coord_stag, y_coord_stag, sample_cache)
 # Get components of vorticity entering the mesocyclone.
 xvort_meso = xvort_full[meso_indices]
 yvort_meso = yvort_full[meso_indices]
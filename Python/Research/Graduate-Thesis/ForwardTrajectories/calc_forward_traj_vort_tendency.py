@@ -28,13 +28,18 @@
 #                               trajectories_CM1.ipynb from: https://github.com/tomgowan/trajectories/blob/master/trajectories_CM1.ipynb
 #   2021/02/24 - Lance Wilson:  Created forward trajectory version from
 #                               calc_back_traj_vort_tendency.
+#   2026/10/17 - Lance Wilson:  interpolate_budget now loops over time first,
+#                               calculating the interpolation weights once for
+#                               all variables and reading only the grid points
+#                               around the parcels (stencil_reader.py).
 #
 
 from forward_traj_interp_class import Forward_traj_ds
 from calc_file_num_offset import calc_parcel_start_time, calc_parcel_end_time, calc_file_offset
+from grid_interp import Grid_weights
+from stencil_reader import Stencil_reader
 
 from netCDF4 import Dataset
-from scipy import interpolate
 import atexit
 import numpy as np
 import sys
@@ -44,49 +49,60 @@ import time
 # Interpolate vorticity budget data to forward trajectory positions.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 def interpolate_budget(ds_in, ds_out_obj, xpos, ypos, zpos, file_num_offset, parcel_time_steps, valid_traj_num):
+    # Timer
+    start = time.time()
+
     # Coordinates (in meters) in each dimension (already converted to meters
     #   in ds_in netCDF file).
     x_coord = np.copy(ds_in.variables['xh'])
     y_coord = np.copy(ds_in.variables['yh'])
     z_coord = np.copy(ds_in.variables['z'])
 
-    # Create a tuple of the coordinates that is passed to the interpn function
-    #   to be used as the regular grid.
+    # Create a tuple of the coordinates that is used as the regular grid.
     grid_coord = (z_coord,y_coord,x_coord)
 
-    for var_name in ds_in.variables.keys():
-        if len(ds_in.variables[var_name].dimensions) == 4:
-            # Timer
-            start = time.time()
+    # Reads the parts of the grid around the parcels at each time.
+    stencil_reader = Stencil_reader((len(z_coord), len(y_coord), len(x_coord)))
+
+    var_names = [var_name for var_name in ds_in.variables.keys() if len(ds_in.variables[var_name].dimensions) == 4]
+
+    # Interpolated values of each variable (stored as 32-bit floats, the type
+    #   of the output variables).
+    vort_vars_out = np.zeros((len(var_names), parcel_time_steps, valid_traj_num), dtype=np.float32)
 
-            vort_var_out = np.zeros((parcel_time_steps, valid_traj_num))
+    # Loop over the model files that are in the range of the parcel data.
+    for model_time_step in range(file_num_offset, file_num_offset+parcel_time_steps):
+        # Calculate the array index for the forward trajectories.
+        parcel_time_step = model_time_step - file_num_offset
 
-            # Loop over the model files that are in the range of the parcel data.
-            for model_time_step in range(file_num_offset, file_num_offset+parcel_time_steps):
-                # Calculate the array index for the forward trajectories.
-                parcel_time_step = model_time_step - file_num_offset
+        # Get forward trajectory coordinates at this time step.
+        x_traj_coord = xpos[parcel_time_step]
+        y_traj_coord = ypos[parcel_time_step]
+        z_traj_coord = zpos[parcel_time_step]
 
-                # Get values of this budget variable at this time step.
-                variable = np.copy(ds_in.variables[var_name][model_time_step,:,:,:])
+        # Create array representing the points that the budget variables are
+        #   going to be sampled at.
+        traj_points = np.column_stack((z_traj_coord, y_traj_coord, x_traj_coord))
 
-                # Get forward trajectory coordinates at this time step.
-                x_traj_coord = xpos[parcel_time_step]
-                y_traj_coord = ypos[parcel_time_step]
-                z_traj_coord = zpos[parcel_time_step]
+        # Grid cell indices and weights of the forward trajectory points,
+        #   calculated once and used for every variable.
+        weights = Grid_weights(grid_coord, traj_points)
+        stencil_reader.set_points(weights)
 
-                # Create array representing the points that the budget variable is
-                #   going to be sampled at.
-                ##traj_points = np.stack((z_coord, y_coord, x_coord), axis = 1)
-                traj_points = np.column_stack((z_traj_coord, y_traj_coord, x_traj_coord))
+        for var_num, var_name in enumerate(var_names):
+            # Get values of this budget variable around the forward trajectory
+            #   points at this time step.
+            variable = stencil_reader.read(ds_in.variables[var_name], model_time_step)
 
-                # Interpolate the budget variable to the forward trajectory points.
-                vort_var_out[parcel_time_step,:] = interpolate.interpn(grid_coord, variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)
+            # Interpolate the budget variable to the forward trajectory points.
+            vort_vars_out[var_num,parcel_time_step,:] = weights.interp(variable)
 
-            # Output the interpolated data to the netCDF file.
-            ds_out_obj.create_vort_var(ds_in, var_name, vort_var_out)
+    # Output the interpolated data to the netCDF file.
+    for var_num, var_name in enumerate(var_names):
+        ds_out_obj.create_vort_var(ds_in, var_name, vort_vars_out[var_num])
 
-            end = time.time()
-            print('Variable {:s} took {:.2f} seconds'.format(var_name, end-start))
+    end = time.time()
+    print('{:d} variables took {:.2f} seconds'.format(len(var_names), end-start))
 
     return
 
@@ -52,10 +52,16 @@
 #   2022/06/09 - Lance Wilson:  Splitting calculation of "mean"/representative
 #                               trajectory and plotting of prognostic vorticity
 #                               into separate programs.
+#   2026/10/17 - Lance Wilson:  Replaced calc_prog_vort with integrating the
+#                               summed tendencies for all trajectories at once
+#                               with integrate_tendencies.
+#   2026/10/17 - Lance Wilson:  Read the positions of only the categorized
+#                               trajectories with getParcelData.
 #
 
 from categorize_forward_traj_class import Cat_forward_traj
 from forward_traj_interp_class import Forward_traj_ds
+from prog_vort_integration import integrate_tendencies, sum_tendencies
 
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
@@ -71,18 +77,6 @@ import sys
 def closeNCfile(ds):
     ds.close()
 
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Calculate the "prognostic" vorticity using the equation:
-#       zeta_t_n = zeta_t_(n-1) + sum(tend_n) * delta_t
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def calc_prog_vort(prog_vort, plot_limit, plot_index, time_step_lengths, budget_var_names, axis_num, traj_num):
-    for out_arr_i, obj_i in enumerate(range(1, plot_limit)):
-        tend_sum = 0.
-        for budget_var in budget_var_names:
-            tend_sum += ds_obj.getBudgetData(budget_var)[obj_i, plot_index]
-
-        prog_vort[axis_num, out_arr_i+1, traj_num] = prog_vort[axis_num, out_arr_i, traj_num] + tend_sum * time_step_lengths[out_arr_i]
-
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Interpolate CM1 vorticity data to trajectory points.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -180,10 +174,13 @@ cat_traj_obj = Cat_forward_traj(version_number, cat_dir, parcel_label, parcel_ca
 #   is true.
 if cat_traj_obj.existing_file:
     cat_traj_obj.open_file(parcel_category)
-    # Initialization positions are converted to an array index.
-    category_indices = cat_traj_obj.meters_to_trajnum(ds_obj.xpos, ds_obj.ypos, ds_obj.zpos)
+    # Initialization positions are converted to an array index (only the
+    #   positions at the initialization time are needed).
+    category_indices = cat_traj_obj.meters_to_trajnum(ds_obj.getParcelData('xpos', None, (0, 1)),
+                                                      ds_obj.getParcelData('ypos', None, (0, 1)),
+                                                      ds_obj.getParcelData('zpos', None, (0, 1)))
 else:
-    print 'Categorized trajectory file does not contain any data'
+    print('Categorized trajectory file does not contain any data')
     sys.exit()
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -193,7 +190,7 @@ else:
 time_step_lengths = np.round(ds_obj.simulation_times[1:] - ds_obj.simulation_times[:-1])
 
 # How many time steps to plot trajectories.
-plot_limit = len(ds_obj.xpos)
+plot_limit = ds_obj.parcel_time_step_num
 
 # List of CM1 model files to open.
 file_list = [model_dir + 'JS_75m_run{:d}_{:06d}.nc'.format(run_number, file_num) for file_num in range(ds_obj.file_num_offset, ds_obj.file_num_offset + plot_limit)]
@@ -214,13 +211,18 @@ prog_budget_vort = np.zeros((len(budget_var_names.keys()), plot_limit, len(categ
 prog_equation_vort = np.zeros((len(budget_var_names.keys()), plot_limit, len(category_indices)))
 interp_vort = np.zeros((len(budget_var_names.keys()), plot_limit, len(category_indices)))
 
+# Positions of the trajectories in this category.
+category_xpos = ds_obj.getParcelData('xpos', category_indices, (0, plot_limit))
+category_ypos = ds_obj.getParcelData('ypos', category_indices, (0, plot_limit))
+category_zpos = ds_obj.getParcelData('zpos', category_indices, (0, plot_limit))
+
 # Get the limits of trajectory data in meters.
-xmin_m = np.min(ds_obj.xpos[:plot_limit, category_indices])
-xmax_m = np.max(ds_obj.xpos[:plot_limit, category_indices])
-ymin_m = np.min(ds_obj.ypos[:plot_limit, category_indices])
-ymax_m = np.max(ds_obj.ypos[:plot_limit, category_indices])
-zmin_m = np.min(ds_obj.zpos[:plot_limit, category_indices])
-zmax_m = np.max(ds_obj.zpos[:plot_limit, category_indices])
+xmin_m = np.min(category_xpos)
+xmax_m = np.max(category_xpos)
+ymin_m = np.min(category_ypos)
+ymax_m = np.max(category_ypos)
+zmin_m = np.min(category_zpos)
+zmax_m = np.max(category_zpos)
 
 # Get indices of the limits of the data to save time when accessing CM1
 #   vorticity data.
@@ -241,28 +243,31 @@ for axis_num, budget_type in enumerate(sorted(budget_var_names.keys())):
     ds_var = budget_type + 'vort'
     vort_var = np.copy(ds.variables[ds_var][:,zmin:zmax,ymin:ymax,xmin:xmax])
 
-    for traj_num, category_index in enumerate(category_indices):
+    for traj_num in range(len(category_indices)):
 
         # Starting (earliest time) trajectory positions.
-        start_vort_xpos = ds_obj.xpos[0, category_index]
-        start_vort_ypos = ds_obj.ypos[0, category_index]
-        start_vort_zpos = ds_obj.zpos[0, category_index]
+        start_vort_xpos = category_xpos[0, traj_num]
+        start_vort_ypos = category_ypos[0, traj_num]
+        start_vort_zpos = category_zpos[0, traj_num]
 
         # Get "correct" vorticity (CM1 vorticity interpolated to trajectory
         #   positions) at each time step.
         for out_arr_i, obj_i in enumerate(range(plot_limit)):
-            interp_xpos = ds_obj.xpos[obj_i, category_index]
-            interp_ypos = ds_obj.ypos[obj_i, category_index]
-            interp_zpos = ds_obj.zpos[obj_i, category_index]
-            interp_vort[axis_num, out_arr_i, traj_num] = interpolate_vort(grid_coord, interp_xpos, interp_ypos, interp_zpos, vort_var[out_arr_i])
+            interp_xpos = category_xpos[obj_i, traj_num]
+            interp_ypos = category_ypos[obj_i, traj_num]
+            interp_zpos = category_zpos[obj_i, traj_num]
+            interp_vort[axis_num, out_arr_i, traj_num] = interpolate_vort(grid_coord, interp_xpos, interp_ypos, interp_zpos, vort_var[out_arr_i])[0]
 
         # Starting positions for the prognostic vorticity (same for both tendency sets).
-        prog_budget_vort[axis_num, 0, traj_num] = interpolate_vort(grid_coord, start_vort_xpos, start_vort_ypos, start_vort_zpos, vort_var[0])
-        prog_equation_vort[axis_num, 0, traj_num] = interpolate_vort(grid_coord, start_vort_xpos, start_vort_ypos, start_vort_zpos, vort_var[0])
+        prog_budget_vort[axis_num, 0, traj_num] = interpolate_vort(grid_coord, start_vort_xpos, start_vort_ypos, start_vort_zpos, vort_var[0])[0]
+        prog_equation_vort[axis_num, 0, traj_num] = interpolate_vort(grid_coord, start_vort_xpos, start_vort_ypos, start_vort_zpos, vort_var[0])[0]
 
-        # Calculate the "prognostic" vorticity at each time step.
-        calc_prog_vort(prog_budget_vort, plot_limit, category_index, time_step_lengths, budget_var_names[budget_type]['budget'], axis_num, traj_num)
-        calc_prog_vort(prog_equation_vort, plot_limit, category_index, time_step_lengths, budget_var_names[budget_type]['equation'], axis_num, traj_num)
+    # Calculate the "prognostic" vorticity at each time step for all of the
+    #   trajectories, using the tendencies at the end of each time step.
+    budget_tend_sum = sum_tendencies(ds_obj, budget_var_names[budget_type]['budget'], category_indices, (0, plot_limit))
+    equation_tend_sum = sum_tendencies(ds_obj, budget_var_names[budget_type]['equation'], category_indices, (0, plot_limit))
+    prog_budget_vort[axis_num] = integrate_tendencies(prog_budget_vort[axis_num, 0], budget_tend_sum, time_step_lengths, 'forward', 'right')
+    prog_equation_vort[axis_num] = integrate_tendencies(prog_equation_vort[axis_num, 0], equation_tend_sum, time_step_lengths, 'forward', 'right')
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Determine each trajectory's ordered difference from the mean trajectory.
@@ -284,7 +289,7 @@ plot_indices = np.argwhere(combine_sum_squares <= sorted(combine_sum_squares)[-1
 
 order_of_indices = np.argwhere(sorted(combine_sum_squares) == combine_sum_squares[plot_indices][:,None])[:,1]
 
-plot_indices_ordered = np.zeros((len(plot_indices)), dtype=np.int)
+plot_indices_ordered = np.zeros((len(plot_indices)), dtype=int)
 plot_indices_ordered[order_of_indices] = plot_indices
 
 np.savez(output_dir + 'indices_from_mean_{:s}_{:s}_{:s}'.format(version_number, parcel_label, parcel_category), plot_indices_ordered=plot_indices_ordered)
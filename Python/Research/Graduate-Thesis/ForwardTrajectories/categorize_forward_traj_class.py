@@ -125,7 +125,7 @@ class Cat_forward_traj:
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     def meters_to_trajnum(self, xpos, ypos, zpos):
 
-        traj_num = np.zeros(self.initial_pos[:,0].shape, dtype=np.int)
+        traj_num = np.zeros(self.initial_pos[:,0].shape, dtype=int)
 
         for i, coord_meters in enumerate(self.initial_pos):
             x_diff = np.abs(xpos[0] - coord_meters[2])
@@ -11,7 +11,20 @@
 #             "cm1out_pdata_vort_interp_{model_version_number}_{parcel_label}.nc"
 #
 # Syntax: 
-#   traj_data = Forward_traj_ds(model_version_number, path_to_data, parcel_label)
+#   traj_data = Forward_traj_ds(model_version_number, path_to_data, parcel_label, cache_size_mb, memmap_dir)
+#
+#   cache_size_mb: memory limit (in megabytes) of the budget variables kept
+#                  in memory after they are read (default 2048, None for no
+#                  limit).  The arrays returned by getBudgetData and
+#                  getCombinedBudgetData are read-only; use np.copy to get
+#                  an array that can be modified.
+#   memmap_dir: directory for temporary memory-mapped copies of the budget
+#               variables that do not fit in the memory limit (default None,
+#               read them from the file again instead)
+#
+#   If a trajectory store (trajectory_store.py) has been created for this
+#   dataset (after the interpolated file was last changed), read_data uses it
+#   instead of the interpolated file.
 #
 # Execution Example:
 #   from forward_traj_interp_class import Forward_traj_ds
@@ -20,8 +33,18 @@
 # Modification History:
 #   2022/03/30 - Lance Wilson:  Created from back_traj_interp_class and
 #                               categorize_traj_class.
+#   2026/10/17 - Lance Wilson:  Keep budget variables (and combined
+#                               horizontal and vertical components) in memory
+#                               or memory-mapped files after the first read.
+#   2026/10/17 - Lance Wilson:  Read from the trajectory store for this
+#                               dataset if it exists, and added getParcelData
+#                               to read a subset of parcels and times.
+#   2026/10/17 - Lance Wilson:  Positions are read the first time they are
+#                               used instead of when the data is opened.
 #
 
+from budget_cache import Budget_cache
+from trajectory_store import Traj_store, forward_traj_store_name, store_is_current
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
 from os import path
@@ -31,7 +54,14 @@ import numpy as np
 import sys
 
 class Forward_traj_ds:
-    def __init__(self, version_number, interp_dir, parcel_label):
+    def __init__(self, version_number, interp_dir, parcel_label, cache_size_mb=2048, memmap_dir=None):
+        # Budget variables that have already been read.
+        self.budget_cache = Budget_cache(cache_size_mb, memmap_dir)
+        # Trajectory store containing this dataset (if it exists).
+        self.store = None
+        # Position variables that have already been read.
+        self.positions = {}
+
         # File names for this category of interpolated trajectory data.
         if version_number in parcel_label:
             file_name = 'cm1out_pdata_vort_interp_{:s}.nc'.format(parcel_label)
@@ -44,6 +74,7 @@ class Forward_traj_ds:
             interp_dir = interp_dir + '/'
 
         self.file_path = interp_dir + file_name
+        self.store_path = interp_dir + forward_traj_store_name(version_number, parcel_label)
 
         # Check whether this dataset already exists.
         if path.isfile(self.file_path):
@@ -113,7 +144,10 @@ class Forward_traj_ds:
     #   to back trajectory locations.
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     def read_data(self):
-        if self.existing_file == True:
+        # Use the trajectory store for this dataset if it has been created.
+        if store_is_current(self.store_path, [self.file_path]):
+            self.read_store()
+        elif self.existing_file == True:
             self.ds = Dataset(self.file_path)
             # From https://stackoverflow.com/a/41627098
             # Close netCDF files when the program exits.
@@ -137,15 +171,28 @@ class Forward_traj_ds:
             #   'pos') and those that have only one dimension (which should
             #   just be file_num_offset).
             self.budget_var_keys = [var_name for var_name in self.ds.variables.keys() if not var_name.endswith('pos') if len(self.ds.variables[var_name].dimensions) > 1]
-
-            # Position data for the back trajectories.
-            self.xpos = self.getBudgetData('xpos')
-            self.ypos = self.getBudgetData('ypos')
-            self.zpos = self.getBudgetData('zpos')
         else:
             print('Forward trajectory interpolated vorticity budget file does not exist.')
             sys.exit()
 
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Open the trajectory store for this dataset.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read_store(self):
+        self.store = Traj_store(self.store_path)
+        self.store.read_data()
+
+        # Total number of parcels for this set of data.
+        self.total_parcel_num = self.store.total_parcel_num
+        # Model file at the earliest time of the trajectory dataset.
+        self.file_num_offset = self.store.file_num_offset
+        # Get the number of time steps in the full set of parcel data.
+        self.parcel_time_step_num = self.store.parcel_time_step_num
+        # Array of model simulation times (in seconds) for the trajectory dataset.
+        self.simulation_times = self.store.simulation_times
+        # List of vorticity budget variables.
+        self.budget_var_keys = self.store.budget_var_keys
+
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     # Called at exit time to close the netCDF files.
     #   From https://stackoverflow.com/a/41627098
@@ -154,10 +201,55 @@ class Forward_traj_ds:
         ds.close()
 
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Get Data for this vorticity budget variable.
+    # Get Data for this vorticity budget variable (read-only array, read from
+    #   the file the first time the variable is used).
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     def getBudgetData(self, budget_var_name):
-        return np.copy(self.ds.variables[budget_var_name])
+        if self.store is not None:
+            return self.budget_cache.get(budget_var_name, lambda: self.store.getParcelData(budget_var_name))
+        return self.budget_cache.get(budget_var_name, lambda: np.copy(self.ds.variables[budget_var_name]))
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Full (time, parcel) position arrays for the forward trajectories, read
+    #   the first time they are used (use getParcelData to read the positions
+    #   of only some parcels).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    @property
+    def xpos(self):
+        return self.getPositionData('xpos')
+
+    @property
+    def ypos(self):
+        return self.getPositionData('ypos')
+
+    @property
+    def zpos(self):
+        return self.getPositionData('zpos')
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read a position variable once and keep it (outside of the budget
+    #   variable memory limit, since the positions are indexed repeatedly).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def getPositionData(self, pos_name):
+        if pos_name not in self.positions:
+            self.positions[pos_name] = self.getBudgetData(pos_name)
+        return self.positions[pos_name]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Get (time, parcel) data for a set of parcel numbers (None for all
+    #   parcels) and (start, end) range of time indices (None for all times).
+    #   Only the needed parcels are read if there is a trajectory store for
+    #   this dataset.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def getParcelData(self, budget_var_name, parcel_ids=None, time_range=None):
+        if self.store is not None and budget_var_name not in self.budget_cache.arrays:
+            return self.store.getParcelData(budget_var_name, parcel_ids, time_range)
+
+        t1, t2 = (0, self.parcel_time_step_num) if time_range is None else time_range
+        budget_var = self.getBudgetData(budget_var_name)[t1:t2]
+        if parcel_ids is None:
+            return budget_var
+        return budget_var[:,np.asarray(parcel_ids, dtype=int)]
 
     #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
     # Retrieve and combine horizontal and vertical components of vorticity
@@ -168,7 +260,7 @@ class Forward_traj_ds:
         vert_name = self.add_dir2var(combined_var_name, 'v')
 
         if horiz_name in self.budget_var_keys and vert_name in self.budget_var_keys:
-            budget_var = self.getBudgetData(horiz_name) + self.getBudgetData(vert_name)
+            budget_var = self.budget_cache.get(('combined', combined_var_name), lambda: self.getBudgetData(horiz_name) + self.getBudgetData(vert_name))
         else:
             # For now, if there are not both horizontal and vertical
             #   components, or if a regular variable name was entered, return
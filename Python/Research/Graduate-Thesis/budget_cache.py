@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   budget_cache.py
+#
+# Purpose:  Keep arrays read from the trajectory vorticity budget files in
+#           memory, so that each variable is only read from the netCDF file
+#           (and copied) once.  The least recently used arrays are removed
+#           when the total size of the cached arrays is over a memory limit.
+#           Cached arrays are set to read-only, so the same array can be
+#           returned every time without being changed by the caller (use
+#           np.copy to get an array that can be modified).
+#
+#           Optionally, arrays removed from memory (or too large to be kept in
+#           memory) are written to .npy files in a temporary directory and
+#           memory-mapped, so they still do not need to be read from the
+#           netCDF file again.  The temporary directory is deleted when the
+#           program exits.
+#
+# Syntax: from budget_cache import Budget_cache
+#         budget_cache = Budget_cache(max_megabytes, memmap_dir)
+#         budget_var = budget_cache.get(key, read_function)
+#
+#   Input:
+#       max_megabytes: memory limit of the cached arrays in megabytes (None
+#                      for no limit, 0 to not cache anything in memory)
+#       memmap_dir: directory in which to create the temporary directory for
+#                   memory-mapped arrays (None to not use memory-mapped
+#                   arrays)
+#       key: name of the array in the cache
+#       read_function: function with no arguments that returns the array,
+#                      called if the array is not in the cache
+#
+# Execution Example:
+#   budget_cache = Budget_cache(2048)
+#   xvort = budget_cache.get('xvort', lambda: np.copy(ds.variables['xvort']))
+#
+#   budget_cache = Budget_cache(512, '/tmp')
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to avoid re-reading budget variables
+#                               from the trajectory files on every access.
+#   2026/10/17 - Lance Wilson:  Added memory-mapped arrays for arrays removed
+#                               from memory.
+#
+
+from collections import OrderedDict
+
+import atexit
+import numpy as np
+import os
+import shutil
+import tempfile
+
+class Budget_cache:
+    def __init__(self, max_megabytes=2048, memmap_dir=None):
+        self.max_bytes = None if max_megabytes is None else int(max_megabytes * 1024 * 1024)
+
+        # Cached arrays, in order from least to most recently used.
+        self.arrays = OrderedDict()
+        self.total_bytes = 0
+
+        # Memory-mapped arrays, and the temporary directory containing their
+        #   files (created when the first array is written).
+        self.memmap_dir = memmap_dir
+        self.memmap_arrays = {}
+        self.memmap_tempdir = None
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Return the cached array for this key, or read it with read_function and
+    #   add it to the cache.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def get(self, key, read_function):
+        if key in self.arrays:
+            self.arrays.move_to_end(key)
+            return self.arrays[key]
+
+        if key in self.memmap_arrays:
+            return self.memmap_arrays[key]
+
+        array = np.asarray(read_function())
+        array.flags.writeable = False
+
+        # Arrays larger than the limit are not kept in memory.
+        if self.max_bytes is not None and array.nbytes > self.max_bytes:
+            if self.memmap_dir is not None:
+                return self.add_memmap(key, array)
+            return array
+
+        self.arrays[key] = array
+        self.total_bytes += array.nbytes
+        # Remove the least recently used arrays until under the limit.
+        while self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            old_key, old_array = self.arrays.popitem(last=False)
+            self.total_bytes -= old_array.nbytes
+            if self.memmap_dir is not None:
+                self.add_memmap(old_key, old_array)
+
+        return array
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Write an array to a .npy file and return it as a read-only
+    #   memory-mapped array.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def add_memmap(self, key, array):
+        if self.memmap_tempdir is None:
+            self.memmap_tempdir = tempfile.mkdtemp(prefix='budget_cache_', dir=self.memmap_dir)
+            # Delete the files when the program exits.
+            atexit.register(shutil.rmtree, self.memmap_tempdir, True)
+
+        file_name = os.path.join(self.memmap_tempdir, '{:d}.npy'.format(len(self.memmap_arrays)))
+        np.save(file_name, array)
+        self.memmap_arrays[key] = np.load(file_name, mmap_mode='r')
+
+        return self.memmap_arrays[key]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Remove all arrays from the cache.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def clear(self):
+        self.arrays.clear()
+        self.total_bytes = 0
+        self.memmap_arrays.clear()
+        if self.memmap_tempdir is not None:
+            shutil.rmtree(self.memmap_tempdir, True)
+            self.memmap_tempdir = None
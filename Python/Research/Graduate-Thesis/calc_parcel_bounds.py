@@ -9,6 +9,12 @@
 # Syntax: from calc_parcel_bounds import calc_boundaries
 #         x1, y1, z1, x2, y2, z2 = calc_boundaries(version_number, bound_buffer)
 #
+#         from calc_parcel_bounds import calc_parcel_box, parcels_in_box
+#         box = calc_parcel_box(coords, positions, halo)
+#         box_ok = parcels_in_box(box, coords, positions, edge_buffer)
+#         box_ok = box_contains(outer_box, inner_box)
+#         box = merge_boxes(box1, box2, ...)
+#
 #         python3 calc_parcel_bounds.py version_number, bound_buffer
 #
 # Input:  CM1 Model version number (see README_Model_Version_Descriptions.txt)
@@ -25,6 +31,11 @@
 #                               based on back trajectory files that will also
 #                               be used in calc_vort_equation.py.
 #   2022/02/04 - Lance Wilson:  Updated comments for calc_bound_index function.
+#   2026/10/17 - Lance Wilson:  Added calc_parcel_box and parcels_in_box to
+#                               calculate a subdomain around the current parcel
+#                               positions for reading hyperslabs of model data.
+#   2026/10/17 - Lance Wilson:  Added box_contains.
+#   2026/10/17 - Lance Wilson:  Added merge_boxes.
 #
 
 from netCDF4 import Dataset
@@ -48,6 +59,92 @@ def calc_bound_index(coord, position, bound_buffer=0):
     # Add a buffer to the value, and clip to the maximum model dimensions.
     return np.clip(pos_index + bound_buffer, 0, len(coord))
 
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Calculate the range of scalar grid indices needed to linearly interpolate to
+#   a set of positions.
+#   Arguments:
+#       coord: locations of model scalar grid points
+#       positions: locations of parcels (nan values are ignored)
+#   Returns:
+#       Lowest and highest (exclusive) index of the grid points surrounding
+#       the parcels, or None if there are no valid parcels.
+#   The staggered grid points surrounding a parcel are at most one index
+#   above the scalar points, so a staggered slice of [index1:index2+1] will
+#   also contain every parcel.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_parcel_index_range(coord, positions):
+    positions = positions[np.isfinite(positions)]
+    if positions.size == 0:
+        return None
+
+    # Index of the grid point below the lowest and highest parcel.
+    cell_index = np.clip(np.searchsorted(coord, [np.min(positions), np.max(positions)]) - 1, 0, len(coord) - 2)
+
+    return (cell_index[0], cell_index[1] + 2)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Calculate the indices of a subdomain (box) containing all parcels, with a
+#   halo of extra grid points on each side.
+#   Arguments:
+#       coords: scalar grid coordinates (x_coord, y_coord, z_coord)
+#       positions: parcel positions (xpos, ypos, zpos)
+#       halo: number of grid points to add to each side of the parcels
+#   Returns:
+#       (x1, y1, z1, x2, y2, z2), used as [x1:x2] for scalar variables and
+#       [x1:x2+1] for staggered variables.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_parcel_box(coords, positions, halo=0):
+    box_min = []
+    box_max = []
+    for coord, position in zip(coords, positions):
+        index_range = calc_parcel_index_range(coord, position)
+        # Use the full dimension if all of the parcels have left the domain.
+        if index_range is None:
+            index_range = (0, len(coord))
+
+        box_min.append(int(np.clip(index_range[0] - halo, 0, len(coord))))
+        box_max.append(int(np.clip(index_range[1] + halo, 0, len(coord))))
+
+    return tuple(box_min + box_max)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Check whether all parcels are inside of a box (from calc_parcel_box) and at
+#   least edge_buffer grid points away from any edge of the box that is not
+#   also the edge of the model domain.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def parcels_in_box(box, coords, positions, edge_buffer=0):
+    num_dims = len(coords)
+    for dim, (coord, position) in enumerate(zip(coords, positions)):
+        index_range = calc_parcel_index_range(coord, position)
+        if index_range is None:
+            continue
+
+        box_min = box[dim]
+        box_max = box[dim+num_dims]
+
+        if box_min > 0 and index_range[0] < box_min + edge_buffer:
+            return False
+        if box_max < len(coord) and index_range[1] > box_max - edge_buffer:
+            return False
+
+    return True
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Check whether one box (from calc_parcel_box) is entirely inside of another.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def box_contains(outer_box, inner_box):
+    num_dims = len(outer_box)//2
+    return (all(outer_min <= inner_min for outer_min, inner_min in zip(outer_box[:num_dims], inner_box[:num_dims]))
+            and all(outer_max >= inner_max for outer_max, inner_max in zip(outer_box[num_dims:], inner_box[num_dims:])))
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Smallest box (from calc_parcel_box) containing all of the given boxes.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def merge_boxes(*boxes):
+    num_dims = len(boxes[0])//2
+    return tuple([min([box[dim] for box in boxes]) for dim in range(num_dims)]
+                 + [max([box[dim] for box in boxes]) for dim in range(num_dims, 2*num_dims)])
+
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Calculate the boundaries in meters and retrieve the coordinate positions that
 #   are used to calculate the indices used as boundaries to the subset of data
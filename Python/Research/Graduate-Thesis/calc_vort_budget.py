@@ -6,12 +6,22 @@
 # Purpose:  Calculate vorticity tendency based on momentum budget variables in
 #           CM1, and output to a netCDF file.
 #
-# Syntax: python3 calc_vort_budget.py model_version
+# Syntax: python3 calc_vort_budget.py model_version [workers=num_processes] [append=Y] [compress=Y|N] [complevel=level] [shuffle=Y|N] [chunks=nt,nk,nj,ni] [digits=num_digits]
 #
 #   Input:
+#       workers: number of processes used to calculate the model time steps
+#                (default 1); the main process writes the output file
+#       append=Y: open an existing output file and calculate only the model
+#                 times that are not in it yet (e.g. after adding model files)
+#       compress, complevel, shuffle, chunks, digits: chunking and compression
+#                of the output variables (see netcdf_output.py); by default
+#                each time step is one chunk, compressed with zlib level 4
 #
 # Execution Example:
 #   python3 calc_vort_budget.py v5
+#   python3 calc_vort_budget.py v5 workers=16
+#   python3 calc_vort_budget.py v5 complevel=6 digits=9
+#   python3 calc_vort_budget.py v5 append=Y
 #
 # Temporary Execution Example (Run local script on server):
 #   ssh vortex python < calc_vort_budget.py - v5
@@ -20,27 +30,60 @@
 #   2021/09/28 - Lance Wilson:  Created, splitting off code from
 #                               calc_back_traj_vort_tendency.py to calculate
 #                               vorticity budgets and output to netCDF file.
+#   2026/10/17 - Lance Wilson:  Added option to calculate time steps on a pool
+#                               of processes (time_step_pool.py).
+#   2026/10/17 - Lance Wilson:  Output variables are now chunked and compressed
+#                               (netcdf_output.py).
+#   2026/10/17 - Lance Wilson:  Loop over model times in the outer loop, so
+#                               each model file is read once for all of the
+#                               budget terms.
+#   2026/10/17 - Lance Wilson:  Added append mode for adding new model times to
+#                               an existing output file.
+#   2026/10/17 - Lance Wilson:  Append mode refuses output files created
+#                               before times were written per time step.
 #
 
 from calc_parcel_bounds import calc_boundaries
+from netcdf_output import Output_settings, check_output_domain, check_time_written_per_step, completed_time_indices, create_4d_variable, mark_time_written_per_step
+from time_step_pool import Time_step_pool
 
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
 import glob
 import numpy as np
+import os
 import sys
 import time
 
-if len(sys.argv) > 1:
+mandatory_arg_num = 1
+
+if len(sys.argv) > mandatory_arg_num:
     # Model run that is being used.
     version_number = sys.argv[1]
 else:
     print('Parcel label or version number was not specified.')
-    print('Syntax: python3 calc_vort_budget.py model_version')
+    print('Syntax: python3 calc_vort_budget.py model_version [workers=num_processes] [append=Y] [compress=Y|N] [complevel=level] [shuffle=Y|N] [chunks=nt,nk,nj,ni] [digits=num_digits]')
     print('Example: python3 calc_vort_budget.py v5')
     print('Currently supported version numbers: v4, v5')
     sys.exit()
 
+# Least significant digit (decimal places) kept for individual output
+#   variables, e.g. {'xvortb_hadv': 9}; variables that are not listed use
+#   the digits option (lossless by default).
+significant_digits = {}
+
+# Optional command-line arguments.
+num_workers = 1
+append = 'N'
+output_settings = Output_settings(significant_digits)
+if len(sys.argv) > mandatory_arg_num + 1:
+    for option in sys.argv[mandatory_arg_num+1:]:
+        if option.startswith('workers='):
+            num_workers = int(option.split('=')[-1])
+        if option.startswith('append='):
+            append = option.split('=')[-1].upper()
+        output_settings.set_option(option)
+
 if version_number == 'v3' or version_number =='10s':
     print('Version number is not valid.')
     print('Currently supported version numbers: v4, v5')
@@ -153,6 +196,44 @@ def calc_zvort_component(ub_var, vb_var, x_coord, y_coord):
 
     return avg_dvb_var_dx - avg_dub_var_dy
 
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+#   Read all momentum budget terms at one time and calculate their vorticity
+#   components (run in a worker process when using more than one process).
+#   Returns a dictionary of (xvort, yvort, zvort) components for each term,
+#   where the vertical component is None for the buoyancy term.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_time_step(ds, cur_file_num):
+    vort_comps = {}
+    for var_name in budget_variables:
+        # There is no buoyancy variable for u and v momentum, so creating an
+        #   empty array that can be passed and used as a check in component
+        #   calculation functions.
+        if var_name == 'b_buoy':
+            ub_var = np.zeros((0))
+            vb_var = np.zeros((0))
+        # Get this momentum budget term's x and y component if this is not the buoyancy term.
+        else:
+            ub_var = np.copy(ds.variables['u' + var_name][cur_file_num, z1:z2, y1:y2, x1:x2+1])
+            vb_var = np.copy(ds.variables['v' + var_name][cur_file_num, z1:z2, y1:y2+1, x1:x2])
+        # Get this momentum budget term's vertical component.
+        wb_var = np.copy(ds.variables['w' + var_name][cur_file_num, z1:z2+1, y1:y2, x1:x2])
+
+        # Calculate the East-West component of vorticity for this term.
+        xvort_comp = calc_xvort_component(vb_var, wb_var, y_coord[y1:y2], z_coord[z1:z2])
+        # Calculate the North-South component of vorticity for this term.
+        yvort_comp = calc_yvort_component(ub_var, wb_var, x_coord[x1:x2], z_coord[z1:z2])
+
+        # Calculate the vertical component of vorticity for this term only if
+        #   this is not the buoyancy term.
+        if var_name != 'b_buoy':
+            zvort_comp = calc_zvort_component(ub_var, vb_var, x_coord[x1:x2], y_coord[y1:y2])
+        else:
+            zvort_comp = None
+
+        vort_comps[var_name] = (xvort_comp, yvort_comp, zvort_comp)
+
+    return vort_comps
+
 model_dir = '75m_100p_{:s}/'.format(version_number)
 
 # Momentum Budget Variables (Model Terms)
@@ -163,8 +244,9 @@ budget_variables = ['b_buoy', 'b_hadv', 'b_vadv', 'b_hedif', 'b_vedif', 'b_hturb
 # Number of model grid points to add to each side of the boundary edge calculation.
 bound_buffer = 5
 
-# Get list of all CM1 output files for this run.
-model_file_list = glob.glob(model_dir + 'JS_75m_run*_000*.nc')
+# Get list of all CM1 output files for this run (sorted, so that the time
+#   index matches the file number when files are added to the directory).
+model_file_list = sorted(glob.glob(model_dir + 'JS_75m_run*_000*.nc'))
 # Open the netCDF dataset using netCDF4 module.
 ds = MFDataset(model_file_list)
 
@@ -186,49 +268,62 @@ z_coord = np.copy(ds.variables['z'])*1000.
 #   Maximum boundary values: x2, y2, z2.
 x1, y1, z1, x2, y2, z2 = calc_boundaries(version_number, bound_buffer)
 
-# Open the output netCDF file.
-ds_out = Dataset(model_dir + 'back_traj_analysis/{:s}_model_vort_budget.nc'.format(version_number), mode='w')
-
-# Create netCDF variable dimensions.
-x_dim = ds_out.createDimension('ni', x2-x1)
-y_dim = ds_out.createDimension('nj', y2-y1)
-z_dim = ds_out.createDimension('nk', z2-z1)
-time_dim = ds_out.createDimension('time', None)
-
-# Create variable containing the subset of x coordinate data used in the output.
-xcoord_var = ds_out.createVariable('xh', np.float32, ('ni'))
-xcoord_var.units = 'm'
-xcoord_var.definition = getattr(ds.variables['xh'], 'def')
-xcoord_var[:] = x_coord[x1:x2]
-
-# Create variable containing the subset of y coordinate data used in the output.
-ycoord_var = ds_out.createVariable('yh', np.float32, ('nj'))
-ycoord_var.units = 'm'
-ycoord_var.definition = getattr(ds.variables['yh'], 'def')
-ycoord_var[:] = y_coord[y1:y2]
-
-# Create variable containing the subset of z coordinate data used in the output.
-zcoord_var = ds_out.createVariable('z', np.float32, ('nk'))
-zcoord_var.units = 'm'
-zcoord_var.definition = getattr(ds.variables['z'], 'def')
-zcoord_var[:] = z_coord[z1:z2]
-
-# Create variable in the output file for time.
-time_var = ds_out.createVariable('time', np.float32, ('time'))
-time_var.units = ds.variables['time'].units
-time_var.definition = getattr(ds.variables['time'], 'def')
-
-# Calculate vorticity components for each term of the model momentum budgets separately.
-for var_name in budget_variables:
-    # Timer for the variable loop.
-    start = time.time()
+# Output netCDF file.
+output_file_name = model_dir + 'back_traj_analysis/{:s}_model_vort_budget.nc'.format(version_number)
 
+# In append mode, add the missing time steps to an existing output file.
+if append == 'Y' and os.path.exists(output_file_name):
+    ds_out = Dataset(output_file_name, mode='a')
+    check_time_written_per_step(ds_out)
+    check_output_domain(ds_out, x_coord[x1:x2], y_coord[y1:y2], z_coord[z1:z2])
+    time_var = ds_out.variables['time']
+else:
+    ds_out = Dataset(output_file_name, mode='w')
+    # Times are written after the variables of each time step, so that
+    #   append mode can find the completed time steps.
+    mark_time_written_per_step(ds_out)
+
+    # Create netCDF variable dimensions.
+    x_dim = ds_out.createDimension('ni', x2-x1)
+    y_dim = ds_out.createDimension('nj', y2-y1)
+    z_dim = ds_out.createDimension('nk', z2-z1)
+    time_dim = ds_out.createDimension('time', None)
+
+    # Create variable containing the subset of x coordinate data used in the output.
+    xcoord_var = ds_out.createVariable('xh', np.float32, ('ni'))
+    xcoord_var.units = 'm'
+    xcoord_var.definition = getattr(ds.variables['xh'], 'def')
+    xcoord_var[:] = x_coord[x1:x2]
+
+    # Create variable containing the subset of y coordinate data used in the output.
+    ycoord_var = ds_out.createVariable('yh', np.float32, ('nj'))
+    ycoord_var.units = 'm'
+    ycoord_var.definition = getattr(ds.variables['yh'], 'def')
+    ycoord_var[:] = y_coord[y1:y2]
+
+    # Create variable containing the subset of z coordinate data used in the output.
+    zcoord_var = ds_out.createVariable('z', np.float32, ('nk'))
+    zcoord_var.units = 'm'
+    zcoord_var.definition = getattr(ds.variables['z'], 'def')
+    zcoord_var[:] = z_coord[z1:z2]
+
+    # Create variable in the output file for time.
+    time_var = ds_out.createVariable('time', np.float32, ('time'))
+    time_var.units = ds.variables['time'].units
+    time_var.definition = getattr(ds.variables['time'], 'def')
+
+# Output variables for the vorticity components of each term of the model
+#   momentum budgets.
+xvort_vars = {}
+yvort_vars = {}
+zvort_vars = {}
+for var_name in budget_variables:
     # Create variable for the East-West component of vorticity for this term.
-    xvort_var = ds_out.createVariable('xvort{:s}'.format(var_name), np.float32, ('time','nk','nj','ni'))
+    xvort_var = create_4d_variable(ds_out, 'xvort{:s}'.format(var_name), output_settings)
     xvort_var.units = 's^-2'
 
     # Create variable for the North-South component of vorticity for this term.
-    yvort_var = ds_out.createVariable('yvort{:s}'.format(var_name), np.float32, ('time','nk','nj','ni'))
+    yvort_var = create_4d_variable(ds_out, 'yvort{:s}'.format(var_name), output_settings)
     yvort_var.units = 's^-2'
 
     # If this is not the buoyancy component, can create normal descriptions for
@@ -238,56 +333,54 @@ for var_name in budget_variables:
         yvort_var.definition = 'yvort' + getattr(ds.variables['v' + var_name], 'def')[1:]
 
         # Create variable for the vertical component of vorticity for this term.
-        zvort_var = ds_out.createVariable('zvort{:s}'.format(var_name), np.float32, ('time','nk','nj','ni'))
+        zvort_var = create_4d_variable(ds_out, 'zvort{:s}'.format(var_name), output_settings)
         zvort_var.units = 's^-2'
         zvort_var.definition = 'zvort' + getattr(ds.variables['w' + var_name], 'def')[1:]
+        zvort_vars[var_name] = zvort_var
     # If this is the buoyancy variable, use the description of buoyancy from w
     #   momentum as the definition for the x and y components.
     else:
         xvort_var.definition = 'xvort' + getattr(ds.variables['w' + var_name], 'def')[1:]
         yvort_var.definition = 'yvort' + getattr(ds.variables['w' + var_name], 'def')[1:]
 
-    for cur_file_num in range(model_time_steps):
-        # Timer for the time loop.
-        start2 = time.time()
-        # There is no buoyancy variable for u and v momentum, so creating an
-        #   empty array that can be passed and used as a check in component
-        #   calculation functions.
-        if var_name == 'b_buoy':
-            ub_var = np.zeros((0))
-            vb_var = np.zeros((0))
+    xvort_vars[var_name] = xvort_var
+    yvort_vars[var_name] = yvort_var
 
-            # Time variable output is done with the buoyancy variable so
-            #   that it is done only once for each time step.
-            time_var[cur_file_num] = ds.variables['time'][cur_file_num]
-        # Get this momentum budget term's x and y component if this is not the buoyancy term.
-        else:
-            ub_var = np.copy(ds.variables['u' + var_name][cur_file_num, z1:z2, y1:y2, x1:x2+1])
-            vb_var = np.copy(ds.variables['v' + var_name][cur_file_num, z1:z2, y1:y2+1, x1:x2])
-        # Get this momentum budget term's vertical component.
-        wb_var = np.copy(ds.variables['w' + var_name][cur_file_num, z1:z2+1, y1:y2, x1:x2])
+# Model times that are not in the output file yet (all of them unless adding
+#   to an existing file).
+completed_indices = completed_time_indices(time_var, ds.variables['time'][:])
+calc_indices = [cur_file_num for cur_file_num in range(model_time_steps) if cur_file_num not in completed_indices]
+print('Calculating {:d} of {:d} model time steps'.format(len(calc_indices), model_time_steps))
 
-        # Calculate the East-West component of vorticity for this term.
-        xvort_comp = calc_xvort_component(vb_var, wb_var, y_coord[y1:y2], z_coord[z1:z2])
-        # Calculate the North-South component of vorticity for this term.
-        yvort_comp = calc_yvort_component(ub_var, wb_var, x_coord[x1:x2], z_coord[z1:z2])
+# Each model time is read once for all of the budget terms and calculated
+#   independently (in worker processes if num_workers > 1), and the
+#   components are written here in time order.
+time_step_pool = Time_step_pool(calc_time_step, model_file_list, num_workers)
+
+# Timer for the time loop.
+start = time.time()
+for (cur_file_num,), vort_comps in time_step_pool.map([(cur_file_num,) for cur_file_num in calc_indices], ds):
+    for var_name in budget_variables:
+        xvort_comp, yvort_comp, zvort_comp = vort_comps[var_name]
 
         # Output x and y components of vorticity to the netCDF file.
-        xvort_var[cur_file_num,:,:,:] = xvort_comp
-        yvort_var[cur_file_num,:,:,:] = yvort_comp
+        xvort_vars[var_name][cur_file_num,:,:,:] = xvort_comp
+        yvort_vars[var_name][cur_file_num,:,:,:] = yvort_comp
 
-        # Calculate and output the vertical component of vorticity for this
-        #   term only if this is not the buoyancy term.
+        # Output the vertical component of vorticity for this term only if
+        #   this is not the buoyancy term.
         if var_name != 'b_buoy':
-            zvort_comp = calc_zvort_component(ub_var, vb_var, x_coord[x1:x2], y_coord[y1:y2])
-            zvort_var[cur_file_num,:,:,:] = zvort_comp
+            zvort_vars[var_name][cur_file_num,:,:,:] = zvort_comp
 
-        stop2 = time.time()
-        print("Variable {:>7s}, time step {:01d} took {:.2f} seconds".format(var_name, cur_file_num, stop2-start2))
+    # Time variable output is done after all of the terms, so a time in the
+    #   output file means that time step is complete.
+    time_var[cur_file_num] = ds.variables['time'][cur_file_num]
 
-    # Timer
     stop = time.time()
-    print("Variable {:s} took {:.2f} seconds".format(var_name, stop-start))
+    print("Time step {:01d} took {:.2f} seconds".format(cur_file_num, stop-start))
+    start = stop
+
+time_step_pool.close()
 
 # Close the netCDF files.
 ds_out.close()
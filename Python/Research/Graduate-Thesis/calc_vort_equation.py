@@ -6,12 +6,29 @@
 # Purpose:  Calculate the terms of the vorticity equation for a subset domain
 #           within the netCDF output from a run of Cloud Model 1.
 #
-# Syntax: python calc_vort_equation.py model_version
+# Syntax: python calc_vort_equation.py model_version [workers=num_processes] [append=Y] [tube=Y] [tube_radius=num_points] [compress=Y|N] [complevel=level] [shuffle=Y|N] [chunks=nt,nk,nj,ni] [digits=num_digits]
 #
 #   Input:
+#       workers: number of processes used to calculate the model time steps
+#                (default 1); the main process writes the output file
+#       append=Y: open an existing output file and calculate only the model
+#                 times that are not in it yet (e.g. after adding model files)
+#       tube=Y: calculate and write the terms only in the tiles (output chunks)
+#               within tube_radius grid points of a back trajectory parcel at
+#               each time (see trajectory_tube.py); the rest of the output is
+#               nan and is not stored in the file
+#       tube_radius: number of grid points around the parcels used with tube=Y
+#                    (default 2)
+#       compress, complevel, shuffle, chunks, digits: chunking and compression
+#                of the output variables (see netcdf_output.py); by default
+#                each time step is one chunk, compressed with zlib level 4
 #
 # Execution Example:
 #   python calc_vort_equation.py v5
+#   python calc_vort_equation.py v5 workers=16
+#   python calc_vort_equation.py v5 complevel=6 digits=9
+#   python calc_vort_equation.py v5 append=Y
+#   python calc_vort_equation.py v5 tube=Y tube_radius=3
 #
 # Modification History:
 #   2019/08/14 - Lance Wilson:  Created original program (vorticity_tendency.py).
@@ -21,177 +38,177 @@
 #   2021/09/30 - Lance Wilson:  Created calc_vort_equation.py from
 #                               vorticity_tendency.py to add file output and
 #                               account for model versions.
+#   2026/10/17 - Lance Wilson:  Moved the derivative calculations to
+#                               vort_derivatives.py, which takes each gradient
+#                               once into buffers reused at every time step.
+#   2026/10/17 - Lance Wilson:  Added option to calculate time steps on a pool
+#                               of processes (time_step_pool.py).
+#   2026/10/17 - Lance Wilson:  Output variables are now chunked and compressed
+#                               (netcdf_output.py).
+#   2026/10/17 - Lance Wilson:  Added append mode for adding new model times to
+#                               an existing output file.
+#   2026/10/17 - Lance Wilson:  Added tube option to calculate the terms only
+#                               near the back trajectories.
+#   2026/10/17 - Lance Wilson:  Append mode refuses output files created
+#                               before times were written per time step.
 #
 
-from calc_parcel_bounds import calc_boundaries
+from calc_parcel_bounds import calc_boundaries, merge_boxes
+from netcdf_output import Output_settings, check_output_domain, check_time_written_per_step, completed_time_indices, create_4d_variable, mark_time_written_per_step
+from time_step_pool import Time_step_pool
+from trajectory_tube import Trajectory_tube
+from vort_derivatives import Vort_derivatives, term_names
 
 from netCDF4 import Dataset
 from netCDF4 import MFDataset
 
 import glob
 import numpy as np
+import os
 import sys
 import time
 
-def calc_du_dx(u_wind, stagger_x_coord):
-    # Calculate du/dx at unstaggered grid point i using staggered u values.
-    u_diffs = u_wind[:,:,1:] - u_wind[:,:,:-1]
-    x_diffs = stagger_x_coord[1:] - stagger_x_coord[:-1]
-    return u_diffs/x_diffs[None,None,:]
-
-def calc_dv_dy(v_wind, stagger_y_coord):
-    # Calculate dv/dy at unstaggered grid point j using staggered v values.
-    v_diffs = v_wind[:,1:,:] - v_wind[:,:-1,:]
-    y_diffs = stagger_y_coord[1:] - stagger_y_coord[:-1]
-    return v_diffs/y_diffs[None,:,None]
-
-def calc_avg_du_dy(u_wind, grad_dy):
-    # Calculate du/dy using centered differencing, with du/dy being valid at
-    #   the staggered u points.
-    u_y_diffs = np.gradient(u_wind, axis=1)
-    du_dy = u_y_diffs/grad_dy[None,:,None]
-
-    # To keep arrays the same size for component calculation, averaging
-    #   data to unstaggered thermodynamic points.
-    return (du_dy[:,:,1:] + du_dy[:,:,:-1])/2.
-
-def calc_avg_du_dz(u_wind, grad_dz):
-    # Calculate du/dz using centered differencing, with du/dz being valid at
-    #   the staggered u points.
-    u_z_diffs = np.gradient(u_wind, axis=0)
-    du_dz = u_z_diffs/grad_dz[:,None,None]
-
-    # To keep arrays the same size for component calculation, averaging
-    #   data to unstaggered thermodynamic points.
-    return (du_dz[:,:,1:] + du_dz[:,:,:-1])/2.
-
-def calc_avg_dv_dx(v_wind, grad_dx):
-    # Calculate dv/dx using centered differencing, with dv/dx being valid at
-    #   the staggered v points.
-    v_x_diffs = np.gradient(v_wind, axis=2)
-    dv_dx = v_x_diffs/grad_dx[None,None,:]
-
-    # To keep arrays the same size for component calculation, averaging
-    #   data to unstaggered thermodynamic points.
-    return (dv_dx[:,1:,:] + dv_dx[:,:-1,:])/2.
-
-def calc_avg_dv_dz(v_wind, grad_dz):
-    # Calculate dv/dz using centered differencing, with dv/dz being valid at
-    #   the staggered v points.
-    v_z_diffs = np.gradient(v_wind, axis=0)
-    dv_dz = v_z_diffs/grad_dz[:,None,None]
-
-    # To keep arrays the same size for component calculation, averaging
-    #   data to unstaggered thermodynamic points.
-    return (dv_dz[:,1:,:] + dv_dz[:,:-1,:])/2.
-
-def calc_avg_dw_dx(w_wind, grad_dx):
-    # Calculate dw/dx using centered differencing, with dw/dx being valid at
-    #   the staggered w points (which are vertically stacked with the
-    #   thermodynamic points).
-    w_x_diffs = np.gradient(w_wind, axis=2)
-    dw_dx = w_x_diffs/grad_dx[None,None,:]
-
-    # To keep arrays the same size for component calculation, averaging
-    #   data to unstaggered thermodynamic points.
-    return (dw_dx[1:,:,:] + dw_dx[:-1,:,:])/2.
-
-def calc_avg_dw_dy(w_wind, grad_dy):
-    # Calculate dw/dy using centered differencing, with dw/dy being valid at
-    #   the staggered w points (which are vertically stacked with the
-    #   thermodynamic points).
-    w_y_diffs = np.gradient(w_wind, axis=1)
-    dw_dy = w_y_diffs/grad_dy[None,:,None]
-
-    # To keep arrays the same size for component calculation, averaging
-    #   data to unstaggered thermodynamic points.
-    return (dw_dy[1:,:,:] + dw_dy[:-1,:,:])/2.
-
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Calculate solenoid (baroclinic generation) term for all three components
-#   xvort_component: (1/rho^2) * (drho/dy * dp/dz - drho/dz * dp/dy)
-#   yvort_component: (1/rho^2) * (drho/dz * dp/dx - drho/dx * dp/dz)
-#   zvort_component: (1/rho^2) * (drho/dx * dp/dy - drho/dy * dp/dx)
+# Read the model data for one time and calculate the terms of the vorticity
+#   equation (run in a worker process when using more than one process).
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def calc_solenoid_terms(pressure, rho, grad_dx, grad_dy, grad_dz):
-    # Note: np.gradient takes centered differences of the field at each point,
-    #       except at the edges where it uses forward or backward differences.
-    # Note: indices of np.gradient result refer to the axes on which the
-    #       gradient is taken (i.e. 0 corresponds to gradient in k/z direction,
-    #       1 to j/y direction, and 2 to i/x direction).
+def calc_time_step(dataset, time_index):
+    # Storing data in numpy arrays runs faster than accessing data directly from dataset.
+    # Note: extra index for staggered wind grid points are included here.
+    u_wind = np.copy(dataset.variables['u'][time_index,k1:k2,j1:j2,i1:i2+1])
+    v_wind = np.copy(dataset.variables['v'][time_index,k1:k2,j1:j2+1,i1:i2])
+    w_wind = np.copy(dataset.variables['w'][time_index,k1:k2+1,j1:j2,i1:i2])
 
-    # Calculate dp/dx.
-    grad_p_x = np.gradient(pressure, axis=2)
-    dp_dx = grad_p_x/grad_dx[None,None,:]
+    # East-West Vorticity
+    x_vort = np.copy(dataset.variables['xvort'][time_index,k1:k2,j1:j2,i1:i2])
+    # North-South Vorticity
+    y_vort = np.copy(dataset.variables['yvort'][time_index,k1:k2,j1:j2,i1:i2])
+    # Vertical Vorticity
+    z_vort = np.copy(dataset.variables['zvort'][time_index,k1:k2,j1:j2,i1:i2])
 
-    # Calculate d(rho)/dx.
-    grad_rho_x = np.gradient(rho, axis=2)
-    drho_dx = grad_rho_x/grad_dx[None,None,:]
+    # Get density and pressure.
+    rho_perturb = np.copy(dataset.variables['rhopert'][time_index,k1:k2,j1:j2,i1:i2])
+    pressure_perturb = np.copy(dataset.variables['prspert'][time_index,k1:k2,j1:j2,i1:i2])
+    base_pressure = np.copy(dataset.variables['prs0'][time_index,k1:k2,j1:j2,i1:i2])
 
-    # Calculate dp/dy.
-    grad_p_y = np.gradient(pressure, axis=1)
-    dp_dy = grad_p_y/grad_dy[None,:,None]
+    rho = vort_derivatives.calc_density(base_pressure, rho_perturb, gravity)
+    pressure = base_pressure + pressure_perturb
 
-    # Calculate d(rho)/dy.
-    grad_rho_y = np.gradient(rho, axis=1)
-    drho_dy = grad_rho_y/grad_dy[None,:,None]
+    # Stretching, tilting, solenoid, and advection terms.
+    return vort_derivatives.calc_terms(u_wind, v_wind, w_wind, x_vort, y_vort, z_vort, pressure, rho)
 
-    # Calculate dp/dz.
-    grad_p_z = np.gradient(pressure, axis=0)
-    dp_dz = grad_p_z/grad_dz[:,None,None]
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Calculate the terms of the vorticity equation in a list of tiles of the
+#   output domain (from Trajectory_tube.tiles) at one time.
+#   Each tile is calculated with extra grid points on each side (where
+#   available), so the centered differences at the tile edges are the same
+#   as in the full domain.  Two points are needed in the vertical, since the
+#   density is calculated from the vertical derivative of the base state
+#   pressure before its own derivatives are taken.
+#   Returns a list of (tile, terms) for each tile.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_tube_time_step(dataset, time_index, tiles):
+    if len(tiles) == 0:
+        return []
 
-    # Calculate d(rho)/dz.
-    grad_rho_z = np.gradient(rho, axis=0)
-    drho_dz = grad_rho_z/grad_dz[:,None,None]
+    domain_shape = (i2-i1, j2-j1, k2-k1)
+    # Number of halo points in the x, y, and z directions.
+    halo_size = (1, 1, 2)
+    halo_tiles = [tuple([max(index - halo, 0) for index, halo in zip(tile[:3], halo_size)]
+                        + [min(index + halo, size) for index, halo, size in zip(tile[3:], halo_size, domain_shape)])
+                  for tile in tiles]
 
-    x_solenoid_term = (1/rho**2) * (drho_dy * dp_dz - drho_dz * dp_dy)
-    y_solenoid_term = (1/rho**2) * (drho_dz * dp_dx - drho_dx * dp_dz)
-    z_solenoid_term = (1/rho**2) * (drho_dx * dp_dy - drho_dy * dp_dx)
+    # Read the smallest box containing all of the tiles once.
+    bx1, by1, bz1, bx2, by2, bz2 = merge_boxes(*halo_tiles)
+    u_wind = np.copy(dataset.variables['u'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2,i1+bx1:i1+bx2+1])
+    v_wind = np.copy(dataset.variables['v'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2+1,i1+bx1:i1+bx2])
+    w_wind = np.copy(dataset.variables['w'][time_index,k1+bz1:k1+bz2+1,j1+by1:j1+by2,i1+bx1:i1+bx2])
 
-    return (x_solenoid_term, y_solenoid_term, z_solenoid_term)
+    x_vort = np.copy(dataset.variables['xvort'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2,i1+bx1:i1+bx2])
+    y_vort = np.copy(dataset.variables['yvort'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2,i1+bx1:i1+bx2])
+    z_vort = np.copy(dataset.variables['zvort'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2,i1+bx1:i1+bx2])
 
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Calculate Advection terms
-#   -1.*u * d(vort)/dx - v * d(vort)/dy - w * d(vort)/dz
-#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-def calc_advection(vort, avg_u, avg_v, avg_w):
-    grad_vort_x = np.gradient(vort, axis=2)
-    grad_vort_y = np.gradient(vort, axis=1)
-    grad_vort_z = np.gradient(vort, axis=0)
+    rho_perturb = np.copy(dataset.variables['rhopert'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2,i1+bx1:i1+bx2])
+    pressure_perturb = np.copy(dataset.variables['prspert'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2,i1+bx1:i1+bx2])
+    base_pressure = np.copy(dataset.variables['prs0'][time_index,k1+bz1:k1+bz2,j1+by1:j1+by2,i1+bx1:i1+bx2])
 
-    # Calculate d(vort)/dx.
-    dvort_dx = grad_vort_x/grad_dx[None,None,:]
-    # Calculate d(vort)/dy.
-    dvort_dy = grad_vort_y/grad_dy[None,:,None]
-    # Calculate d(vort)/dz.
-    dvort_dz = grad_vort_z/grad_dz[:,None,None]
+    tile_terms = []
+    for (x1, y1, z1, x2, y2, z2), (hx1, hy1, hz1, hx2, hy2, hz2) in zip(tiles, halo_tiles):
+        # Indices of the tile (with its halo) in the box that was read.
+        kb1, kb2, jb1, jb2, ib1, ib2 = hz1-bz1, hz2-bz1, hy1-by1, hy2-by1, hx1-bx1, hx2-bx1
 
-    return -1.*avg_u * dvort_dx - avg_v * dvort_dy - avg_w * dvort_dz
+        tile_derivatives = Vort_derivatives(x_coord[hx1:hx2], y_coord[hy1:hy2], z_coord[hz1:hz2],
+                                            stagger_x_coord[hx1:hx2+1], stagger_y_coord[hy1:hy2+1])
+
+        rho = tile_derivatives.calc_density(base_pressure[kb1:kb2,jb1:jb2,ib1:ib2], rho_perturb[kb1:kb2,jb1:jb2,ib1:ib2], gravity)
+        pressure = base_pressure[kb1:kb2,jb1:jb2,ib1:ib2] + pressure_perturb[kb1:kb2,jb1:jb2,ib1:ib2]
+
+        terms = tile_derivatives.calc_terms(u_wind[kb1:kb2,jb1:jb2,ib1:ib2+1], v_wind[kb1:kb2,jb1:jb2+1,ib1:ib2],
+                                            w_wind[kb1:kb2+1,jb1:jb2,ib1:ib2],
+                                            x_vort[kb1:kb2,jb1:jb2,ib1:ib2], y_vort[kb1:kb2,jb1:jb2,ib1:ib2],
+                                            z_vort[kb1:kb2,jb1:jb2,ib1:ib2], pressure, rho)
+
+        # Remove the halo.
+        tile_index = (slice(z1-hz1, z2-hz1), slice(y1-hy1, y2-hy1), slice(x1-hx1, x2-hx1))
+        tile_terms.append(((x1, y1, z1, x2, y2, z2), {term_name: terms[term_name][tile_index] for term_name in term_names}))
+
+    return tile_terms
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Beginning of Main Program
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-if len(sys.argv) > 1:
+mandatory_arg_num = 1
+
+if len(sys.argv) > mandatory_arg_num:
     # Model run that is being used.
     version_number = sys.argv[1]
 else:
     print('Parcel label or version number was not specified.')
-    print('Syntax: python3 calc_vort_equation.py model_version')
+    print('Syntax: python3 calc_vort_equation.py model_version [workers=num_processes] [append=Y] [tube=Y] [tube_radius=num_points] [compress=Y|N] [complevel=level] [shuffle=Y|N] [chunks=nt,nk,nj,ni] [digits=num_digits]')
     print('Example: python3 calc_vort_equation.py v5')
     print('Currently supported version numbers: v3, 10s, v4, v5')
     sys.exit()
 
+# Least significant digit (decimal places) kept for individual output
+#   variables, e.g. {'x_advection_term': 9}; variables that are not listed use
+#   the digits option (lossless by default).
+significant_digits = {}
+
+# Optional command-line arguments.
+num_workers = 1
+append = 'N'
+tube = 'N'
+tube_radius = 2
+output_settings = Output_settings(significant_digits)
+if len(sys.argv) > mandatory_arg_num + 1:
+    for option in sys.argv[mandatory_arg_num+1:]:
+        if option.startswith('workers='):
+            num_workers = int(option.split('=')[-1])
+        if option.startswith('append='):
+            append = option.split('=')[-1].upper()
+        if option.startswith('tube='):
+            tube = option.split('=')[-1].upper()
+        if option.startswith('tube_radius='):
+            tube_radius = int(option.split('=')[-1])
+        output_settings.set_option(option)
+
 model_dir = '75m_100p_{:s}/'.format(version_number)
 
 # Number of model grid points to add to each side of the boundary edge calculation.
 bound_buffer = 5
 
+# Number of back trajectory positions used for partially valid trajectories
+#   (same as in BackTrajectories/calc_back_traj_vort_tendency.py), used to
+#   find the times they are interpolated at with tube=Y.
+time_length_requirement = 108
+
 gravity = 9.80665 #m/s^2
 
-# Get list of all CM1 output files for this run.
-model_file_list = glob.glob(model_dir + 'JS_75m_run*_[0-9]*.nc')
+# Get list of all CM1 output files for this run (sorted, so that the time
+#   index matches the file number when files are added to the directory).
+model_file_list = sorted(glob.glob(model_dir + 'JS_75m_run*_[0-9]*.nc'))
 
 # Open the netCDF dataset using netCDF4 module.
 dataset = MFDataset(model_file_list)
@@ -224,106 +241,123 @@ x_coord = np.copy(dataset.variables['xh'][i1:i2])*1000.
 y_coord = np.copy(dataset.variables['yh'][j1:j2])*1000.
 z_coord = np.copy(dataset.variables['z'][k1:k2])*1000.
 
-# Gradients of spatial coordinates.
-grad_dx = np.gradient(x_coord)
-grad_dy = np.gradient(y_coord)
-grad_dz = np.gradient(z_coord)
+if tube == 'Y':
+    # Points that are not near a trajectory are not calculated, and are left
+    #   as nan in the output file.  The chunks are the tiles that are
+    #   calculated, so chunks with no trajectories nearby are never stored.
+    output_settings.fill_value = np.nan
+    if output_settings.chunk_shape is None:
+        output_settings.chunk_shape = (1, k2-k1, 32, 32)
+else:
+    # Buffers for the spatial derivatives, reused at each time step.
+    vort_derivatives = Vort_derivatives(x_coord, y_coord, z_coord, stagger_x_coord, stagger_y_coord)
 
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 # Setup output netCDF file and create variables.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-# Open the output netCDF file.
-ds_out = Dataset(model_dir + 'back_traj_analysis/{:s}_direct_vort_equation.nc'.format(version_number), mode='w')
-
-# Create netCDF variable dimensions.
-x_dim = ds_out.createDimension('ni', i2-i1)
-y_dim = ds_out.createDimension('nj', j2-j1)
-z_dim = ds_out.createDimension('nk', k2-k1)
-time_dim = ds_out.createDimension('time', None)
-
-# Create variable containing the subset of x coordinate data used in the output.
-xcoord_var = ds_out.createVariable('xh', np.float32, ('ni'))
-xcoord_var.units = 'm'
-xcoord_var.definition = getattr(dataset.variables['xh'], 'def')
-xcoord_var[:] = x_coord
-
-# Create variable containing the subset of y coordinate data used in the output.
-ycoord_var = ds_out.createVariable('yh', np.float32, ('nj'))
-ycoord_var.units = 'm'
-ycoord_var.definition = getattr(dataset.variables['yh'], 'def')
-ycoord_var[:] = y_coord
-
-# Create variable containing the subset of z coordinate data used in the output.
-zcoord_var = ds_out.createVariable('z', np.float32, ('nk'))
-zcoord_var.units = 'm'
-zcoord_var.definition = getattr(dataset.variables['z'], 'def')
-zcoord_var[:] = z_coord
-
-# Create variable in the output file for time.
-time_var = ds_out.createVariable('time', np.float32, ('time'))
-time_var.units = dataset.variables['time'].units
-time_var.definition = getattr(dataset.variables['time'], 'def')
-time_var[:] = dataset.variables['time'][:]
+# Output netCDF file.
+output_file_name = model_dir + 'back_traj_analysis/{:s}_direct_vort_equation.nc'.format(version_number)
+
+# In append mode, add the missing time steps to an existing output file.
+if append == 'Y' and os.path.exists(output_file_name):
+    ds_out = Dataset(output_file_name, mode='a')
+    check_time_written_per_step(ds_out)
+    check_output_domain(ds_out, x_coord, y_coord, z_coord)
+    time_var = ds_out.variables['time']
+else:
+    ds_out = Dataset(output_file_name, mode='w')
+    # Times are written after the variables of each time step, so that
+    #   append mode can find the completed time steps.
+    mark_time_written_per_step(ds_out)
+
+    # Create netCDF variable dimensions.
+    x_dim = ds_out.createDimension('ni', i2-i1)
+    y_dim = ds_out.createDimension('nj', j2-j1)
+    z_dim = ds_out.createDimension('nk', k2-k1)
+    time_dim = ds_out.createDimension('time', None)
+
+    # Create variable containing the subset of x coordinate data used in the output.
+    xcoord_var = ds_out.createVariable('xh', np.float32, ('ni'))
+    xcoord_var.units = 'm'
+    xcoord_var.definition = getattr(dataset.variables['xh'], 'def')
+    xcoord_var[:] = x_coord
+
+    # Create variable containing the subset of y coordinate data used in the output.
+    ycoord_var = ds_out.createVariable('yh', np.float32, ('nj'))
+    ycoord_var.units = 'm'
+    ycoord_var.definition = getattr(dataset.variables['yh'], 'def')
+    ycoord_var[:] = y_coord
+
+    # Create variable containing the subset of z coordinate data used in the output.
+    zcoord_var = ds_out.createVariable('z', np.float32, ('nk'))
+    zcoord_var.units = 'm'
+    zcoord_var.definition = getattr(dataset.variables['z'], 'def')
+    zcoord_var[:] = z_coord
+
+    # Create variable in the output file for time.
+    time_var = ds_out.createVariable('time', np.float32, ('time'))
+    time_var.units = dataset.variables['time'].units
+    time_var.definition = getattr(dataset.variables['time'], 'def')
 
 # Create variable for the divergence/stretching term in the east-west direction.
-x_stretch_term_var = ds_out.createVariable('x_stretch_term', np.float32, ('time','nk','nj','ni'))
+x_stretch_term_var = create_4d_variable(ds_out, 'x_stretch_term', output_settings)
 x_stretch_term_var.units = 's^-2'
 x_stretch_term_var.definition = 'Stretching Term of East-West Horizontal Vorticity Equation'
 
 # Create variable for the divergence/stretching term in the north-south direction.
-y_stretch_term_var = ds_out.createVariable('y_stretch_term', np.float32, ('time','nk','nj','ni'))
+y_stretch_term_var = create_4d_variable(ds_out, 'y_stretch_term', output_settings)
 y_stretch_term_var.units = 's^-2'
 y_stretch_term_var.definition = 'Stretching Term of North-South Horizontal Vorticity Equation'
 
 # Create variable for the divergence/stretching term in the vertical direction.
-z_stretch_term_var = ds_out.createVariable('z_stretch_term', np.float32, ('time','nk','nj','ni'))
+z_stretch_term_var = create_4d_variable(ds_out, 'z_stretch_term', output_settings)
 z_stretch_term_var.units = 's^-2'
 z_stretch_term_var.definition = 'Stretching Term of Vertical Vorticity Equation'
 
 # Create variable for the north-south horizontal tilting term.
-x_tilt_term_var = ds_out.createVariable('x_tilt_term', np.float32, ('time','nk','nj','ni'))
+x_tilt_term_var = create_4d_variable(ds_out, 'x_tilt_term', output_settings)
 x_tilt_term_var.units = 's^-2'
 x_tilt_term_var.definition = 'Tilting Term of East-West Horizontal Vorticity Equation'
 
 # Create variable for the east-west horizontal tilting term.
-y_tilt_term_var = ds_out.createVariable('y_tilt_term', np.float32, ('time','nk','nj','ni'))
+y_tilt_term_var = create_4d_variable(ds_out, 'y_tilt_term', output_settings)
 y_tilt_term_var.units = 's^-2'
 y_tilt_term_var.definition = 'Tilting Term of North-South Horizontal Vorticity Equation'
 
 # Create variable for the vertical tilting term.
-z_tilt_term_var = ds_out.createVariable('z_tilt_term', np.float32, ('time','nk','nj','ni'))
+z_tilt_term_var = create_4d_variable(ds_out, 'z_tilt_term', output_settings)
 z_tilt_term_var.units = 's^-2'
 z_tilt_term_var.definition = 'Tilting Term of Vertical Vorticity Equation'
 
 # Create variable for the x-direction solenoid term.
-x_solenoid_term_var = ds_out.createVariable('x_solenoid_term', np.float32, ('time','nk','nj','ni'))
+x_solenoid_term_var = create_4d_variable(ds_out, 'x_solenoid_term', output_settings)
 x_solenoid_term_var.units = 's^-2'
 x_solenoid_term_var.definition = 'Solenoid (Baroclinic Generation) Term of East-West Horizontal Vorticity Equation'
 
 # Create variable for the y-direction solenoid term.
-y_solenoid_term_var = ds_out.createVariable('y_solenoid_term', np.float32, ('time','nk','nj','ni'))
+y_solenoid_term_var = create_4d_variable(ds_out, 'y_solenoid_term', output_settings)
 y_solenoid_term_var.units = 's^-2'
 y_solenoid_term_var.definition = 'Solenoid (Baroclinic Generation) Term of North-South Horizontal Vorticity Equation'
 
 # Create variable for the z-direction solenoid term.
-z_solenoid_term_var = ds_out.createVariable('z_solenoid_term', np.float32, ('time','nk','nj','ni'))
+z_solenoid_term_var = create_4d_variable(ds_out, 'z_solenoid_term', output_settings)
 z_solenoid_term_var.units = 's^-2'
 z_solenoid_term_var.definition = 'Solenoid (Baroclinic Generation) Term of Vertical Vorticity Equation'
 
 # Create variable for the vertical advection term.
-x_advection_var = ds_out.createVariable('x_advection_term', np.float32, ('time','nk','nj','ni'))
+x_advection_var = create_4d_variable(ds_out, 'x_advection_term', output_settings)
 x_advection_var.units = 's^-2'
 x_advection_var.definition = 'Advection  Term of East-West Horizontal Vorticity Equation'
 
 # Create variable for the vertical advection term.
-y_advection_var = ds_out.createVariable('y_advection_term', np.float32, ('time','nk','nj','ni'))
+y_advection_var = create_4d_variable(ds_out, 'y_advection_term', output_settings)
 y_advection_var.units = 's^-2'
 y_advection_var.definition = 'Advection  Term of North-South Horizontal Vorticity Equation'
 
 # Create variable for the vertical advection term.
-z_advection_var = ds_out.createVariable('z_advection_term', np.float32, ('time','nk','nj','ni'))
+z_advection_var = create_4d_variable(ds_out, 'z_advection_term', output_settings)
 z_advection_var.units = 's^-2'
 z_advection_var.definition = 'Advection  Term of Vertical Vorticity Equation'
 
@@ -332,102 +366,77 @@ z_advection_var.definition = 'Advection  Term of Vertical Vorticity Equation'
 # Calculate terms of each component of the vorticity equation at each time step.
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-for time_index in range(model_time_steps):
-    # Timer
-    start = time.time()
+# Model times that are not in the output file yet (all of them unless adding
+#   to an existing file).
+completed_indices = completed_time_indices(time_var, dataset.variables['time'][:])
+calc_indices = [time_index for time_index in range(model_time_steps) if time_index not in completed_indices]
+print('Calculating {:d} of {:d} model time steps'.format(len(calc_indices), model_time_steps))
 
-    # Storing data in numpy arrays runs faster than accessing data directly from dataset.
-    # Note: extra index for staggered wind grid points are included here.
-    u_wind = np.copy(dataset.variables['u'][time_index,k1:k2,j1:j2,i1:i2+1])
-    v_wind = np.copy(dataset.variables['v'][time_index,k1:k2,j1:j2+1,i1:i2])
-    w_wind = np.copy(dataset.variables['w'][time_index,k1:k2+1,j1:j2,i1:i2])
-
-    # East-West Vorticity
-    x_vort = np.copy(dataset.variables['xvort'][time_index,k1:k2,j1:j2,i1:i2])
-    # North-South Vorticity
-    y_vort = np.copy(dataset.variables['yvort'][time_index,k1:k2,j1:j2,i1:i2])
-    # Vertical Vorticity
-    z_vort = np.copy(dataset.variables['zvort'][time_index,k1:k2,j1:j2,i1:i2])
+if tube == 'Y':
+    # Tiles are the chunks of the output variables (which may be from an
+    #   existing file in append mode).
+    trajectory_tube = Trajectory_tube(version_number, x_coord, y_coord, z_coord, tube_radius, x_stretch_term_var.chunking()[1:], time_length_requirement)
 
-    # Get density and pressure.
-    rho_perturb = np.copy(dataset.variables['rhopert'][time_index,k1:k2,j1:j2,i1:i2])
-    pressure_perturb = np.copy(dataset.variables['prspert'][time_index,k1:k2,j1:j2,i1:i2])
-    base_pressure = np.copy(dataset.variables['prs0'][time_index,k1:k2,j1:j2,i1:i2])
+    tube_tasks = [(time_index, trajectory_tube.tiles(time_index)) for time_index in calc_indices]
+    num_tube_points = np.sum([(x2-x1)*(y2-y1)*(z2-z1) for time_index, tiles in tube_tasks for x1, y1, z1, x2, y2, z2 in tiles])
+    print('Calculating {:.1f}% of the output points near the trajectories'.format(100.*num_tube_points/max((i2-i1)*(j2-j1)*(k2-k1)*len(calc_indices), 1)))
 
-    base_rho = (-1./gravity) * np.gradient(base_pressure, axis=0)/grad_dz[:,None,None]
+    # Each time step is calculated independently (in worker processes if
+    #   num_workers > 1), and the tiles are written here in time order.
+    time_step_pool = Time_step_pool(calc_tube_time_step, model_file_list, num_workers)
 
-    rho = base_rho + rho_perturb
-    pressure = base_pressure + pressure_perturb
+    start = time.time()
+    for (time_index, tiles), tile_terms in time_step_pool.map(tube_tasks, dataset):
+        for (x1, y1, z1, x2, y2, z2), terms in tile_terms:
+            for term_name in term_names:
+                ds_out.variables[term_name][time_index,z1:z2,y1:y2,x1:x2] = terms[term_name]
+
+        # Time variable output is done after all of the tiles, so a time in the
+        #   output file means that time step is complete.
+        time_var[time_index] = dataset.variables['time'][time_index]
+
+        stop = time.time()
+        print('Model time step {:d} ({:d} tiles) completed in {:.1f} seconds'.format(time_index, len(tiles), stop-start))
+        start = stop
+else:
+    # Each time step is calculated independently (in worker processes if
+    #   num_workers > 1), and the terms are written here in time order.
+    time_step_pool = Time_step_pool(calc_time_step, model_file_list, num_workers)
 
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Solenoid Terms
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    x_solenoid_term, y_solenoid_term, z_solenoid_term = calc_solenoid_terms(pressure, rho, grad_dx, grad_dy, grad_dz)
-
-    x_solenoid_term_var[time_index,:,:,:] = x_solenoid_term
-    y_solenoid_term_var[time_index,:,:,:] = y_solenoid_term
-    z_solenoid_term_var[time_index,:,:,:] = z_solenoid_term
-
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Advection Terms
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Average the nearest staggered wind values to get a value at the
-    #   unstaggered grid point.
-    avg_u = (u_wind[:,:,:-1] + u_wind[:,:,1:])/2.
-    avg_v = (v_wind[:,:-1,:] + v_wind[:,1:,:])/2.
-    avg_w = (w_wind[:-1,:,:] + w_wind[1:,:,:])/2.
-
-    x_advection_var[time_index,:,:,:] = calc_advection(x_vort, avg_u, avg_v, avg_w)
-    y_advection_var[time_index,:,:,:] = calc_advection(y_vort, avg_u, avg_v, avg_w)
-    z_advection_var[time_index,:,:,:] = calc_advection(z_vort, avg_u, avg_v, avg_w)
-
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Divergence/Stretching Terms
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Derivatives for the Divergence/Stretching Terms
-    du_dx = calc_du_dx(u_wind, stagger_x_coord)
-    dv_dy = calc_dv_dy(v_wind, stagger_y_coord)
-    
-    # North-South Horizontal Divergence/Stretching Term
-    #   xvort * du/dx
-    x_stretch_term_var[time_index,:,:,:] = x_vort * du_dx
-
-    # North-South Horizontal Divergence/Stretching Term
-    #   yvort * dv/dy
-    y_stretch_term_var[time_index,:,:,:] = y_vort * dv_dy
-
-    # Vertical Divergence/Stretching Term
-    #   -1 * zvort * (du/dx + dv/dy) or zvort * dw/dz
-    #   Using -(du/dx + dv/dy) = dw/dz, since dw/dz may be small in parts of
-    #   the domain
-    z_stretch_term_var[time_index,:,:,:] = -1. * z_vort * (du_dx + dv_dy)
-
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Tilting Terms
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Tilting Term for East-West Horizontal Vorticity
-    #   yvort*du/dy + zvort*du/dz
-    x_tilt_term = y_vort * calc_avg_du_dy(u_wind, grad_dy) + z_vort * calc_avg_du_dz(u_wind, grad_dz)
-    x_tilt_term_var[time_index,:,:,:] = x_tilt_term
-
-    # Tilting Term for North-South Horizontal Vorticity
-    #   xvort*dv/dx + zvort*dv/dz
-    y_tilt_term = x_vort * calc_avg_dv_dx(v_wind, grad_dx) + z_vort * calc_avg_dv_dz(v_wind, grad_dz)
-    y_tilt_term_var[time_index,:,:,:] = y_tilt_term
-
-    # Tilting Term for Vertical Vorticity
-    #   xvort*dw/dx + yvort*dw/dy
-    z_tilt_term = x_vort * calc_avg_dw_dx(w_wind, grad_dx) + y_vort * calc_avg_dw_dy(w_wind, grad_dy)
-    z_tilt_term_var[time_index,:,:,:] = z_tilt_term
-
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    # Total Vorticity Tendency
-    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-    #lagrangian_vort = div_term - tilt_term1 + tilt_term2 + solenoid_term
-    #eulerian_vort = advection + lagrangian_vort
-
-    stop = time.time()
-    print('Model time step {:d} completed in {:.1f} seconds'.format(time_index, stop-start))
+    # Timer
+    start = time.time()
+    for (time_index,), terms in time_step_pool.map([(time_index,) for time_index in calc_indices], dataset):
+        x_stretch_term_var[time_index,:,:,:] = terms['x_stretch_term']
+        y_stretch_term_var[time_index,:,:,:] = terms['y_stretch_term']
+        z_stretch_term_var[time_index,:,:,:] = terms['z_stretch_term']
+
+        x_tilt_term_var[time_index,:,:,:] = terms['x_tilt_term']
+        y_tilt_term_var[time_index,:,:,:] = terms['y_tilt_term']
+        z_tilt_term_var[time_index,:,:,:] = terms['z_tilt_term']
+
+        x_solenoid_term_var[time_index,:,:,:] = terms['x_solenoid_term']
+        y_solenoid_term_var[time_index,:,:,:] = terms['y_solenoid_term']
+        z_solenoid_term_var[time_index,:,:,:] = terms['z_solenoid_term']
+
+        x_advection_var[time_index,:,:,:] = terms['x_advection_term']
+        y_advection_var[time_index,:,:,:] = terms['y_advection_term']
+        z_advection_var[time_index,:,:,:] = terms['z_advection_term']
+
+        # Time variable output is done after all of the terms, so a time in the
+        #   output file means that time step is complete.
+        time_var[time_index] = dataset.variables['time'][time_index]
+
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Total Vorticity Tendency
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        #lagrangian_vort = div_term - tilt_term1 + tilt_term2 + solenoid_term
+        #eulerian_vort = advection + lagrangian_vort
+
+        stop = time.time()
+        print('Model time step {:d} completed in {:.1f} seconds'.format(time_index, stop-start))
+        start = stop
+
+time_step_pool.close()
 
 # Close netCDF files.
 ds_out.close()
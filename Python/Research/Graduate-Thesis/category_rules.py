@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   category_rules.py
+#
+# Purpose:  Compile the termination region and category parameters from
+#           trajectory_category_parameters.py into one set of rules, so that
+#           all of the categories can be evaluated together.  Each model field
+#           and level used by any of the thresholds is read and interpolated
+#           to the trajectories once (for all parcels and times), and each
+#           rule is evaluated once as a boolean mask over the parcels.  A
+#           trajectory is in a category if it meets every rule of the
+#           termination region and every rule of the category.
+#
+#           Position limits ([value, start %, end %]) compare the maximum or
+#           minimum position over that part of the trajectories.  Thresholds
+#           ([level, value, operator, 'all' or 'any']) must be met at all
+#           times or at any time; termination region thresholds ([level,
+#           value, operator]) and position limits are compared at the last
+#           time.  Interpolated values that are nan (outside of the grid)
+#           never meet a threshold.
+#
+# Syntax: from category_rules import Category_rules
+#         category_rules = Category_rules(end_point_dict, category_dict)
+#         samples = category_rules.sample_fields(ds, time_range, xpos, ypos, grid_coords)
+#         samples = category_rules.sample_fields(ds, time_range, xpos, ypos, grid_coords, sample_cache, traj_time_indices)
+#         end_point_masks, category_masks = category_rules.eval_masks(xpos, ypos, zpos, samples)
+#
+#   Input:
+#       end_point_dict: dictionary of termination region parameters
+#                       (termination_parameters())
+#       category_dict: dictionary of category parameters
+#                      (category_parameters())
+#       ds: open netCDF4 Dataset or MFDataset of the CM1 output files
+#       time_range: (start, end) model time indices in ds of the rows of the
+#                   positions
+#       xpos, ypos, zpos: (time, parcel) trajectory positions, in order of
+#                         increasing time
+#       grid_coords: dictionary of the 'x', 'y', 'x_stag', and 'y_stag'
+#                    model coordinates (m)
+#       sample_cache: Traj_sample_cache of the trajectories (optional)
+#       traj_time_indices: time index in sample_cache of each row of the
+#                          positions
+#
+# Execution Example:
+#   category_rules = Category_rules(termination_parameters(), category_parameters())
+#   samples = category_rules.sample_fields(ds, (t1, t2), xpos, ypos, grid_coords)
+#   end_point_masks, category_masks = category_rules.eval_masks(xpos, ypos, zpos, samples)
+#   forward_flank_indices = np.flatnonzero(end_point_masks['mesocyclone'] & category_masks['forward_flank'])
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to evaluate all trajectory categories
+#                               with one read of each model field.
+#   2026/10/17 - Lance Wilson:  Added optional Traj_sample_cache for the
+#                               samples.
+#
+
+from grid_interp import Grid_weights
+from traj_sample_cache import sample_name
+
+import numpy as np
+import operator
+import sys
+
+# Dictionary storing mathmatical operators from the operator module so that
+#   operators can be determined on a case-by-case basis.
+# Examples: ops['<'](a,b) is equivalent to: operator.lt(a,b); a < b
+ops =  {'<=' : operator.le,
+        '>=' : operator.ge,
+        '<'  : operator.lt,
+        '>'  : operator.gt,
+    }
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Names of the coordinates of a model field in grid_coords (the winds are on
+#   staggered grids).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def field_grid(model_field):
+    return ('y_stag' if model_field == 'v' else 'y', 'x_stag' if model_field == 'u' else 'x')
+
+class Category_rules:
+    def __init__(self, end_point_dict, category_dict):
+        # List of rules for each termination region and category.  Rules are
+        #   tuples (which can be used as dictionary keys), so that rules used
+        #   by more than one termination region or category are only evaluated
+        #   once:
+        #   ('position', axis, 'max' or 'min', value, start %, end %)
+        #   ('threshold', model field, model level, operator, value, 'all',
+        #    'any', or 'end')
+        self.end_point_rules = {key: self.compile_params(params, 'end') for key, params in end_point_dict.items()}
+        self.category_rules = {key: self.compile_params(params, None) for key, params in category_dict.items()}
+
+        # (model field, model level) of each threshold, without duplicates.
+        all_rules = [rule for rules in list(self.end_point_rules.values()) + list(self.category_rules.values()) for rule in rules]
+        self.sample_keys = sorted(set([(rule[1], rule[2]) for rule in all_rules if rule[0] == 'threshold']))
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Convert the parameters of one termination region or category to a list
+    #   of rules.  Parameters that are None are skipped.  Thresholds without a
+    #   time domain use default_domain.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def compile_params(self, params, default_domain):
+        rules = []
+        for key in [key for key in params.keys() if params[key]]:
+            if key == 'thresholds':
+                for model_field, threshold in params[key].items():
+                    domain_required = threshold[3] if len(threshold) > 3 else default_domain
+                    if threshold[2] not in ops or domain_required not in ('all', 'any', 'end'):
+                        print('Threshold for {:s} is not valid: {:s}'.format(model_field, str(threshold)))
+                        sys.exit()
+                    rules.append(('threshold', model_field, threshold[0], threshold[2], threshold[1], domain_required))
+
+            elif key[0] in ('x', 'y', 'z') and key[1:] in ('max', 'min'):
+                # Termination region limits are a single value at the last time.
+                if np.ndim(params[key]) == 0:
+                    rules.append(('position', key[0], key[1:], params[key], None, None))
+                else:
+                    rules.append(('position', key[0], key[1:], params[key][0], params[key][1], params[key][2]))
+
+            else:
+                print('Category parameter {:s} is not valid.'.format(key))
+                sys.exit()
+
+        return rules
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolate each model field and level needed by the thresholds to the
+    #   trajectories at each time.  Each field is read once at each time, and
+    #   the interpolation weights at each time are shared by the fields on the
+    #   same grid.  If a Traj_sample_cache is given, samples in the cache are
+    #   used instead of reading the model data (traj_time_indices are the
+    #   time indices in the cache of each row of the positions).  Returns a
+    #   dictionary of (time, parcel) arrays with (model field, model level)
+    #   keys.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def sample_fields(self, ds, time_range, xpos, ypos, grid_coords, sample_cache=None, traj_time_indices=None):
+        t1, t2 = time_range
+
+        # Grid_weights for each (time, grid) pair.
+        weights = {}
+
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Interpolate one field at one level to the positions in some rows.
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        def sample_rows(model_field, model_level, rows):
+            grid_names = field_grid(model_field)
+
+            values = np.zeros((len(rows), np.shape(xpos)[1]))
+            for row_num, row in enumerate(rows):
+                if (row, grid_names) not in weights:
+                    grid_coord_2D = (grid_coords[grid_names[0]], grid_coords[grid_names[1]])
+                    weights[(row, grid_names)] = Grid_weights(grid_coord_2D, np.column_stack((ypos[row], xpos[row])))
+
+                variable = np.copy(ds.variables[model_field][t1+row,model_level,:,:])
+                values[row_num] = weights[(row, grid_names)].interp(variable)
+
+            return values
+
+        samples = {}
+        for model_field, model_level in self.sample_keys:
+            if sample_cache is None:
+                samples[(model_field, model_level)] = sample_rows(model_field, model_level, range(t2 - t1))
+            else:
+                samples[(model_field, model_level)] = sample_cache.get(sample_name(model_field, model_level), traj_time_indices, range(t1, t2),
+                                                                       lambda rows: sample_rows(model_field, model_level, rows))
+
+        return samples
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Evaluate one rule.  Returns a boolean array that is True for each
+    #   parcel that meets the rule.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def eval_rule(self, rule, positions, samples):
+        if rule[0] == 'position':
+            axis, limit_type, limit, start_percent, end_percent = rule[1:]
+            compare = operator.le if limit_type == 'max' else operator.ge
+
+            # Termination region limits.
+            if start_percent is None:
+                return compare(positions[axis][-1], limit)
+
+            # First and last index of data to collect (based on percentage of
+            #   data).
+            time_num = np.shape(positions[axis])[0]
+            start_time_limit_index = int(time_num * start_percent / 100.)
+            end_time_limit_index = int(time_num * end_percent / 100.)
+            traj_points = positions[axis][start_time_limit_index:end_time_limit_index]
+
+            if limit_type == 'max':
+                return compare(np.max(traj_points, axis=0), limit)
+            return compare(np.min(traj_points, axis=0), limit)
+
+        model_field, model_level, operator_name, field_value, domain_required = rule[1:]
+        values = samples[(model_field, model_level)]
+
+        if domain_required == 'end':
+            return ops[operator_name](values[-1], field_value)
+        if domain_required == 'all':
+            return np.all(ops[operator_name](values, field_value), axis=0)
+        return np.any(ops[operator_name](values, field_value), axis=0)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Evaluate the rules of every termination region and category.  Returns
+    #   dictionaries of boolean parcel masks for the termination regions and
+    #   for the categories (combine with & to get the trajectories that end in
+    #   a termination region and are in a category).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def eval_masks(self, xpos, ypos, zpos, samples):
+        positions = {'x': xpos, 'y': ypos, 'z': zpos}
+        parcel_num = np.shape(xpos)[1]
+
+        rule_masks = {}
+        def combine_rules(rules):
+            mask = np.ones((parcel_num), dtype=bool)
+            for rule in rules:
+                if rule not in rule_masks:
+                    rule_masks[rule] = self.eval_rule(rule, positions, samples)
+                mask &= rule_masks[rule]
+            return mask
+
+        end_point_masks = {key: combine_rules(rules) for key, rules in self.end_point_rules.items()}
+        category_masks = {key: combine_rules(rules) for key, rules in self.category_rules.items()}
+
+        return end_point_masks, category_masks
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   grid_interp.py
+#
+# Purpose:  Linear interpolation of data on a regular (rectilinear) grid to a
+#           set of points, where the grid cell indices and the fractional
+#           weights of each point are calculated once and can then be applied
+#           to any number of variables on the same grid.  Gives the same
+#           result as scipy's interpolate.interpn(method='linear',
+#           bounds_error=False, fill_value=np.nan).
+#
+# Syntax: from grid_interp import Grid_weights, Wind_interp, interpn_linear
+#         weights = Grid_weights(grid_coord, traj_points)
+#         values = weights.interp(variable)
+#
+#         wind_interp = Wind_interp(x, y, z, x_stag, y_stag, z_stag)
+#         wind_interp.set_positions(xpos, ypos, zpos)
+#         u_traj, v_traj, w_traj = wind_interp.interp_winds(u, v, w)
+#
+# Execution Example:
+#   from grid_interp import Grid_weights
+#   weights = Grid_weights((z_coord, y_coord, x_coord), np.column_stack((zpos, ypos, xpos)))
+#   xvort_traj = weights.interp(xvort)
+#   zvort_traj = weights.interp(zvort)
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to replace repeated calls to
+#                               interpolate.interpn on the same set of points.
+#   2026/10/17 - Lance Wilson:  Added interp_stencils for data gathered around
+#                               each point.
+#
+
+import itertools
+import numpy as np
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Calculate the index of the grid point below each position and the fractional
+#   distance of the position between that grid point and the next one.
+#   Arguments:
+#       coord: locations of model grid points (must be increasing)
+#       positions: locations of the points to be interpolated to
+#   Returns:
+#       index: index of the grid point at or below each position
+#       weight: fractional distance from coord[index] to coord[index+1]
+#       valid: False where the position is outside the grid (or is nan)
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_axis_weights(coord, positions):
+    coord = np.asarray(coord, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64)
+
+    # Same search as interpn: the cell to the left of the position, limited
+    #   so that positions on the upper boundary use the last cell.
+    index = np.searchsorted(coord, positions) - 1
+    index = np.clip(index, 0, coord.size - 2)
+
+    weight = (positions - coord[index]) / (coord[index+1] - coord[index])
+
+    # Comparisons with nan are False, so nan positions are also invalid.
+    valid = np.logical_and(positions >= coord[0], positions <= coord[-1])
+
+    # Keep weights finite for invalid points (their values are replaced with
+    #   the fill value after interpolating).
+    weight[~valid] = 0.
+
+    return index, weight, valid
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Cell indices and weights of a set of points on a regular grid.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Grid_weights:
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # grid_coord: tuple of the coordinates of each grid dimension, in the same
+    #             order as the dimensions of the variables (e.g. (z,y,x)).
+    # points: array of shape (number of points, number of dimensions), or a
+    #         list of precalculated calc_axis_weights results (one per axis).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def __init__(self, grid_coord, points=None, axis_weights=None):
+        if axis_weights is None:
+            points = np.asarray(points)
+            axis_weights = [calc_axis_weights(coord, points[:,dim]) for dim, coord in enumerate(grid_coord)]
+
+        self.axis_weights = axis_weights
+        self.indices = [index for index, weight, valid in axis_weights]
+        self.num_points = self.indices[0].size
+
+        # Points outside of any dimension of the grid get the fill value.
+        self.valid = np.logical_and.reduce([valid for index, weight, valid in axis_weights])
+
+        # Index and weight of each corner of the grid cell surrounding the
+        #   points (8 corners for a 3D grid).
+        self.corners = []
+        for offsets in itertools.product((0,1), repeat=len(axis_weights)):
+            corner_index = tuple(index + offset for (index, weight, valid), offset in zip(axis_weights, offsets))
+
+            corner_weight = np.ones((self.num_points))
+            for (index, weight, valid), offset in zip(axis_weights, offsets):
+                corner_weight = corner_weight * (weight if offset else 1. - weight)
+
+            self.corners.append((corner_index, corner_weight))
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolate a variable on the grid to the points.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def interp(self, variable, fill_value=np.nan):
+        values = np.zeros((self.num_points))
+        for corner_index, corner_weight in self.corners:
+            values += corner_weight * variable[corner_index]
+
+        values[~self.valid] = fill_value
+
+        return values
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolate from a separate block of grid points around each point
+    #   (shape (number of points, ...)), where the indices in axis_weights
+    #   are relative to the start of each block.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def interp_stencils(self, stencils, fill_value=np.nan):
+        point_index = np.arange(self.num_points)
+
+        values = np.zeros((self.num_points))
+        for corner_index, corner_weight in self.corners:
+            values += corner_weight * stencils[(point_index,) + corner_index]
+
+        values[~self.valid] = fill_value
+
+        return values
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Drop-in replacement for:
+#   interpolate.interpn(grid_coord, variable, points, method='linear',
+#                       bounds_error=False, fill_value=np.nan)
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def interpn_linear(grid_coord, variable, points, fill_value=np.nan):
+    return Grid_weights(grid_coord, points).interp(variable, fill_value)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Interpolate CM1 winds on the staggered grid to parcel positions.
+#   u is on the (z, y, x_stag) grid, v is on the (z, y_stag, x) grid, and w is
+#   on the (z_stag, y, x) grid, so the weights along each of the six
+#   coordinate arrays are calculated once and shared between the winds.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Wind_interp:
+    def __init__(self, x, y, z, x_stag, y_stag, z_stag):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.x_stag = x_stag
+        self.y_stag = y_stag
+        self.z_stag = z_stag
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Calculate the weights for a new set of parcel positions.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def set_positions(self, xpos, ypos, zpos):
+        x_weights = calc_axis_weights(self.x, xpos)
+        y_weights = calc_axis_weights(self.y, ypos)
+        z_weights = calc_axis_weights(self.z, zpos)
+
+        # Reuse the unstaggered weights if the winds are not staggered.
+        x_stag_weights = x_weights if self.x_stag is self.x else calc_axis_weights(self.x_stag, xpos)
+        y_stag_weights = y_weights if self.y_stag is self.y else calc_axis_weights(self.y_stag, ypos)
+        z_stag_weights = z_weights if self.z_stag is self.z else calc_axis_weights(self.z_stag, zpos)
+
+        self.u_weights = Grid_weights(None, axis_weights=[z_weights, y_weights, x_stag_weights])
+        self.v_weights = Grid_weights(None, axis_weights=[z_weights, y_stag_weights, x_weights])
+        self.w_weights = Grid_weights(None, axis_weights=[z_stag_weights, y_weights, x_weights])
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolate the three wind components to the current parcel positions.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def interp_winds(self, u, v, w):
+        return (self.u_weights.interp(u), self.v_weights.interp(v), self.w_weights.interp(w))
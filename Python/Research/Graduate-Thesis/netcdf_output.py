@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   netcdf_output.py
+#
+# Purpose:  Create the 4D (time, nk, nj, ni) variables in the vorticity
+#           equation and vorticity budget output files with chunking and
+#           compression.  By default each chunk is one full 3D time step (the
+#           way the files are read when interpolating to parcels), compressed
+#           with zlib after the shuffle filter.
+#
+#           Also has the checks used to add time steps to an existing output
+#           file (append mode).
+#
+# Syntax: from netcdf_output import Output_settings, create_4d_variable
+#         output_settings = Output_settings()
+#         output_settings.set_option(option)
+#         var = create_4d_variable(ds_out, var_name, output_settings)
+#
+#         mark_time_written_per_step(ds_out)
+#
+#         check_time_written_per_step(ds_out)
+#         check_output_domain(ds_out, x_coord, y_coord, z_coord)
+#         completed_indices = completed_time_indices(time_var, model_times)
+#
+#   Command-line options read by Output_settings.set_option:
+#       compress=Y|N: zlib compression (default Y)
+#       complevel: zlib compression level from 1 to 9 (default 4)
+#       shuffle=Y|N: shuffle filter before compression (default Y)
+#       chunks=nt,nk,nj,ni: chunk shape (default 1 time x full 3D domain);
+#                           sizes larger than the domain are limited to the
+#                           domain size
+#       digits: least significant digit kept (decimal places) for every
+#               variable (default lossless); see significant_digits for
+#               setting this per variable
+#
+# Execution Example:
+#   output_settings = Output_settings(significant_digits={'x_advection_term': 9})
+#   output_settings.set_option('complevel=6')
+#   x_advection_var = create_4d_variable(ds_out, 'x_advection_term', output_settings)
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to compress the output of
+#                               calc_vort_equation.py and calc_vort_budget.py.
+#   2026/10/17 - Lance Wilson:  Added functions for appending to existing
+#                               output files.
+#   2026/10/17 - Lance Wilson:  Added fill_value setting for output files that
+#                               are only written near the trajectories.
+#   2026/10/17 - Lance Wilson:  Only append to output files that write the
+#                               time of each time step after its variables.
+#
+
+import numpy as np
+import sys
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Chunking and compression settings for the 4D output variables.
+#   significant_digits: dictionary of least significant digit for individual
+#                       variables (overrides the digits option)
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class Output_settings:
+    def __init__(self, significant_digits=None):
+        self.compress = 'Y'
+        self.complevel = 4
+        self.shuffle = 'Y'
+        # None uses one time step of the full 3D domain.
+        self.chunk_shape = None
+        self.digits = None
+        # None uses the default netCDF fill value for points that are never
+        #   written.
+        self.fill_value = None
+        self.significant_digits = {} if significant_digits is None else significant_digits
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Set a value from a key=value command-line option.  Returns True if the
+    #   option is an output setting.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def set_option(self, option):
+        if option.startswith('compress='):
+            self.compress = option.split('=')[-1].upper()
+        elif option.startswith('complevel='):
+            self.complevel = int(option.split('=')[-1])
+        elif option.startswith('shuffle='):
+            self.shuffle = option.split('=')[-1].upper()
+        elif option.startswith('chunks='):
+            self.chunk_shape = tuple([int(size) for size in option.split('=')[-1].split(',')])
+            if len(self.chunk_shape) != 4:
+                print('Chunk shape must have 4 sizes (time,nk,nj,ni): {:s}'.format(option))
+                sys.exit()
+        elif option.startswith('digits='):
+            self.digits = int(option.split('=')[-1])
+        else:
+            return False
+        return True
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Chunk shape for a (time, nk, nj, ni) variable in ds_out.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def chunk_sizes(self, ds_out):
+        domain_shape = [len(ds_out.dimensions[dim_name]) for dim_name in ('nk', 'nj', 'ni')]
+        if self.chunk_shape is None:
+            return [1] + domain_shape
+
+        return [max(self.chunk_shape[0], 1)] + [max(min(size, dim_size), 1) for size, dim_size in zip(self.chunk_shape[1:], domain_shape)]
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Create a float32 (time, nk, nj, ni) variable using the output settings.
+#   If the variable is already in the file (append mode), the existing
+#   variable is returned.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def create_4d_variable(ds_out, var_name, output_settings):
+    if var_name in ds_out.variables:
+        return ds_out.variables[var_name]
+
+    digits = output_settings.significant_digits.get(var_name, output_settings.digits)
+
+    return ds_out.createVariable(var_name, np.float32, ('time','nk','nj','ni'),
+                                 zlib=(output_settings.compress == 'Y'),
+                                 complevel=output_settings.complevel,
+                                 shuffle=(output_settings.shuffle == 'Y'),
+                                 chunksizes=output_settings.chunk_sizes(ds_out),
+                                 least_significant_digit=digits,
+                                 fill_value=output_settings.fill_value)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Mark a new output file as writing the time of each time step after all of
+#   its variables (needed by completed_time_indices in append mode).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def mark_time_written_per_step(ds_out):
+    ds_out.time_written_per_step = 1
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Check that an existing output file writes the time of each time step after
+#   its variables.  Older output files wrote all of the times before
+#   calculating any variables, so the written times do not show which time
+#   steps are complete.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def check_time_written_per_step(ds_out):
+    if getattr(ds_out, 'time_written_per_step', 0) != 1:
+        print('The existing output file was created by an older version of this program, so the completed time steps cannot be determined.')
+        print('Remove the output file or run without append=Y to create a new one.')
+        sys.exit()
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Check that an existing output file covers the same grid points as the
+#   current domain (coordinates in meters), so that new time steps can be
+#   added to it.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def check_output_domain(ds_out, x_coord, y_coord, z_coord):
+    for coord_name, coord in [('xh', x_coord), ('yh', y_coord), ('z', z_coord)]:
+        if not np.array_equal(np.asarray(ds_out.variables[coord_name][:]), np.asarray(coord, dtype=np.float32)):
+            print('The {:s} coordinates in the existing output file do not match the current domain.'.format(coord_name))
+            print('Remove the output file or run without append=Y to create a new one.')
+            sys.exit()
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Time indices that are already complete in an output file.  The time value
+#   of a time step is written after all of its variables, so a time step is
+#   complete if its time has been written.
+#   time_var: time variable of the output file
+#   model_times: times of the model output files
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def completed_time_indices(time_var, model_times):
+    output_times = np.ma.masked_invalid(time_var[:])
+    model_times = np.asarray(model_times, dtype=np.float32)
+
+    completed_indices = []
+    for time_index, output_time in enumerate(output_times):
+        if output_time is np.ma.masked:
+            continue
+        if time_index >= model_times.size or output_time != model_times[time_index]:
+            print('Time {:.1f} at index {:d} of the existing output file does not match the model files.'.format(output_time, time_index))
+            print('Remove the output file or run without append=Y to create a new one.')
+            sys.exit()
+        completed_indices.append(time_index)
+
+    return completed_indices
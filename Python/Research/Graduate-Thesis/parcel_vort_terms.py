@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   parcel_vort_terms.py
+#
+# Purpose:  Calculate the terms of the vorticity equation (stretching,
+#           tilting, solenoid, and advection) directly at parcel positions
+#           from the CM1 output, without writing the terms for the whole
+#           domain to a file first (calc_vort_equation.py) and interpolating
+#           them to the parcels.
+#
+#           For each parcel, a block of 6x4x4 (z, y, x) scalar grid points
+#           (one more point along the staggered axis of each wind) around the
+#           grid cell containing the parcel is gathered from the model data.
+#           The terms are calculated for all of the blocks at once
+#           (vort_derivatives.py), and the values at the 8 corners of the grid
+#           cell are linearly interpolated to the parcel.  The corners are
+#           inside of each block, so their derivatives are the same as for the
+#           full domain, and the result is the same as interpolating the
+#           output of calc_vort_equation.py (away from the edges of its
+#           subdomain).
+#
+# Syntax: from parcel_vort_terms import Parcel_vort_terms
+#         parcel_vort_terms = Parcel_vort_terms(dataset)
+#         terms = parcel_vort_terms.calc_terms(time_index, xpos, ypos, zpos)
+#
+#   Input:
+#       dataset: open netCDF4 Dataset or MFDataset of the CM1 output files
+#       time_index: model time index in dataset
+#       xpos, ypos, zpos: parcel positions (m)
+#
+# Execution Example:
+#   parcel_vort_terms = Parcel_vort_terms(MFDataset(model_file_list))
+#   terms = parcel_vort_terms.calc_terms(model_time_step, xpos[parcel_time_step], ypos[parcel_time_step], zpos[parcel_time_step])
+#   x_tilt_traj = terms['x_tilt_term']
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to calculate the vorticity equation
+#                               terms at back trajectory positions.
+#
+
+from grid_interp import Grid_weights, calc_axis_weights
+from vort_derivatives import Vort_derivatives, term_names
+
+import numpy as np
+
+# Definitions of the terms (the same as in the output of
+#   calc_vort_equation.py).
+term_definitions = {'x_stretch_term': 'Stretching Term of East-West Horizontal Vorticity Equation',
+                    'y_stretch_term': 'Stretching Term of North-South Horizontal Vorticity Equation',
+                    'z_stretch_term': 'Stretching Term of Vertical Vorticity Equation',
+                    'x_tilt_term': 'Tilting Term of East-West Horizontal Vorticity Equation',
+                    'y_tilt_term': 'Tilting Term of North-South Horizontal Vorticity Equation',
+                    'z_tilt_term': 'Tilting Term of Vertical Vorticity Equation',
+                    'x_solenoid_term': 'Solenoid (Baroclinic Generation) Term of East-West Horizontal Vorticity Equation',
+                    'y_solenoid_term': 'Solenoid (Baroclinic Generation) Term of North-South Horizontal Vorticity Equation',
+                    'z_solenoid_term': 'Solenoid (Baroclinic Generation) Term of Vertical Vorticity Equation',
+                    'x_advection_term': 'Advection  Term of East-West Horizontal Vorticity Equation',
+                    'y_advection_term': 'Advection  Term of North-South Horizontal Vorticity Equation',
+                    'z_advection_term': 'Advection  Term of Vertical Vorticity Equation'}
+
+# Number of scalar grid points in the (z, y, x) directions of the block
+#   around each parcel, and the number of those points below the grid cell
+#   containing the parcel.  One point on each side of the 2 corner points is
+#   needed for the centered differences, and two in the vertical because the
+#   vertical derivative of the density uses the density at the points above
+#   and below, which is calculated from the vertical derivative of the base
+#   state pressure.
+stencil_shape = (6, 4, 4)
+stencil_below = (2, 1, 1)
+
+class Parcel_vort_terms:
+    def __init__(self, dataset, gravity=9.80665):
+        self.dataset = dataset
+        self.gravity = gravity
+
+        # Get staggered coordinates for the wind data, converted to meters.
+        self.stagger_x_coord = np.copy(dataset.variables['xf'])*1000.
+        self.stagger_y_coord = np.copy(dataset.variables['yf'])*1000.
+        # Get unstaggered coordinates for thermodynamic variables, converted to meters.
+        self.x_coord = np.copy(dataset.variables['xh'])*1000.
+        self.y_coord = np.copy(dataset.variables['yh'])*1000.
+        self.z_coord = np.copy(dataset.variables['z'])*1000.
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Gather a block of points starting at (k_start, j_start, i_start) for
+    #   each parcel from an array read from the subdomain starting at
+    #   box_start, with extra points along the staggered axis (if any).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def gather_stencils(self, variable, starts, box_start, stag_axis=None):
+        block_index = []
+        for axis, (start, box_offset) in enumerate(zip(starts, box_start)):
+            size = stencil_shape[axis] + 1 if axis == stag_axis else stencil_shape[axis]
+            axis_index = (start - box_offset)[:,None] + np.arange(size)
+            # Shape each index to broadcast along its own axis of the block.
+            block_index.append(axis_index.reshape((-1,) + tuple(size if dim == axis else 1 for dim in range(3))))
+
+        return variable[tuple(block_index)]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Calculate the vorticity equation terms at the parcel positions at one
+    #   model time.  Returns a dictionary of the values of each term (nan for
+    #   parcels outside of the model domain or with nan positions).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def calc_terms(self, time_index, xpos, ypos, zpos):
+        coords = (self.z_coord, self.y_coord, self.x_coord)
+        axis_weights = [calc_axis_weights(coord, positions) for coord, positions in zip(coords, (zpos, ypos, xpos))]
+        valid = np.logical_and.reduce([axis_valid for index, weight, axis_valid in axis_weights])
+
+        parcel_terms = {term_name: np.full(np.shape(xpos), np.nan) for term_name in term_names}
+        if not np.any(valid):
+            return parcel_terms
+
+        # First grid point of the block around each valid parcel, moved inside
+        #   of the model domain at the edges (where the derivatives at the
+        #   corners are one-sided in the full domain too).
+        starts = [np.clip(index[valid] - below, 0, coord.size - size)
+                  for (index, weight, axis_valid), coord, size, below in zip(axis_weights, coords, stencil_shape, stencil_below)]
+        k_start, j_start, i_start = starts
+
+        # Read the subdomain containing all of the blocks once.
+        k1, j1, i1 = [int(np.min(start)) for start in starts]
+        k2, j2, i2 = [int(np.max(start)) + size for start, size in zip(starts, stencil_shape)]
+        box_start = (k1, j1, i1)
+
+        dataset = self.dataset
+        u_wind = np.copy(dataset.variables['u'][time_index,k1:k2,j1:j2,i1:i2+1])
+        v_wind = np.copy(dataset.variables['v'][time_index,k1:k2,j1:j2+1,i1:i2])
+        w_wind = np.copy(dataset.variables['w'][time_index,k1:k2+1,j1:j2,i1:i2])
+
+        x_vort = np.copy(dataset.variables['xvort'][time_index,k1:k2,j1:j2,i1:i2])
+        y_vort = np.copy(dataset.variables['yvort'][time_index,k1:k2,j1:j2,i1:i2])
+        z_vort = np.copy(dataset.variables['zvort'][time_index,k1:k2,j1:j2,i1:i2])
+
+        rho_perturb = np.copy(dataset.variables['rhopert'][time_index,k1:k2,j1:j2,i1:i2])
+        pressure_perturb = np.copy(dataset.variables['prspert'][time_index,k1:k2,j1:j2,i1:i2])
+        base_pressure = np.copy(dataset.variables['prs0'][time_index,k1:k2,j1:j2,i1:i2])
+
+        # Coordinates of each block, with shape (number of parcels, points).
+        nk, nj, ni = stencil_shape
+        vort_derivatives = Vort_derivatives(self.x_coord[i_start[:,None] + np.arange(ni)],
+                                            self.y_coord[j_start[:,None] + np.arange(nj)],
+                                            self.z_coord[k_start[:,None] + np.arange(nk)],
+                                            self.stagger_x_coord[i_start[:,None] + np.arange(ni + 1)],
+                                            self.stagger_y_coord[j_start[:,None] + np.arange(nj + 1)])
+
+        base_pressure = self.gather_stencils(base_pressure, starts, box_start)
+        rho = vort_derivatives.calc_density(base_pressure, self.gather_stencils(rho_perturb, starts, box_start), self.gravity)
+        pressure = base_pressure + self.gather_stencils(pressure_perturb, starts, box_start)
+
+        terms = vort_derivatives.calc_terms(self.gather_stencils(u_wind, starts, box_start, 2),
+                                            self.gather_stencils(v_wind, starts, box_start, 1),
+                                            self.gather_stencils(w_wind, starts, box_start, 0),
+                                            self.gather_stencils(x_vort, starts, box_start),
+                                            self.gather_stencils(y_vort, starts, box_start),
+                                            self.gather_stencils(z_vort, starts, box_start),
+                                            pressure, rho)
+
+        # Interpolate from the corners of the grid cell in each block.
+        weights = Grid_weights(None, axis_weights=[(index[valid] - start, weight[valid], axis_valid[valid])
+                                                   for (index, weight, axis_valid), start in zip(axis_weights, starts)])
+        for term_name in term_names:
+            parcel_terms[term_name][valid] = weights.interp_stencils(terms[term_name])
+
+        return parcel_terms
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   prog_vort_integration.py
+#
+# Purpose:  Calculate "prognostic" vorticity along trajectories by
+#           integrating the sum of the vorticity tendencies from an initial
+#           vorticity, for all time steps and parcels at once:
+#                   zeta_t_n = zeta_t_(n-1) + sum(tend) * delta_t
+#
+#           The tendency used for each time step is the one at the start of
+#           the time step ('left'), the end of the time step ('right'), or the
+#           mean of the two ('trapezoid').  Times with nan tendencies (e.g.
+#           the nan padding of partially valid back trajectories) make the
+#           prognostic vorticity nan from that time on, the same as adding
+#           the tendencies one time step at a time.
+#
+# Syntax: from prog_vort_integration import sum_tendencies, integrate_tendencies
+#         tend_sum = sum_tendencies(traj_ds, budget_var_names, parcel_ids, time_range)
+#         prog_vort = integrate_tendencies(initial_vort, tend_sum, time_step_lengths, direction, method)
+#
+#   Input:
+#       traj_ds: Back_traj_ds or Forward_traj_ds object
+#       budget_var_names: list of the tendency variables to add together
+#       parcel_ids: parcel numbers to use (None for all parcels)
+#       time_range: (start, end) time indices to use (None for all times)
+#       initial_vort: vorticity at the earliest time (one value for each
+#                     parcel)
+#       tend_sum: (time, parcel) sum of the vorticity tendencies
+#       time_step_lengths: length (s) of the time step between each time of
+#                          tend_sum and the next (only the first
+#                          len(tend_sum)-1 are used)
+#       direction: order of the times in tend_sum and time_step_lengths
+#                  ('forward' for increasing time, 'backward' for decreasing
+#                  time, as in the back trajectory files)
+#       method: 'left', 'right', or 'trapezoid'
+#
+# Execution Example:
+#   tend_sum = sum_tendencies(ds_obj, ['x_tilt_term', 'x_stretch_term'], plot_indices, (0, plot_limit+1))
+#   prog_vort = integrate_tendencies(initial_vort, tend_sum, time_step_lengths, 'backward', 'left')
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to replace the time step loops in
+#                               compare_back_traj_prog_vort.py and
+#                               calc_mean_forward_trajectories.py.
+#
+
+import numpy as np
+import sys
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Sum of a set of vorticity tendencies for a set of parcels and times.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def sum_tendencies(traj_ds, budget_var_names, parcel_ids=None, time_range=None):
+    t1, t2 = (0, traj_ds.parcel_time_step_num) if time_range is None else time_range
+    parcel_num = traj_ds.total_parcel_num if parcel_ids is None else len(parcel_ids)
+
+    tend_sum = np.zeros((len(range(traj_ds.parcel_time_step_num)[t1:t2]), parcel_num))
+    for budget_var in budget_var_names:
+        tend_sum += traj_ds.getParcelData(budget_var, parcel_ids, time_range)
+
+    return tend_sum
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Integrate the summed tendencies from the initial vorticity.  Returns the
+#   prognostic vorticity at each time, in order of increasing time (the first
+#   time is the initial vorticity).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def integrate_tendencies(initial_vort, tend_sum, time_step_lengths, direction='forward', method='right'):
+    tend_sum = np.asarray(tend_sum, dtype=float)
+    time_step_lengths = np.asarray(time_step_lengths, dtype=float)[:len(tend_sum)-1]
+
+    # Put the times in increasing order.
+    if direction == 'backward':
+        tend_sum = tend_sum[::-1]
+        time_step_lengths = time_step_lengths[::-1]
+    elif direction != 'forward':
+        print('Integration direction must be \'forward\' or \'backward\'.')
+        sys.exit()
+
+    if method == 'left':
+        step_tend = tend_sum[:-1]
+    elif method == 'right':
+        step_tend = tend_sum[1:]
+    elif method == 'trapezoid':
+        step_tend = 0.5 * (tend_sum[:-1] + tend_sum[1:])
+    else:
+        print('Integration method must be \'left\', \'right\', or \'trapezoid\'.')
+        sys.exit()
+
+    # Change in vorticity over each time step, after the initial vorticity.
+    prog_vort = np.empty(tend_sum.shape)
+    prog_vort[0] = initial_vort
+    prog_vort[1:] = step_tend * time_step_lengths.reshape((-1,) + (1,) * (tend_sum.ndim - 1))
+
+    return np.cumsum(prog_vort, axis=0)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   stencil_reader.py
+#
+# Purpose:  Read only the parts of a 3D netCDF variable that are needed to
+#           linearly interpolate it to a set of points (the corners of the
+#           grid cell around each point), instead of the full 3D field.  The
+#           needed grid points are grouped into blocks, and blocks that are
+#           next to each other in the x direction are read together as one
+#           hyperslab.  The data is read into a buffer with the shape of the
+#           full grid that is reused for every read, so the result can be
+#           passed to Grid_weights.interp in the same way as the full field.
+#
+#           sample_trajectories uses this to interpolate variables to a set of
+#           trajectories at each of a list of model times, with one set of
+#           weights and one read of each variable per time.
+#
+# Syntax: from stencil_reader import Stencil_reader, sample_trajectories
+#         stencil_reader = Stencil_reader(grid_shape)
+#         stencil_reader.set_points(weights)
+#         variable = stencil_reader.read(ds.variables[var_name], time_index)
+#
+#         samples = sample_trajectories(ds, var_names, grid_coord, time_indices, xpos, ypos, zpos)
+#
+#   Input:
+#       grid_shape: (nk, nj, ni) shape of the variables
+#       block_shape: (nk, nj, ni) shape of the blocks that the grid is divided
+#                    into (default 16 x 16 x 16)
+#       full_read_fraction: fraction of the grid above which the whole
+#                           variable is read in one call (default 0.5)
+#       weights: Grid_weights of the points
+#       var_names: list of variables to interpolate
+#       grid_coord: (z, y, x) coordinates of the variables
+#       time_indices: model time index in ds of each row of the positions
+#       xpos, ypos, zpos: (time, parcel) trajectory positions
+#
+# Execution Example:
+#   stencil_reader = Stencil_reader((len(z_coord), len(y_coord), len(x_coord)))
+#   weights = Grid_weights(grid_coord, traj_points)
+#   stencil_reader.set_points(weights)
+#   xvort_traj = weights.interp(stencil_reader.read(ds_in.variables['xvort'], model_time_step))
+#
+#   samples = sample_trajectories(ds, ['xvort', 'yvort', 'zvort'], (z_coord, y_coord, x_coord), range(10), xpos, ypos, zpos)
+#   xvort_traj = samples['xvort']
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to reduce the amount of data read when
+#                               interpolating to trajectories.
+#   2026/10/17 - Lance Wilson:  Added sample_trajectories.
+#
+
+from grid_interp import Grid_weights
+
+import numpy as np
+
+class Stencil_reader:
+    def __init__(self, grid_shape, block_shape=(16, 16, 16), full_read_fraction=0.5):
+        self.grid_shape = tuple(grid_shape)
+        self.block_shape = tuple([max(min(size, dim_size), 1) for size, dim_size in zip(block_shape, self.grid_shape)])
+        self.full_read_fraction = full_read_fraction
+
+        # Buffer with the shape of the full grid (allocated by the first read).
+        #   Points that are not read keep their previous values, which are
+        #   only used for points outside of the grid (set to the fill value by
+        #   Grid_weights.interp).
+        self.buffer = None
+
+        # List of (k1, k2, j1, j2, i1, i2) hyperslabs to read, or None to read
+        #   the whole variable.
+        self.slabs = None
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Find the hyperslabs needed to interpolate to the valid points of a
+    #   Grid_weights object.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def set_points(self, weights):
+        num_blocks = [-(-dim_size // size) for dim_size, size in zip(self.grid_shape, self.block_shape)]
+
+        # Blocks containing the grid points at index and index+1 along each
+        #   axis of every valid point.
+        block_index = []
+        for index, size in zip(weights.indices, self.block_shape):
+            index = index[weights.valid]
+            block_index.append(np.concatenate((index // size, (index + 1) // size)))
+
+        block_ids = []
+        for block_k in block_index[0].reshape(2, -1):
+            for block_j in block_index[1].reshape(2, -1):
+                for block_i in block_index[2].reshape(2, -1):
+                    block_ids.append(np.ravel_multi_index((block_k, block_j, block_i), num_blocks))
+        block_ids = np.unique(np.concatenate(block_ids))
+
+        if block_ids.size * np.prod(self.block_shape) >= self.full_read_fraction * np.prod(self.grid_shape):
+            self.slabs = None
+            return
+
+        # Join blocks that are next to each other along the x axis (the blocks
+        #   are sorted by k, then j, then i).
+        block_k, block_j, block_i = np.unravel_index(block_ids, num_blocks)
+        run_start = np.ones(block_ids.shape, dtype=bool)
+        run_start[1:] = (block_ids[1:] != block_ids[:-1] + 1) | (block_i[1:] == 0)
+        start_index = np.flatnonzero(run_start)
+        end_index = np.append(start_index[1:], block_ids.size) - 1
+
+        size_k, size_j, size_i = self.block_shape
+        nk, nj, ni = self.grid_shape
+        self.slabs = [(int(block_k[start]*size_k), int(min((block_k[start] + 1)*size_k, nk)),
+                       int(block_j[start]*size_j), int(min((block_j[start] + 1)*size_j, nj)),
+                       int(block_i[start]*size_i), int(min((block_i[end] + 1)*size_i, ni)))
+                      for start, end in zip(start_index, end_index)]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read the needed parts of a (time, nk, nj, ni) netCDF variable at one
+    #   time.  The returned buffer is overwritten by the next read.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read(self, nc_variable, time_index):
+        if self.slabs is None:
+            return np.copy(nc_variable[time_index,:,:,:])
+
+        if self.buffer is None or self.buffer.dtype != nc_variable.dtype:
+            self.buffer = np.zeros(self.grid_shape, dtype=nc_variable.dtype)
+
+        for k1, k2, j1, j2, i1, i2 in self.slabs:
+            self.buffer[k1:k2,j1:j2,i1:i2] = nc_variable[time_index,k1:k2,j1:j2,i1:i2]
+
+        return self.buffer
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Interpolate variables of a netCDF dataset to all of the trajectories at each
+#   time.  Returns a dictionary of (time, parcel) arrays for each variable.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def sample_trajectories(dataset, var_names, grid_coord, time_indices, xpos, ypos, zpos, fill_value=np.nan):
+    stencil_reader = Stencil_reader([len(coord) for coord in grid_coord])
+
+    samples = {var_name: np.zeros(np.shape(xpos)) for var_name in var_names}
+    for row, time_index in enumerate(time_indices):
+        # Weights of the trajectory positions at this time (the same for all
+        #   of the variables).
+        weights = Grid_weights(grid_coord, np.column_stack((zpos[row], ypos[row], xpos[row])))
+        stencil_reader.set_points(weights)
+
+        for var_name in var_names:
+            samples[var_name][row] = weights.interp(stencil_reader.read(dataset.variables[var_name], time_index), fill_value)
+
+    return samples
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   test_traj_sample_cache.py
+#
+# Purpose:  Check that the back trajectory samples stored in a
+#           Traj_sample_cache by auto_categorize_back_trajectories.py are used
+#           by meso_vort_source_percentage_auto.py (and the reverse) without
+#           reading the model data again.  Both scripts get the model files
+#           from Back_traj_ds.getModelFileList; the cache calls below are the
+#           same as the ones in each script.
+#
+# Syntax: python3 -m pytest test_traj_sample_cache.py
+#         python3 test_traj_sample_cache.py
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created.
+#
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BackTrajectories'))
+
+from back_traj_interp_class import Back_traj_ds
+from category_rules import Category_rules
+from netCDF4 import Dataset
+from netCDF4 import MFDataset
+from scipy import interpolate
+from traj_sample_cache import Traj_sample_cache, sample_cache_name, sample_name
+
+import numpy as np
+import shutil
+import tempfile
+import unittest
+
+version_number = 'v5'
+parcel_label = 'test'
+run_number = 5
+file_num_offset = 10
+parcel_time_step_num = 6
+total_parcel_num = 4
+model_field = 'zvort'
+model_level = 2
+
+x_coord = np.arange(8) * 75.
+y_coord = np.arange(7) * 75.
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Model dataset that fails if any model variable is read.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+class No_read_ds:
+    @property
+    def variables(self):
+        raise AssertionError('Model data read for a sample that is in the cache.')
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Sample function that fails if it is called.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def no_sample(rows):
+    raise AssertionError('sample_function called for a sample that is in the cache.')
+
+class Test_shared_sample_cache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.model_dir = self.tmp_dir + '/'
+
+        # Back_traj_ds without a trajectory file (only the values used by
+        #   getModelFileList are needed).
+        self.traj_ds_obj = Back_traj_ds.__new__(Back_traj_ds)
+        self.traj_ds_obj.file_num_offset = file_num_offset
+        self.traj_ds_obj.parcel_time_step_num = parcel_time_step_num
+
+        # Model files from one before the earliest trajectory time to one
+        #   after the latest, each with one time of a different zvort field.
+        rng = np.random.default_rng(0)
+        for file_num in range(file_num_offset, file_num_offset+parcel_time_step_num+2):
+            ds = Dataset(self.model_dir + 'JS_75m_run{:d}_{:06d}.nc'.format(run_number, file_num), mode='w', format='NETCDF4_CLASSIC')
+            ds.createDimension('time', None)
+            ds.createDimension('zh', 4)
+            ds.createDimension('yh', y_coord.size)
+            ds.createDimension('xh', x_coord.size)
+            ds.createVariable('time', np.float64, ('time'))[:] = [file_num * 60.]
+            ds.createVariable(model_field, np.float64, ('time', 'zh', 'yh', 'xh'))[:] = rng.normal(size=(1, 4, y_coord.size, x_coord.size))
+            ds.close()
+
+        # Back trajectory positions (in order of decreasing time, as in the
+        #   back trajectory files).
+        self.xpos = rng.uniform(x_coord[0], x_coord[-1], size=(parcel_time_step_num, total_parcel_num))
+        self.ypos = rng.uniform(y_coord[0], y_coord[-1], size=(parcel_time_step_num, total_parcel_num))
+        self.zpos = rng.uniform(0., 200., size=(parcel_time_step_num, total_parcel_num))
+
+        self.file_list = self.traj_ds_obj.getModelFileList(self.model_dir, run_number)
+        self.cache_path = self.model_dir + sample_cache_name(version_number, parcel_label, 'back')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Sample cache as opened by either script.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def open_cache(self):
+        return Traj_sample_cache(self.cache_path, self.xpos, self.ypos, self.zpos, self.file_list)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Samples of the threshold field at the last plot_limit times, as in
+    #   auto_categorize_back_trajectories.py.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def auto_categorize_samples(self, ds, sample_cache, plot_limit):
+        end_point_dict = {'test_region': {'thresholds': {model_field: [model_level, 0., '>']}}}
+        category_rules = Category_rules(end_point_dict, {})
+        grid_coords = {'x': x_coord, 'y': y_coord, 'x_stag': x_coord, 'y_stag': y_coord}
+
+        xpos = self.xpos[::-1][parcel_time_step_num-plot_limit:]
+        ypos = self.ypos[::-1][parcel_time_step_num-plot_limit:]
+        traj_time_indices = np.arange(plot_limit)[::-1]
+
+        samples = category_rules.sample_fields(ds, (parcel_time_step_num-plot_limit, parcel_time_step_num), xpos, ypos, grid_coords, sample_cache, traj_time_indices)
+        return samples[(model_field, model_level)]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Sample of the threshold field at the latest time, as in
+    #   get_meso_indices in meso_vort_source_percentage_auto.py.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def meso_sample(self, ds, sample_cache, sample_function):
+        return sample_cache.get(sample_name(model_field, model_level), [0], [ds.variables['time'].shape[0]-1], sample_function)[0]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Interpolate the threshold field to the latest trajectory positions.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def meso_interp_var(self, ds):
+        def interp_var(rows):
+            variable = np.copy(ds.variables[model_field][-1,model_level,:,:])
+            traj_points = np.column_stack((self.ypos[0], self.xpos[0]))
+            return interpolate.interpn((y_coord, x_coord), variable, traj_points, method = 'linear', bounds_error=False, fill_value= np.nan)[None,:]
+        return interp_var
+
+    def test_model_file_list(self):
+        self.assertEqual(os.path.basename(self.file_list[0]), 'JS_75m_run5_{:06d}.nc'.format(file_num_offset+1))
+        self.assertEqual(os.path.basename(self.file_list[-1]), 'JS_75m_run5_{:06d}.nc'.format(file_num_offset+parcel_time_step_num))
+        self.assertEqual(len(self.file_list), parcel_time_step_num)
+
+    def test_auto_categorize_to_meso(self):
+        ds = MFDataset(self.file_list)
+        sample_cache = self.open_cache()
+        auto_values = self.auto_categorize_samples(ds, sample_cache, 3)
+        expected = self.meso_interp_var(ds)([0])[0]
+        sample_cache.ds.close()
+
+        sample_cache = self.open_cache()
+        meso_values = self.meso_sample(ds, sample_cache, no_sample)
+        sample_cache.ds.close()
+        ds.close()
+
+        np.testing.assert_array_equal(meso_values, auto_values[-1])
+        np.testing.assert_allclose(meso_values, expected)
+
+    def test_meso_to_auto_categorize(self):
+        ds = MFDataset(self.file_list)
+        sample_cache = self.open_cache()
+        meso_values = self.meso_sample(ds, sample_cache, self.meso_interp_var(ds))
+        sample_cache.ds.close()
+        ds.close()
+
+        sample_cache = self.open_cache()
+        auto_values = self.auto_categorize_samples(No_read_ds(), sample_cache, 1)
+        sample_cache.ds.close()
+
+        np.testing.assert_array_equal(auto_values[-1], meso_values)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   time_step_pool.py
+#
+# Purpose:  Calculate independent model time steps on a pool of worker
+#           processes.  Each worker opens its own copy of the CM1 dataset and
+#           reads the data it needs for a time step, and the results are
+#           returned to the main process in the same order as the tasks, so
+#           the main process can be the only one writing to the output file.
+#
+# Syntax: from time_step_pool import Time_step_pool
+#         time_step_pool = Time_step_pool(calc_function, model_file_list, num_workers)
+#         for task, result in time_step_pool.map(tasks, ds):
+#             ...
+#         time_step_pool.close()
+#
+#   Input:
+#       calc_function: function called as calc_function(ds, *task) for each
+#                      task (e.g. (time_index,)), where ds is the open
+#                      MFDataset of the model files
+#       model_file_list: list of the CM1 output files opened by each worker
+#       num_workers: number of worker processes (1 calculates the tasks in the
+#                    main process with no pool)
+#
+# Execution Example:
+#   time_step_pool = Time_step_pool(calc_time_step, model_file_list, 16)
+#   for (time_index,), terms in time_step_pool.map([(time_index,) for time_index in range(model_time_steps)], dataset):
+#       x_tilt_term_var[time_index,:,:,:] = terms['x_tilt_term']
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to calculate time steps in parallel in
+#                               calc_vort_equation.py and calc_vort_budget.py.
+#
+
+from netCDF4 import MFDataset
+
+import collections
+import multiprocessing
+
+# Dataset and calculation function in each worker process (set up by
+#   init_worker).
+worker_state = {}
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Open the model files in each worker process.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def init_worker(calc_function, model_file_list):
+    worker_state['calc_function'] = calc_function
+    worker_state['ds'] = MFDataset(model_file_list)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Calculate one task (run in a worker process).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_task(task):
+    return worker_state['calc_function'](worker_state['ds'], *task)
+
+class Time_step_pool:
+    def __init__(self, calc_function, model_file_list, num_workers=1):
+        self.calc_function = calc_function
+        self.num_workers = num_workers
+
+        # Results waiting to be used are limited to a couple per worker, so
+        #   memory use does not grow if writing is slower than calculating.
+        self.max_pending = 2*num_workers
+
+        if num_workers > 1:
+            # Worker processes are forked so that functions defined in the main
+            #   script (including one run from stdin) can be used.
+            self.pool = multiprocessing.get_context('fork').Pool(num_workers, initializer=init_worker,
+                                                                  initargs=(calc_function, model_file_list))
+        else:
+            self.pool = None
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Calculate each task, yielding (task, result) in the order of the tasks.
+    #   ds: open dataset used when there is no pool
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def map(self, tasks, ds=None):
+        if self.pool is None:
+            for task in tasks:
+                yield task, self.calc_function(ds, *task)
+            return
+
+        pending = collections.deque()
+        for task in tasks:
+            pending.append((task, self.pool.apply_async(calc_task, (task,))))
+            if len(pending) >= self.max_pending:
+                task, result = pending.popleft()
+                yield task, result.get()
+
+        while pending:
+            task, result = pending.popleft()
+            yield task, result.get()
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Stop the worker processes.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
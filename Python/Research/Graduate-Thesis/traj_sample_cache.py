@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   traj_sample_cache.py
+#
+# Purpose:  Store model fields interpolated to a set of trajectories in a
+#           netCDF file, so that they only need to be read from the model
+#           files and interpolated once for each trajectory label (e.g. when
+#           changing the category thresholds and categorizing the
+#           trajectories again).
+#
+#           Each sample is a (time, number_parcels) variable named after the
+#           model field and level (e.g. zvort_level5, or xvort for a sample at
+#           the 3D parcel positions), where the time dimension is the time
+#           index of the trajectory positions.  Times that have not been
+#           sampled are nan.  The file stores a hash of the trajectory
+#           positions, and the file is created again if the positions change.
+#           The name, size, and modification time of the model file used at
+#           each time of each sample are also stored, and times are sampled
+#           again if the model file is different.
+#
+# Syntax: from traj_sample_cache import Traj_sample_cache
+#         sample_cache = Traj_sample_cache(file_path, xpos, ypos, zpos, model_files)
+#         values = sample_cache.get(sample_name, traj_time_indices, model_time_indices, sample_function)
+#
+#   Input:
+#       file_path: netCDF file of the cached samples
+#       xpos, ypos, zpos: (time, parcel) positions of all of the trajectories
+#       model_files: list of the model files at each model time index
+#       sample_name: name of the sample (from sample_name())
+#       traj_time_indices: time indices of the trajectory positions to get
+#       model_time_indices: index in model_files of the model time sampled
+#                           at each of traj_time_indices
+#       sample_function: function that takes a list of indices into
+#                        traj_time_indices and returns the samples at those
+#                        times as a (time, parcel) array, called for the
+#                        times that are not in the cache
+#
+# Execution Example:
+#   sample_cache = Traj_sample_cache(interp_dir + sample_cache_name(version_number, parcel_label, 'back'), traj_ds_obj.xpos, traj_ds_obj.ypos, traj_ds_obj.zpos, file_list)
+#   zvort_traj = sample_cache.get(sample_name('zvort', 5), [0, 1, 2], [60, 59, 58], sample_function)
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to avoid interpolating the same model
+#                               fields to the same trajectories in each of
+#                               the categorization scripts.
+#
+
+from netCDF4 import Dataset
+from os import path
+
+import atexit
+import hashlib
+import numpy as np
+import os
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# File name of the sample cache for a set of back or forward trajectories.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def sample_cache_name(version_number, parcel_label, traj_direction):
+    if version_number in parcel_label:
+        return '{:s}_{:s}_trajectory_samples.nc'.format(parcel_label, traj_direction)
+    else:
+        return '{:s}_{:s}_{:s}_trajectory_samples.nc'.format(version_number, parcel_label, traj_direction)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Name of the sample of a model field at one model level, or at the 3D parcel
+#   positions if model_level is None.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def sample_name(model_field, model_level=None):
+    if model_level is None:
+        return model_field
+    return '{:s}_level{:d}'.format(model_field, model_level)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Hash of the trajectory positions.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_traj_hash(xpos, ypos, zpos):
+    traj_hash = hashlib.sha1()
+    for positions in (xpos, ypos, zpos):
+        positions = np.ascontiguousarray(positions, dtype=np.float64)
+        traj_hash.update(str(positions.shape).encode())
+        traj_hash.update(positions.tobytes())
+    return traj_hash.hexdigest()
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Name, size, and modification time of a model file, used to check whether a
+#   sample was taken from the same model data.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def model_file_signature(model_file):
+    file_stat = os.stat(model_file)
+    return '{:s}:{:d}:{:d}'.format(path.basename(model_file), file_stat.st_size, file_stat.st_mtime_ns)
+
+class Traj_sample_cache:
+    def __init__(self, file_path, xpos, ypos, zpos, model_files):
+        self.file_path = file_path
+        self.model_files = model_files
+
+        self.parcel_time_step_num, self.total_parcel_num = np.shape(xpos)
+        self.traj_hash = calc_traj_hash(xpos, ypos, zpos)
+
+        # Signature of each model file (calculated when first needed).
+        self.model_signatures = {}
+
+        # Use the existing file only if it has samples of the same
+        #   trajectories.
+        self.ds = None
+        if path.isfile(self.file_path):
+            ds = Dataset(self.file_path, mode='a')
+            if getattr(ds, 'traj_hash', None) == self.traj_hash:
+                self.ds = ds
+            else:
+                ds.close()
+
+        if self.ds is None:
+            self.create_new_nc()
+
+        self.ds.set_auto_mask(False)
+        # From https://stackoverflow.com/a/41627098
+        # Close netCDF files when the program exits.
+        atexit.register(self.closeNCfile, self.ds)
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Create a new netCDF file to store the samples.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def create_new_nc(self):
+        self.ds = Dataset(self.file_path, mode='w')
+
+        self.ds.createDimension('time', self.parcel_time_step_num)
+        self.ds.createDimension('number_parcels', self.total_parcel_num)
+
+        self.ds.traj_hash = self.traj_hash
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Close the netCDF file.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def closeNCfile(self, ds):
+        if ds.isopen():
+            ds.close()
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Signature of the model file at a model time index.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def getModelSignature(self, model_time_index):
+        model_file = self.model_files[model_time_index]
+        if model_file not in self.model_signatures:
+            self.model_signatures[model_file] = model_file_signature(model_file)
+        return self.model_signatures[model_file]
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Return the samples at the trajectory time indices as a (time, parcel)
+    #   array, calling sample_function for the times that are not in the
+    #   cache (or were sampled from a different model file) and adding them
+    #   to the cache.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def get(self, sample_name, traj_time_indices, model_time_indices, sample_function):
+        traj_time_indices = [int(time_index) for time_index in traj_time_indices]
+        signatures = [self.getModelSignature(time_index) for time_index in model_time_indices]
+
+        if sample_name not in self.ds.variables:
+            sample_var = self.ds.createVariable(sample_name, np.float64, ('time', 'number_parcels'), fill_value=np.nan, chunksizes=(1, self.total_parcel_num))
+            source_var = self.ds.createVariable(sample_name + '_source', str, ('time'))
+            source_var.definition = 'Model file name:size:modification time of each time of ' + sample_name
+        sample_var = self.ds.variables[sample_name]
+        source_var = self.ds.variables[sample_name + '_source']
+
+        # Times without a sample from the same model file.
+        cached_sources = source_var[:]
+        missing_rows = [row for row, (time_index, signature) in enumerate(zip(traj_time_indices, signatures))
+                        if cached_sources[time_index] != signature]
+
+        if missing_rows:
+            missing_values = sample_function(missing_rows)
+            for missing_num, row in enumerate(missing_rows):
+                sample_var[traj_time_indices[row],:] = missing_values[missing_num]
+                source_var[traj_time_indices[row]] = signatures[row]
+            self.ds.sync()
+
+        return np.array([sample_var[time_index,:] for time_index in traj_time_indices]).reshape((len(traj_time_indices), self.total_parcel_num))
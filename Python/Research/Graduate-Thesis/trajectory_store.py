@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   trajectory_store.py
+#
+# Purpose:  Store trajectory data (positions and vorticity budget data
+#           interpolated to the trajectories) in one netCDF file format, and
+#           read parts of it by parcel number and time range without reading
+#           the whole variable.
+#
+#           Every variable is stored with dimensions (number_parcels, time)
+#           and chunked along the number_parcels dimension, so that the data
+#           for a group of parcels is stored together on disk.  Data is
+#           returned with dimensions (time, number_parcels), the same as the
+#           other trajectory files.  Times that are not valid for a parcel are
+#           nan (the fill value), so fully valid and partially valid back
+#           trajectories can be stored together without a nan buffer.
+#
+#           The converter functions (and the command line program) create a
+#           store from the existing trajectory files:
+#               back_npz:       back_traj_npz_{version}/backtraj_{label}.npz
+#               back_interp:    {label}_fully_valid_back_trajectory.nc and
+#                               {label}_partially_valid_back_trajectory.nc
+#               forward_interp: cm1out_pdata_vort_interp_{label}.nc
+#               forward_pdata:  cm1out_pdata_{label}.nc
+#
+# Syntax: python3 trajectory_store.py version_number parcel_label source
+#
+#         from trajectory_store import Traj_store
+#         traj_store = Traj_store(file_path)
+#         traj_store.read_data()
+#         budget_var = traj_store.getParcelData(var_name, parcel_ids, time_range)
+#
+#   Input:
+#       version_number: CM1 model version
+#       parcel_label: label of the set of trajectories
+#       source: type of trajectory file to convert (back_npz, back_interp,
+#               forward_interp, or forward_pdata)
+#       parcel_ids: parcel numbers to read, in any order (None for all
+#                   parcels)
+#       time_range: (start, end) time indices to read (None for all times)
+#
+# Execution Example:
+#   python3 trajectory_store.py v5 v5_meso_tornadogenesis back_interp
+#
+#   traj_store = Traj_store('v5_meso_tornadogenesis_back_trajectory_store.nc')
+#   traj_store.read_data()
+#   x_tilt = traj_store.getParcelData('x_tilt_term', [12, 5, 300], (0, 120))
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to store all types of trajectory data
+#                               in one format that can be read by parcel.
+#   2026/10/17 - Lance Wilson:  Removed the valid time and category variables,
+#                               which were not used by any program.
+#
+
+from netCDF4 import Dataset
+from os import path
+
+import atexit
+import numpy as np
+import sys
+
+# Default number of parcels in each chunk of the store variables.
+default_parcel_chunk = 256
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# File names of the stores created from the interpolated back and forward
+#   trajectory files (in the same directory as those files).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def back_traj_store_name(version_number, parcel_label):
+    if version_number in parcel_label:
+        return '{:s}_back_trajectory_store.nc'.format(parcel_label)
+    else:
+        return '{:s}_{:s}_back_trajectory_store.nc'.format(version_number, parcel_label)
+
+def forward_traj_store_name(version_number, parcel_label):
+    if version_number in parcel_label:
+        return 'cm1out_pdata_vort_interp_{:s}_store.nc'.format(parcel_label)
+    else:
+        return 'cm1out_pdata_vort_interp_{:s}_{:s}_store.nc'.format(version_number, parcel_label)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Check that a store exists and was created after any of the files it was
+#   converted from were last changed.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def store_is_current(store_path, source_paths):
+    if not path.isfile(store_path):
+        return False
+    return all([path.getmtime(store_path) >= path.getmtime(source_path) for source_path in source_paths if path.isfile(source_path)])
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Split a list of parcel numbers into runs of consecutive parcels.  Returns the
+#   sorted unique parcel numbers, the index of each requested parcel in them,
+#   and the (start, end) indices of each run in the unique parcel numbers.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def parcel_runs(parcel_ids):
+    unique_ids, inverse = np.unique(np.asarray(parcel_ids, dtype=int).ravel(), return_inverse=True)
+
+    if unique_ids.size == 0:
+        return unique_ids, inverse, []
+
+    run_start = np.flatnonzero(np.diff(unique_ids) != 1) + 1
+    starts = np.concatenate(([0], run_start))
+    ends = np.append(run_start, unique_ids.size)
+
+    return unique_ids, inverse, list(zip(starts, ends))
+
+class Traj_store:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+        # Check whether this dataset already exists.
+        if path.isfile(self.file_path):
+            self.existing_file = True
+        else:
+            self.existing_file = False
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Create a new netCDF file to store the data.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def create_new_nc(self, parcel_num, simulation_times, file_num_offset, parcel_chunk=default_parcel_chunk):
+        self.ds = Dataset(self.file_path, mode='w')
+        # From https://stackoverflow.com/a/41627098
+        # Close netCDF files when the program exits.
+        atexit.register(self.closeNCfile, self.ds)
+
+        self.total_parcel_num = parcel_num
+        self.parcel_time_step_num = len(simulation_times)
+        self.parcel_chunk = max(min(parcel_chunk, parcel_num), 1)
+
+        # Create netCDF variable dimensions.
+        parcel_dim = self.ds.createDimension('number_parcels', parcel_num)
+        time_dim = self.ds.createDimension('time', self.parcel_time_step_num)
+        offset_dim = self.ds.createDimension('offset', 1)
+
+        # Create variable to store file_num_offset.
+        offset_var = self.ds.createVariable('file_num_offset', int, ('offset'))
+        offset_var.definition = 'Number of model file at the earliest trajectory time'
+        offset_var[:] = file_num_offset
+
+        # Create variable to store time.
+        time_var = self.ds.createVariable('time', np.float32, ('time'))
+        time_var.units = 'seconds'
+        time_var.definition = 'Time Since Beginning of Simulation'
+        time_var[:] = simulation_times
+
+        return
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Write (time, number_parcels) data for a variable, starting at parcel
+    #   number parcel_start (the variable is created if needed).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def write_variable(self, var_name, data, units=None, definition=None, parcel_start=0):
+        if var_name not in self.ds.variables:
+            out_var = self.ds.createVariable(var_name, np.float32, ('number_parcels', 'time'), fill_value=np.nan,
+                                             chunksizes=(self.parcel_chunk, self.parcel_time_step_num))
+            if units is not None:
+                out_var.units = units
+            if definition is not None:
+                out_var.definition = definition
+
+        data = np.asarray(data)
+        self.ds.variables[var_name][parcel_start:parcel_start+data.shape[1],:data.shape[0]] = data.T
+
+        return
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Open an existing store for reading.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def read_data(self):
+        if self.existing_file == True:
+            self.ds = Dataset(self.file_path)
+            # Return the fill values (nan) instead of masked arrays.
+            self.ds.set_auto_mask(False)
+            # From https://stackoverflow.com/a/41627098
+            # Close netCDF files when the program exits.
+            atexit.register(self.closeNCfile, self.ds)
+
+            # Total number of parcels for this set of data.
+            self.total_parcel_num = self.ds.dimensions['number_parcels'].size
+
+            # Model file at the earliest time of the trajectory dataset.
+            self.file_num_offset = self.ds.variables['file_num_offset'][0]
+
+            # Get the number of time steps in the full set of parcel data.
+            self.parcel_time_step_num = self.ds.dimensions['time'].size
+
+            # Array of model simulation times (in seconds) for the trajectory dataset.
+            self.simulation_times = np.copy(self.ds.variables['time'])
+
+            # List of vorticity budget variables, which are all float
+            #   (number_parcels, time) variables except those containing
+            #   position data (which end in 'pos').
+            self.budget_var_keys = [var_name for var_name in self.ds.variables.keys() if not var_name.endswith('pos') if self.ds.variables[var_name].dimensions == ('number_parcels', 'time') if self.ds.variables[var_name].dtype == np.float32]
+        else:
+            print('Trajectory store file {:s} does not exist.'.format(self.file_path))
+            sys.exit()
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Called at exit time to close the netCDF files.
+    #   From https://stackoverflow.com/a/41627098
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def closeNCfile(self, ds):
+        if ds.isopen():
+            ds.close()
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Read (time, number_parcels) data for a variable for a set of parcels
+    #   (in the order given) and range of time indices.  Consecutive parcels
+    #   are read together, so only the chunks containing the requested parcels
+    #   are read from the file.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def getParcelData(self, var_name, parcel_ids=None, time_range=None):
+        nc_variable = self.ds.variables[var_name]
+        t1, t2 = (0, self.parcel_time_step_num) if time_range is None else time_range
+
+        if parcel_ids is None:
+            return np.ascontiguousarray(nc_variable[:,t1:t2].T)
+
+        unique_ids, inverse, runs = parcel_runs(parcel_ids)
+        unique_data = np.empty((unique_ids.size, max(min(t2, self.parcel_time_step_num) - t1, 0)), dtype=nc_variable.dtype)
+        for start, end in runs:
+            unique_data[start:end] = nc_variable[unique_ids[start]:unique_ids[end-1]+1,t1:t2]
+
+        return np.ascontiguousarray(unique_data[inverse].T)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Copy the (time, number_parcels) variables of a netCDF file to a store, one
+#   chunk of parcels at a time, starting at parcel number parcel_start.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def copy_nc_variables(ds_in, traj_store, var_names, parcel_start=0):
+    parcel_num = ds_in.variables[var_names[0]].shape[1]
+    for p1 in range(0, parcel_num, traj_store.parcel_chunk):
+        p2 = min(p1 + traj_store.parcel_chunk, parcel_num)
+
+        for var_name in var_names:
+            var_data = np.ma.filled(ds_in.variables[var_name][:,p1:p2].astype(np.float32), np.nan)
+            traj_store.write_variable(var_name, var_data, getattr(ds_in.variables[var_name], 'units', None),
+                                      getattr(ds_in.variables[var_name], 'definition', None), parcel_start + p1)
+
+    return
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Create a store from a backtraj_{label}.npz file of back trajectory
+#   positions.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def back_traj_npz_to_store(npz_file, store_file, simulation_times=None, parcel_chunk=default_parcel_chunk):
+    traj_data = np.load(npz_file)
+    xpos = traj_data['xpos']
+    parcel_time_step_num, parcel_num = xpos.shape
+    # The npz files do not contain times, so use the time step number if they
+    #   are not given.
+    if simulation_times is None:
+        simulation_times = np.arange(parcel_time_step_num)
+
+    traj_store = Traj_store(store_file)
+    traj_store.create_new_nc(parcel_num, simulation_times, int(traj_data['offset']), parcel_chunk)
+
+    traj_store.write_variable('xpos', xpos, 'm', 'X-Direction Parcel Positions')
+    traj_store.write_variable('ypos', traj_data['ypos'], 'm', 'Y-Direction Parcel Positions')
+    traj_store.write_variable('zpos', traj_data['zpos'], 'm', 'Z-Direction Parcel Positions')
+
+    return traj_store
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Create a store from the fully valid and partially valid interpolated back
+#   trajectory files (either may be None).  The fully valid parcels are
+#   first, followed by the partially valid parcels (the same order as
+#   Back_traj_ds).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def back_traj_nc_to_store(full_file, partial_file, store_file, parcel_chunk=default_parcel_chunk):
+    ds_list = [Dataset(file_name) for file_name in (full_file, partial_file) if file_name is not None]
+
+    # The dataset with the most time steps (the fully valid dataset if it
+    #   exists) sets the times of the store.
+    ds_time = max(ds_list, key=lambda ds: ds.dimensions['time'].size)
+    parcel_num = sum([ds.dimensions['number_parcels'].size for ds in ds_list])
+
+    traj_store = Traj_store(store_file)
+    traj_store.create_new_nc(parcel_num, np.copy(ds_time.variables['time']), ds_time.variables['file_num_offset'][0], parcel_chunk)
+
+    var_names = [var_name for var_name in ds_time.variables.keys() if len(ds_time.variables[var_name].dimensions) > 1]
+    parcel_start = 0
+    for ds in ds_list:
+        copy_nc_variables(ds, traj_store, var_names, parcel_start)
+        parcel_start += ds.dimensions['number_parcels'].size
+        ds.close()
+
+    return traj_store
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Create a store from an interpolated forward trajectory file
+#   (cm1out_pdata_vort_interp_{label}.nc).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def forward_traj_nc_to_store(interp_file, store_file, parcel_chunk=default_parcel_chunk):
+    ds_in = Dataset(interp_file)
+
+    traj_store = Traj_store(store_file)
+    traj_store.create_new_nc(ds_in.dimensions['number_parcels'].size, np.copy(ds_in.variables['time']),
+                             ds_in.variables['file_num_offset'][0], parcel_chunk)
+
+    var_names = [var_name for var_name in ds_in.variables.keys() if len(ds_in.variables[var_name].dimensions) > 1]
+    copy_nc_variables(ds_in, traj_store, var_names)
+    ds_in.close()
+
+    return traj_store
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Create a store from a CM1 parcel output file (cm1out_pdata_{label}.nc),
+#   including all of the parcel variables (positions are x, y, and z).
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def forward_pdata_to_store(pdata_file, store_file, file_num_offset=0, parcel_chunk=default_parcel_chunk):
+    ds_in = Dataset(pdata_file)
+
+    var_names = [var_name for var_name in ds_in.variables.keys() if len(ds_in.variables[var_name].dimensions) == 2]
+    parcel_dim_name = ds_in.variables['x'].dimensions[1]
+
+    traj_store = Traj_store(store_file)
+    traj_store.create_new_nc(ds_in.dimensions[parcel_dim_name].size, np.copy(ds_in.variables['time']), file_num_offset, parcel_chunk)
+
+    copy_nc_variables(ds_in, traj_store, var_names)
+    ds_in.close()
+
+    return traj_store
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Start of main program.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+if __name__ == '__main__':
+    if len(sys.argv) > 3:
+        # Model run that is being used.
+        version_number = sys.argv[1]
+        # Set of trajectories to convert.
+        parcel_label = sys.argv[2]
+        # Type of trajectory file to convert.
+        source = sys.argv[3]
+    else:
+        print('Model version number, parcel label, or source was not specified.')
+        print('Syntax: python3 trajectory_store.py model_version parcel_label source')
+        print('Example: python3 trajectory_store.py v5 v5_meso_tornadogenesis back_interp')
+        print('Sources: back_npz, back_interp, forward_interp, forward_pdata')
+        sys.exit()
+
+    model_dir = '75m_100p_{:s}/'.format(version_number)
+
+    if source == 'back_npz':
+        back_traj_dir = 'back_traj_npz_{:s}/'.format(version_number)
+        back_traj_npz_to_store(back_traj_dir + 'backtraj_{:s}.npz'.format(parcel_label),
+                               back_traj_dir + 'backtraj_{:s}_store.nc'.format(parcel_label))
+    elif source == 'back_interp':
+        interp_dir = model_dir + 'back_traj_analysis/parcel_interpolation/'
+        if version_number in parcel_label:
+            file_prefix = interp_dir + parcel_label
+        else:
+            file_prefix = interp_dir + '{:s}_{:s}'.format(version_number, parcel_label)
+        file_names = [file_name if path.isfile(file_name) else None for file_name in
+                      (file_prefix + '_fully_valid_back_trajectory.nc', file_prefix + '_partially_valid_back_trajectory.nc')]
+        if file_names == [None, None]:
+            print('No back trajectories were found for this dataset.')
+            sys.exit()
+        back_traj_nc_to_store(file_names[0], file_names[1], interp_dir + back_traj_store_name(version_number, parcel_label))
+    elif source == 'forward_interp':
+        interp_dir = model_dir + 'forward_traj_analysis/parcel_interpolation/'
+        interp_file = interp_dir + forward_traj_store_name(version_number, parcel_label).replace('_store.nc', '.nc')
+        forward_traj_nc_to_store(interp_file, interp_dir + forward_traj_store_name(version_number, parcel_label))
+    elif source == 'forward_pdata':
+        parcel_dir = model_dir + 'parcel_files/'
+        forward_pdata_to_store(parcel_dir + 'cm1out_pdata_{:s}.nc'.format(parcel_label),
+                               parcel_dir + 'cm1out_pdata_{:s}_store.nc'.format(parcel_label))
+    else:
+        print('Source is not valid.')
+        print('Sources: back_npz, back_interp, forward_interp, forward_pdata')
+        sys.exit()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   trajectory_tube.py
+#
+# Purpose:  Find the grid cells of a vorticity equation output domain that are
+#           within a number of grid points (stencil radius) of any back
+#           trajectory parcel at each model time.  The cells are grouped into
+#           tiles (the chunks of the output variables), so that only the
+#           tiles around the parcel paths need to be calculated and written.
+#
+#           The model time index of each back trajectory position is the one
+#           used in BackTrajectories/calc_back_traj_vort_tendency.py to
+#           interpolate the output to the parcels:
+#               time_index = offset + len(xpos) - row
+#           or, for the partially valid trajectories (which only use the first
+#           time_length_requirement positions):
+#               time_index = offset + time_length_requirement - row
+#
+# Syntax: from trajectory_tube import Trajectory_tube
+#         trajectory_tube = Trajectory_tube(version_number, x_coord, y_coord, z_coord, radius, tile_shape, time_length_requirement)
+#         cell_mask = trajectory_tube.cell_mask(time_index)
+#         tiles = trajectory_tube.tiles(time_index)
+#
+#   Input:
+#       version_number: CM1 model version (back_traj_npz_<version_number>/)
+#       x_coord, y_coord, z_coord: unstaggered coordinates of the output
+#                                  domain (m)
+#       radius: number of grid points around the cell containing each parcel
+#               to include
+#       tile_shape: (nk, nj, ni) size of each tile
+#       time_length_requirement: number of positions used for partially valid
+#                                trajectories (None to only use the full
+#                                trajectories)
+#
+# Execution Example:
+#   trajectory_tube = Trajectory_tube('v5', x_coord, y_coord, z_coord, 2, (144, 32, 32), 108)
+#   for x1, y1, z1, x2, y2, z2 in trajectory_tube.tiles(time_index):
+#       x_tilt_term_var[time_index,z1:z2,y1:y2,x1:x2] = ...
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created to calculate the vorticity equation
+#                               terms only near the back trajectories.
+#
+
+from grid_interp import calc_axis_weights
+from vort_derivatives import axis_slice
+
+import glob
+import numpy as np
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Extend a mask along one axis, marking the cells from lower points below to
+#   upper points above each marked cell.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def dilate_mask(mask, axis, lower, upper):
+    ndim = mask.ndim
+    dilated = np.copy(mask)
+    for shift in range(1, min(upper, mask.shape[axis]-1) + 1):
+        dilated[axis_slice(ndim, axis, shift, None)] |= mask[axis_slice(ndim, axis, None, -shift)]
+    for shift in range(1, min(lower, mask.shape[axis]-1) + 1):
+        dilated[axis_slice(ndim, axis, None, -shift)] |= mask[axis_slice(ndim, axis, shift, None)]
+    return dilated
+
+class Trajectory_tube:
+    def __init__(self, version_number, x_coord, y_coord, z_coord, radius=2, tile_shape=None, time_length_requirement=None):
+        self.coords = (np.asarray(z_coord), np.asarray(y_coord), np.asarray(x_coord))
+        self.shape = tuple([coord.size for coord in self.coords])
+        self.radius = radius
+        self.time_length_requirement = time_length_requirement
+        self.tile_shape = self.shape if tile_shape is None else tuple([max(min(size, dim_size), 1) for size, dim_size in zip(tile_shape, self.shape)])
+
+        # Positions and file offset of every back trajectory dataset for this
+        #   model version.
+        self.trajectories = []
+        for parcel_file in sorted(glob.glob('back_traj_npz_{:s}/*.npz'.format(version_number))):
+            traj_data = np.load(parcel_file)
+            self.trajectories.append((int(traj_data['offset']), traj_data['zpos'], traj_data['ypos'], traj_data['xpos']))
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Boolean (nk, nj, ni) mask of the cells needed to interpolate to the
+    #   parcels at one model time.  Parcels outside of the output domain (or
+    #   with nan positions) are ignored.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def cell_mask(self, time_index):
+        mask = np.zeros(self.shape, dtype=bool)
+        for offset, zpos, ypos, xpos in self.trajectories:
+            # Row of the positions at this time and the number of rows used.
+            rows = [(offset + len(xpos) - time_index, len(xpos))]
+            if self.time_length_requirement is not None:
+                rows.append((offset + self.time_length_requirement - time_index, min(self.time_length_requirement, len(xpos))))
+
+            for row, num_rows in set(rows):
+                if row < 0 or row >= num_rows:
+                    continue
+
+                cell_index = []
+                valid = np.ones(xpos[row].shape, dtype=bool)
+                for coord, positions in zip(self.coords, (zpos[row], ypos[row], xpos[row])):
+                    index, weight, axis_valid = calc_axis_weights(coord, positions)
+                    cell_index.append(index)
+                    valid &= axis_valid
+
+                mask[tuple([index[valid] for index in cell_index])] = True
+
+        # Linear interpolation uses the grid points at index and index+1 of
+        #   each axis, plus the stencil radius on each side.
+        for axis in range(mask.ndim):
+            mask = dilate_mask(mask, axis, self.radius, self.radius + 1)
+
+        return mask
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Tiles containing any cell of cell_mask(time_index), each as
+    #   (x1, y1, z1, x2, y2, z2) indices of the output domain (the same order
+    #   as calc_parcel_bounds.calc_boundaries).
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def tiles(self, time_index):
+        mask = self.cell_mask(time_index)
+
+        # Pad the mask to a whole number of tiles along each axis, then check
+        #   each tile for any marked cells.
+        num_tiles = [-(-dim_size // size) for dim_size, size in zip(self.shape, self.tile_shape)]
+        padded = np.zeros([num*size for num, size in zip(num_tiles, self.tile_shape)], dtype=bool)
+        padded[:self.shape[0],:self.shape[1],:self.shape[2]] = mask
+        tile_mask = padded.reshape(num_tiles[0], self.tile_shape[0], num_tiles[1], self.tile_shape[1],
+                                   num_tiles[2], self.tile_shape[2]).any(axis=(1,3,5))
+
+        tiles = []
+        for tile_k, tile_j, tile_i in np.argwhere(tile_mask):
+            z1, y1, x1 = tile_k*self.tile_shape[0], tile_j*self.tile_shape[1], tile_i*self.tile_shape[2]
+            z2 = min(z1 + self.tile_shape[0], self.shape[0])
+            y2 = min(y1 + self.tile_shape[1], self.shape[1])
+            x2 = min(x1 + self.tile_shape[2], self.shape[2])
+            tiles.append((int(x1), int(y1), int(z1), int(x2), int(y2), int(z2)))
+
+        return tiles
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+#
+# Name:
+#   vort_derivatives.py
+#
+# Purpose:  Calculate the terms of the vorticity equation (stretching,
+#           tilting, solenoid, and advection) for one model time, taking each
+#           spatial derivative once into buffers that are allocated when the
+#           object is created and reused at every time step.  Gives the same
+#           result as the np.gradient based functions previously used in
+#           calc_vort_equation.py.
+#
+#           The grid dimensions are the last three axes of each array
+#           (z, y, x), so the same code can be used for a batch of small grids
+#           (e.g. a stack of subdomains with shape (n, nk, nj, ni)), as long as
+#           the coordinate gradients have matching leading dimensions.
+#
+# Syntax: from vort_derivatives import Vort_derivatives
+#         vort_derivatives = Vort_derivatives(x_coord, y_coord, z_coord, stagger_x_coord, stagger_y_coord)
+#         terms = vort_derivatives.calc_terms(u_wind, v_wind, w_wind, x_vort, y_vort, z_vort, pressure, rho)
+#
+# Execution Example:
+#   vort_derivatives = Vort_derivatives(x_coord, y_coord, z_coord, stagger_x_coord, stagger_y_coord)
+#   rho = vort_derivatives.calc_density(base_pressure, rho_perturb, gravity)
+#   terms = vort_derivatives.calc_terms(u_wind, v_wind, w_wind, x_vort, y_vort, z_vort, base_pressure + pressure_perturb, rho)
+#   x_tilt_term_var[time_index,:,:,:] = terms['x_tilt_term']
+#
+# Modification History:
+#   2026/10/17 - Lance Wilson:  Created from the derivative functions in
+#                               calc_vort_equation.py.
+#
+
+import numpy as np
+
+# Names of the vorticity equation terms returned by calc_terms.
+term_names = ['x_stretch_term', 'y_stretch_term', 'z_stretch_term',
+              'x_tilt_term', 'y_tilt_term', 'z_tilt_term',
+              'x_solenoid_term', 'y_solenoid_term', 'z_solenoid_term',
+              'x_advection_term', 'y_advection_term', 'z_advection_term']
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Index for a range of points along one axis of an array with ndim dimensions.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def axis_slice(ndim, axis, start, stop):
+    index = [slice(None)]*ndim
+    index[axis] = slice(start, stop)
+    return tuple(index)
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Coordinate spacing reshaped to broadcast along one of the last three axes
+#   (-3: z, -2: y, -1: x) of the data.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def axis_spacing(spacing, axis):
+    spacing = np.asarray(spacing)
+    if axis == -1:
+        return spacing[...,None,None,:]
+    elif axis == -2:
+        return spacing[...,None,:,None]
+    else:
+        return spacing[...,:,None,None]
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Calculate np.gradient(field, axis=axis)/spacing into the array out (or only
+#   np.gradient(field, axis=axis) if spacing is None).
+#   Centered differences are used at interior points, and forward or backward
+#   differences at the edges, in the same way as np.gradient.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_gradient(field, axis, spacing, out):
+    ndim = field.ndim
+
+    interior = out[axis_slice(ndim, axis, 1, -1)]
+    np.subtract(field[axis_slice(ndim, axis, 2, None)], field[axis_slice(ndim, axis, None, -2)], out=interior)
+    np.divide(interior, 2., out=interior)
+
+    np.subtract(field[axis_slice(ndim, axis, 1, 2)], field[axis_slice(ndim, axis, 0, 1)], out=out[axis_slice(ndim, axis, 0, 1)])
+    np.subtract(field[axis_slice(ndim, axis, -1, None)], field[axis_slice(ndim, axis, -2, -1)], out=out[axis_slice(ndim, axis, -1, None)])
+
+    if spacing is not None:
+        np.divide(out, spacing, out=out)
+    return out
+
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+# Average a field on a staggered axis to the unstaggered points between them.
+#^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+def calc_stagger_avg(field, axis, out):
+    ndim = field.ndim
+    np.add(field[axis_slice(ndim, axis, 1, None)], field[axis_slice(ndim, axis, None, -1)], out=out)
+    np.divide(out, 2., out=out)
+    return out
+
+class Vort_derivatives:
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # x_coord, y_coord, z_coord: unstaggered (thermodynamic) coordinates (m)
+    # stagger_x_coord, stagger_y_coord: staggered coordinates of the u and v
+    #                                   points (m), one point longer than the
+    #                                   unstaggered coordinates
+    # All coordinates may have leading batch dimensions.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def __init__(self, x_coord, y_coord, z_coord, stagger_x_coord, stagger_y_coord, dtype=np.float32):
+        # Gradients of spatial coordinates, shaped to broadcast along each axis.
+        self.grad_dx = axis_spacing(np.gradient(x_coord, axis=-1), -1)
+        self.grad_dy = axis_spacing(np.gradient(y_coord, axis=-1), -2)
+        self.grad_dz = axis_spacing(np.gradient(z_coord, axis=-1), -3)
+
+        # Distance between staggered points (for derivatives of u and v at the
+        #   unstaggered points).
+        self.stagger_dx = axis_spacing(stagger_x_coord[...,1:] - stagger_x_coord[...,:-1], -1)
+        self.stagger_dy = axis_spacing(stagger_y_coord[...,1:] - stagger_y_coord[...,:-1], -2)
+
+        batch_shape = np.broadcast_shapes(np.shape(x_coord)[:-1], np.shape(y_coord)[:-1], np.shape(z_coord)[:-1])
+        nk, nj, ni = np.shape(z_coord)[-1], np.shape(y_coord)[-1], np.shape(x_coord)[-1]
+        self.shape = batch_shape + (nk, nj, ni)
+
+        # Derivatives of the winds at their staggered points.
+        self.u_buffer = np.empty(batch_shape + (nk, nj, ni+1), dtype=dtype)
+        self.v_buffer = np.empty(batch_shape + (nk, nj+1, ni), dtype=dtype)
+        self.w_buffer = np.empty(batch_shape + (nk+1, nj, ni), dtype=dtype)
+
+        # Derivatives at the unstaggered points (x, y, and z derivatives of
+        #   pressure and density, then reused for each vorticity component).
+        self.grad_buffers = [np.empty(self.shape, dtype=dtype) for buf_num in range(6)]
+        # Winds averaged to the unstaggered points.
+        self.avg_winds = [np.empty(self.shape, dtype=dtype) for buf_num in range(3)]
+        self.du_dx = np.empty(self.shape, dtype=dtype)
+        self.dv_dy = np.empty(self.shape, dtype=dtype)
+        self.temp = np.empty(self.shape, dtype=dtype)
+        self.rho = np.empty(self.shape, dtype=dtype)
+
+        # Output terms (overwritten by each call to calc_terms).
+        self.terms = {term_name: np.empty(self.shape, dtype=dtype) for term_name in term_names}
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Total density from the hydrostatic base state pressure and the density
+    #   perturbation:
+    #   rho = (-1/g) * d(p0)/dz + rho'
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def calc_density(self, base_pressure, rho_perturb, gravity):
+        rho = calc_gradient(base_pressure, -3, None, self.rho)
+        np.multiply(-1./gravity, rho, out=rho)
+        np.divide(rho, self.grad_dz, out=rho)
+        np.add(rho, rho_perturb, out=rho)
+        return rho
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Advection term for one vorticity component into out:
+    #   -1.*u * d(vort)/dx - v * d(vort)/dy - w * d(vort)/dz
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def calc_advection(self, vort, out):
+        avg_u, avg_v, avg_w = self.avg_winds
+        dvort_dx = calc_gradient(vort, -1, self.grad_dx, self.grad_buffers[0])
+        dvort_dy = calc_gradient(vort, -2, self.grad_dy, self.grad_buffers[1])
+        dvort_dz = calc_gradient(vort, -3, self.grad_dz, self.grad_buffers[2])
+
+        np.multiply(avg_u, dvort_dx, out=out)
+        np.negative(out, out=out)
+        np.subtract(out, np.multiply(avg_v, dvort_dy, out=self.temp), out=out)
+        np.subtract(out, np.multiply(avg_w, dvort_dz, out=self.temp), out=out)
+        return out
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Tilting term for one vorticity component into out:
+    #   vort1 * avg(d(wind)/d(dim1)) + vort2 * avg(d(wind)/d(dim2))
+    #   The derivatives are valid at the staggered points of the wind, and are
+    #   averaged to the unstaggered points along the staggered axis.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def calc_tilt(self, wind, stag_axis, wind_buffer, vort1, axis1, spacing1, vort2, axis2, spacing2, out):
+        calc_gradient(wind, axis1, spacing1, wind_buffer)
+        calc_stagger_avg(wind_buffer, stag_axis, out)
+        np.multiply(vort1, out, out=out)
+
+        calc_gradient(wind, axis2, spacing2, wind_buffer)
+        calc_stagger_avg(wind_buffer, stag_axis, self.temp)
+        np.multiply(vort2, self.temp, out=self.temp)
+
+        np.add(out, self.temp, out=out)
+        return out
+
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    # Calculate all terms of the vorticity equation for one time.
+    #   u_wind, v_wind, w_wind: winds on the staggered grid
+    #   x_vort, y_vort, z_vort, pressure, rho: fields at the unstaggered points
+    #   Returns a dictionary of the terms (see term_names).  The arrays are
+    #   reused by the next call, so they must be written out (or copied) first.
+    #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+    def calc_terms(self, u_wind, v_wind, w_wind, x_vort, y_vort, z_vort, pressure, rho):
+        terms = self.terms
+
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Solenoid Terms
+        #   xvort_component: (1/rho^2) * (drho/dy * dp/dz - drho/dz * dp/dy)
+        #   yvort_component: (1/rho^2) * (drho/dz * dp/dx - drho/dx * dp/dz)
+        #   zvort_component: (1/rho^2) * (drho/dx * dp/dy - drho/dy * dp/dx)
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        dp_dx = calc_gradient(pressure, -1, self.grad_dx, self.grad_buffers[0])
+        dp_dy = calc_gradient(pressure, -2, self.grad_dy, self.grad_buffers[1])
+        dp_dz = calc_gradient(pressure, -3, self.grad_dz, self.grad_buffers[2])
+        drho_dx = calc_gradient(rho, -1, self.grad_dx, self.grad_buffers[3])
+        drho_dy = calc_gradient(rho, -2, self.grad_dy, self.grad_buffers[4])
+        drho_dz = calc_gradient(rho, -3, self.grad_dz, self.grad_buffers[5])
+
+        # 1/rho^2 (kept in du_dx until the stretching terms are calculated).
+        inv_rho_sq = np.square(rho, out=self.du_dx)
+        np.divide(1, inv_rho_sq, out=inv_rho_sq)
+
+        for term_name, drho_1, dp_1, drho_2, dp_2 in [('x_solenoid_term', drho_dy, dp_dz, drho_dz, dp_dy),
+                                                      ('y_solenoid_term', drho_dz, dp_dx, drho_dx, dp_dz),
+                                                      ('z_solenoid_term', drho_dx, dp_dy, drho_dy, dp_dx)]:
+            out = terms[term_name]
+            np.multiply(drho_1, dp_1, out=out)
+            np.subtract(out, np.multiply(drho_2, dp_2, out=self.temp), out=out)
+            np.multiply(inv_rho_sq, out, out=out)
+
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Advection Terms
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Average the nearest staggered wind values to get a value at the
+        #   unstaggered grid point.
+        calc_stagger_avg(u_wind, -1, self.avg_winds[0])
+        calc_stagger_avg(v_wind, -2, self.avg_winds[1])
+        calc_stagger_avg(w_wind, -3, self.avg_winds[2])
+
+        self.calc_advection(x_vort, terms['x_advection_term'])
+        self.calc_advection(y_vort, terms['y_advection_term'])
+        self.calc_advection(z_vort, terms['z_advection_term'])
+
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Divergence/Stretching Terms
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # du/dx and dv/dy at unstaggered points i and j using staggered u and v.
+        du_dx = np.subtract(u_wind[...,1:], u_wind[...,:-1], out=self.du_dx)
+        np.divide(du_dx, self.stagger_dx, out=du_dx)
+        dv_dy = np.subtract(v_wind[...,1:,:], v_wind[...,:-1,:], out=self.dv_dy)
+        np.divide(dv_dy, self.stagger_dy, out=dv_dy)
+
+        # East-West Horizontal Divergence/Stretching Term
+        #   xvort * du/dx
+        np.multiply(x_vort, du_dx, out=terms['x_stretch_term'])
+
+        # North-South Horizontal Divergence/Stretching Term
+        #   yvort * dv/dy
+        np.multiply(y_vort, dv_dy, out=terms['y_stretch_term'])
+
+        # Vertical Divergence/Stretching Term
+        #   -1 * zvort * (du/dx + dv/dy) or zvort * dw/dz
+        #   Using -(du/dx + dv/dy) = dw/dz, since dw/dz may be small in parts of
+        #   the domain
+        z_stretch_term = terms['z_stretch_term']
+        np.negative(z_vort, out=z_stretch_term)
+        np.multiply(z_stretch_term, np.add(du_dx, dv_dy, out=self.temp), out=z_stretch_term)
+
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Tilting Terms
+        #^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        # Tilting Term for East-West Horizontal Vorticity
+        #   yvort*du/dy + zvort*du/dz
+        self.calc_tilt(u_wind, -1, self.u_buffer, y_vort, -2, self.grad_dy, z_vort, -3, self.grad_dz, terms['x_tilt_term'])
+
+        # Tilting Term for North-South Horizontal Vorticity
+        #   xvort*dv/dx + zvort*dv/dz
+        self.calc_tilt(v_wind, -2, self.v_buffer, x_vort, -1, self.grad_dx, z_vort, -3, self.grad_dz, terms['y_tilt_term'])
+
+        # Tilting Term for Vertical Vorticity
+        #   xvort*dw/dx + yvort*dw/dy
+        self.calc_tilt(w_wind, -3, self.w_buffer, x_vort, -1, self.grad_dx, y_vort, -2, self.grad_dy, terms['z_tilt_term'])
+
+        return terms